@@ -0,0 +1,73 @@
+"""
+Mittaa MARC21-tietueiden konversion läpäisykyvyn eri työprosessien määrillä (ks. YsoConverter.convert_with_workers).
+Sanastot muodostetaan test-kansion testisanastoista ja käännetään mmap-tiedostoksi kuten välimuistissa,
+ja syötetiedoston tietueet toistetaan annetun monta kertaa.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.conversion_workers -w 1 2 4
+"""
+from rdflib import Graph
+from vocabularies import Vocabularies, SearchCache
+from compiled_vocabularies import CompiledVocabularies
+from yso_converter import YsoConverter
+from benchmarks.vocabulary_build import timed
+import argparse
+import hashlib
+import os
+import tempfile
+
+test_vocabulary_files = {
+    "yso": "yso-skos-test.rdf",
+    "yso-paikat": "yso-paikat-skos-test.rdf",
+    "ysa": "ysa-skos-test.rdf",
+    "allars": "allars-skos-test.rdf",
+    "slm": "slm-skos-test.rdf",
+    "musa": "musa-skos-test.rdf",
+    "seko": "seko-skos-test.rdf"
+}
+
+def compile_test_vocabularies(directory, path):
+    built_vocabularies = Vocabularies()
+    graphs = {}
+    for code, file_name in test_vocabulary_files.items():
+        g = Graph()
+        g.parse(os.path.join(directory, file_name))
+        graphs.update({code: g})
+    for code in ['ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'cilla', 'seko']:
+        built_vocabularies.parse_vocabulary(code, graphs)
+    CompiledVocabularies.compile(built_vocabularies, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tietueiden konversion työprosessien suorituskykytesti.")
+    parser.add_argument("-i", "--input", default=os.path.join("test", "test_records.mrc"),
+        help="MARC21 input file")
+    parser.add_argument("-d", "--directory", default="test",
+        help="Directory of test vocabulary files")
+    parser.add_argument("-n", "--repeat", type=int, default=100,
+        help="Number of times the input records are repeated")
+    parser.add_argument("-w", "--workers", type=int, nargs='+', default=[1, 2, 4],
+        help="Worker counts to measure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        compiled_path = os.path.join(directory, "vocabularies.bin")
+        compile_test_vocabularies(args.directory, compiled_path)
+        input_path = os.path.join(directory, "records.mrc")
+        with open(args.input, 'rb') as input_file:
+            data = input_file.read()
+        with open(input_path, 'wb') as output_file:
+            for _ in range(args.repeat):
+                output_file.write(data)
+        print("%-10s %10s %12s %34s"%("prosesseja", "aika (s)", "tietuetta/s", "tulostiedoston tiiviste"))
+        for workers in args.workers:
+            output_path = os.path.join(directory, "output_%s.mrc"%workers)
+            converter = YsoConverter(input_path, None, output_path, None, "marc21", workers=workers)
+            converter.vocabularies = CompiledVocabularies(compiled_path).get_vocabularies()
+            converter.vocabularies.search_cache = SearchCache(converter.search_cache_size)
+            elapsed = timed(converter.read_records)
+            records = converter.statistics['käsiteltyjä tietueita']
+            with open(output_path, 'rb') as output_file:
+                digest = hashlib.md5(output_file.read()).hexdigest()
+            print("%-10d %10.3f %12.0f %34s"%(workers, elapsed, records / elapsed, digest))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Vertaa Vocabularies.is_numeric-metodin aikatermien tunnistusta aiempaan toteutukseen, joka muodosti
+päätteet ja viivat jokaisella kutsulla ja käänsi päätteiden säännölliset lausekkeet uudelleen.
+Aineistona ovat MARC21-tietueiden kenttien 648 ja 650 $y-osakentät sekä kentän 648 $a-osakentät.
+Jos syötetiedostoissa ei ole aikatermejä, käytetään tyypillisistä aikatermeistä ja asiasanoista
+koottua esimerkkiaineistoa.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.is_numeric -i tietueet.mrc
+"""
+from pymarc import MARCReader
+from vocabularies import Vocabularies
+from benchmarks.vocabulary_build import timed
+import argparse
+import re
+
+sample_values = ['1900-luku', '1800-luku', '2000-luku', '1990-luku', '1939-1945', '1914-1918', '1917',
+    '1800-talet', '1900-talet', '1990-talet', '1600-1700-luku', '400 eKr.', '300-luku eKr.', '100 jKr.',
+    '1900-luvut', '1950-1960-luvut', '1500-tal', '2010-luku', '1000-1100-luku', '44 f.Kr.',
+    'keskiaika', 'antiikki', 'renessanssi', 'uusi aika', 'esihistoria', 'historia', 'kylmä sota',
+    'toinen maailmansota', 'medeltiden', 'antiken', 'rautakausi', 'kivikausi', 'pronssikausi']
+
+def is_numeric(keyword):
+    #aiempi toteutus
+    if keyword:
+        suffixes = ['-luku', '-luvut', '-talet', '-tal', 'ekr.', 'jkr.', 'fkr.', 'eaa.', 'jaa.', 'ekr', 'jkr', 'fkr', 'eaa', 'jaa']
+        dashes = dict(Vocabularies.dashes)
+        keyword = keyword.replace(" ", "")
+        for suffix in suffixes:
+            keyword = keyword.replace(suffix, "")
+            keyword = re.sub(r'(?i)' + suffix, '', keyword)
+        if any(not char.isdigit() and char not in dashes for char in keyword):
+            return False
+        return True
+    return False
+
+def read_values(paths):
+    values = []
+    for path in paths:
+        with open(path, 'rb') as input_file:
+            for record in MARCReader(input_file, to_unicode=True):
+                if not record:
+                    continue
+                for field in record.get_fields('648', '650'):
+                    values.extend(field.get_subfields('y'))
+                    if field.tag == '648':
+                        values.extend(field.get_subfields('a'))
+    return values
+
+def check_values(function, values, rounds):
+    for _ in range(rounds):
+        for value in values:
+            function(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Aikatermien tunnistuksen suorituskykytesti.")
+    parser.add_argument("-i", "--input", nargs='*', default=[],
+        help="MARC21 input files")
+    parser.add_argument("-r", "--rounds", type=int, default=100,
+        help="Number of passes over the values")
+    args = parser.parse_args()
+
+    values = read_values(args.input)
+    if not values:
+        values = sample_values
+    vocabularies = Vocabularies()
+    differences = [value for value in values if is_numeric(value) != vocabularies.is_numeric(value)]
+    if differences:
+        print("eroavat tulokset: %s"%differences)
+    print("arvoja: %d, aikatermejä: %d"%(len(values), sum(vocabularies.is_numeric(value) for value in values)))
+    print("%-12s %10s"%("toteutus", "aika (s)"))
+    print("%-12s %10.3f"%("aiempi", timed(check_values, is_numeric, values, args.rounds)))
+    print("%-12s %10.3f"%("käännetty", timed(check_values, vocabularies.is_numeric, values, args.rounds)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Mittaa hakusuunnitelmien (Vocabularies.get_search_plan) käyttöä käännetyistä sanastoista ladattaessa:
+ensimmäisen haun kesto hakujärjestystä kohden, ladatut sanastot, hakujen kesto hakusuunnitelman
+kanssa ja ilman sitä (sanastot yksi kerrallaan, ks. search_vocabulary_steps) sekä hakusuunnitelmiin
+tallennettujen tulosten muistinkäyttö (tracemalloc).
+Ysa-, Allärs- ja YSO-tiedostot luodaan synteettisesti kuten vocabulary_update-testissä, muut sanastot
+luetaan static_vocabularies-kansiosta. Hakusanat toistuvat kuten konvertoitavissa tietueissa.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.search_plan
+"""
+from vocabulary_builder import VocabularyBuilder
+from compiled_vocabularies import CompiledVocabularies
+from benchmarks.vocabulary_build import timed
+from benchmarks.vocabulary_update import write_files, prefixes
+import argparse
+import logging
+import os
+import random
+import tempfile
+import tracemalloc
+import unicodedata
+
+vocabulary_orders = [
+    [('ysa', 'fi'), ('allars', 'sv')],
+    [('numeric', 'fi'), ('ysa', 'fi'), ('allars', 'sv')],
+    [('slm', 'fi'), ('ysa', 'fi'), ('slm', 'sv'), ('allars', 'sv')]
+]
+
+def write_allars(path, concepts):
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(prefixes)
+        output.write('@prefix allars: <http://www.yso.fi/onto/allars/> .\n\n')
+        for idx in range(concepts):
+            output.write('allars:Y%s a skos:Concept ;\n    skos:prefLabel "begrepp %s"@sv ;\n'
+                '    skos:exactMatch yso:p%s .\n\n'%(idx, idx, idx))
+
+def get_keywords(concepts, count):
+    rng = random.Random(0)
+    #osa hakusanoista toistuu usein, osa on eri kirjainkoossa ja osa puuttuu sanastoista:
+    frequent = ["käsite %s"%idx for idx in rng.sample(range(concepts), 200)]
+    keywords = []
+    for _ in range(count):
+        choice = rng.random()
+        if choice < 0.5:
+            keywords.append(rng.choice(frequent))
+        elif choice < 0.8:
+            keywords.append("käsite %s"%rng.randrange(concepts))
+        elif choice < 0.85:
+            keywords.append("Käsite %s"%rng.randrange(concepts))
+        elif choice < 0.9:
+            keywords.append("begrepp %s"%rng.randrange(concepts))
+        else:
+            keywords.append("puuttuva %s"%rng.randrange(concepts))
+    return keywords
+
+def search_all(search, keywords, vocabulary_order):
+    for keyword in keywords:
+        try:
+            search(keyword, vocabulary_order)
+        except ValueError:
+            pass
+
+def search_steps(loaded_vocabularies):
+    def search(keyword, vocabulary_order):
+        keyword = unicodedata.normalize('NFKC', keyword).strip()
+        loaded_vocabularies.search_vocabulary_steps(keyword, vocabulary_order, False, True)
+    return search
+
+def search_plan(loaded_vocabularies):
+    def search(keyword, vocabulary_order):
+        loaded_vocabularies.search_vocabularies(keyword, vocabulary_order, False, True)
+    return search
+
+def main():
+    parser = argparse.ArgumentParser(description="Hakusuunnitelmien suorituskykytesti.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    parser.add_argument("-c", "--concepts", type=int, default=50000,
+        help="Number of concepts in generated vocabularies")
+    parser.add_argument("-n", "--searches", type=int, default=100000,
+        help="Number of searches per vocabulary order")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    keywords = get_keywords(args.concepts, args.searches)
+    with tempfile.TemporaryDirectory() as directory:
+        vocabulary_files = write_files(directory, args.directory, args.concepts, set(), "haku")
+        allars_path = os.path.join(directory, "allars-haku.ttl")
+        write_allars(allars_path, args.concepts)
+        vocabulary_files.update({'allars': allars_path})
+        path = os.path.join(directory, "vocabularies.bin")
+        CompiledVocabularies.compile(VocabularyBuilder().build(vocabulary_files), path)
+
+        loaded_vocabularies = CompiledVocabularies(path).get_vocabularies()
+        print("%-45s %12s"%("ensimmäinen haku", "kesto (ms)"))
+        for vocabulary_order in vocabulary_orders:
+            elapsed = timed(search_all, search_plan(loaded_vocabularies), keywords[:1], vocabulary_order)
+            print("%-45s %12.3f"%(", ".join(vc[0] for vc in vocabulary_order), elapsed * 1000))
+        print("ladatut sanastot: %s"%", ".join(sorted(loaded_vocabularies.get_loaded_vocabularies())))
+
+        print("%-45s %12s %12s"%("%s hakua"%args.searches, "sanastot (s)", "suunnitelma (s)"))
+        for vocabulary_order in vocabulary_orders:
+            steps_time = timed(search_all, search_steps(loaded_vocabularies), keywords, vocabulary_order)
+            plan_time = timed(search_all, search_plan(loaded_vocabularies), keywords, vocabulary_order)
+            print("%-45s %12.3f %12.3f"%(", ".join(vc[0] for vc in vocabulary_order), steps_time, plan_time))
+
+        #muistinkäyttö mitataan erikseen, koska tracemalloc hidastaa hakuja:
+        loaded_vocabularies = CompiledVocabularies(path).get_vocabularies()
+        loaded_vocabularies.load_vocabularies(['ysa', 'allars', 'slm', 'yso'])
+        tracemalloc.start()
+        for vocabulary_order in vocabulary_orders:
+            search_all(search_plan(loaded_vocabularies), keywords, vocabulary_order)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        entries = sum(len(step[1]) for search_plan_steps in loaded_vocabularies.search_plans.values()
+            for step in search_plan_steps if step[0] != "numeric")
+        print("tallennettuja tuloksia %s, muistia %.1f Mt"%(entries, size / 1024 / 1024))
+
+if __name__ == "__main__":
+    main()
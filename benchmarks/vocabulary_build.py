@@ -0,0 +1,89 @@
+"""
+Mittaa sanastojen käsittelyn keston static_vocabularies-kansion TTL-tiedostoilla.
+Vertailukohtana on graafista käsite ja kieli kerrallaan preferredLabel-kutsuilla tehty läpikäynti,
+jota sanastojen käsittely käytti ennen ConceptIndexiä.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.vocabulary_build
+"""
+from rdflib import Graph, RDF
+from rdflib.namespace import SKOS
+from vocabulary import Vocabulary, ConceptIndex
+import argparse
+import os
+import time
+
+static_vocabulary_files = {
+    "slm": ("static-slm-skos.ttl", ['fi', 'sv']),
+    "seko": ("static-seko-skos.ttl", ['fi']),
+    "musa": ("static-musa-skos.ttl", ['fi'])
+}
+
+def preferred_label_scan(g, language_codes):
+    #vanha läpikäynti: useita preferredLabel-hakuja jokaiselle käsitteelle ja kielelle
+    labels = {}
+    for conc in g.subjects(RDF.type, SKOS.Concept):
+        for lc in language_codes:
+            pref_label = g.preferredLabel(conc, lang=lc)
+            alt_labels = g.preferredLabel(conc, lang=lc, labelProperties=[SKOS.altLabel])
+            matches = g.preferredLabel(conc, labelProperties=[SKOS.exactMatch])
+            labels.update({str(conc): (pref_label, alt_labels, matches)})
+    return labels
+
+def concept_index_scan(g, language_codes):
+    #samat haut yhdellä läpikäynnillä muodostetusta ConceptIndexistä
+    labels = {}
+    index = ConceptIndex()
+    index.add_graph(g)
+    for conc, properties in index.concepts():
+        for lc in language_codes:
+            pref_label = ConceptIndex.get_values(properties, lang=lc)
+            alt_labels = ConceptIndex.get_values(properties, lang=lc, label_properties=[SKOS.altLabel])
+            matches = ConceptIndex.get_values(properties, label_properties=[SKOS.exactMatch])
+            labels.update({conc: (pref_label, alt_labels, matches)})
+    return labels
+
+def build(code, g, language_codes, secondary_graph):
+    vocabulary = Vocabulary(code, language_codes)
+    if code == "musa":
+        vocabulary.parse_musa_vocabulary(g, secondary_graph)
+    else:
+        vocabulary.parse_label_vocabulary(g)
+    return vocabulary
+
+def main():
+    parser = argparse.ArgumentParser(description="Sanastojen käsittelyn suorituskykytesti.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    parser.add_argument("-r", "--rounds", type=int, default=3,
+        help="Number of measurement rounds")
+    args = parser.parse_args()
+
+    print("%-7s %9s %16s %14s %9s %12s"%("sanasto", "parse (s)", "preferredLabel (s)", "ConceptIndex (s)",
+        "nopeutus", "käsittely (s)"))
+    for code in static_vocabulary_files:
+        file_name, language_codes = static_vocabulary_files[code]
+        start = time.perf_counter()
+        g = Graph()
+        g.parse(os.path.join(args.directory, file_name), format='ttl')
+        parse_time = time.perf_counter() - start
+        #rdflib 6:sta alkaen Graph-luokassa ei ole enää preferredLabel-metodia:
+        old_time = None
+        if hasattr(g, 'preferredLabel'):
+            old_time = min(timed(preferred_label_scan, g, language_codes) for _ in range(args.rounds))
+        index_time = min(timed(concept_index_scan, g, language_codes) for _ in range(args.rounds))
+        #Musa tarvitsee Ysan graafin, tässä käytetään Musan omaa graafia sen tilalla:
+        build_time = min(timed(build, code, g, language_codes, g) for _ in range(args.rounds))
+        if old_time:
+            speedup = "%.1fx"%(old_time / index_time)
+            old_time = "%.3f"%old_time
+        else:
+            speedup = old_time = "-"
+        print("%-7s %9.3f %18s %16.3f %9s %13.3f"%(code, parse_time, old_time, index_time, speedup, build_time))
+
+def timed(function, *args):
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    main()
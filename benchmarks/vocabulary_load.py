@@ -0,0 +1,68 @@
+"""
+Vertaa käsiteltyjen sanastojen lataamista pickle-tiedostosta ja käännetystä mmap-tiedostosta.
+Sanastot muodostetaan static_vocabularies-kansion TTL-tiedostoista.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.vocabulary_load
+"""
+from rdflib import Graph
+from vocabularies import Vocabularies
+from compiled_vocabularies import CompiledVocabularies
+from benchmarks.vocabulary_build import static_vocabulary_files, build, timed
+import argparse
+import os
+import pickle
+import tempfile
+
+def load_pickle(path):
+    with open(path, 'rb') as input_file:
+        return pickle.load(input_file)
+
+def load_compiled(path):
+    return CompiledVocabularies(path).get_vocabularies()
+
+def lookup_labels(loaded_vocabularies, keywords):
+    for vocabulary_code, vocabulary in loaded_vocabularies.vocabularies.items():
+        for language, labels in keywords[vocabulary_code]:
+            if language:
+                labels_table = vocabulary.labels[language]
+            else:
+                labels_table = vocabulary.labels
+            for label in labels:
+                labels_table[label]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sanastojen latauksen suorituskykytesti.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    parser.add_argument("-r", "--rounds", type=int, default=3,
+        help="Number of measurement rounds")
+    args = parser.parse_args()
+
+    built_vocabularies = Vocabularies()
+    keywords = {}
+    for code in static_vocabulary_files:
+        file_name, language_codes = static_vocabulary_files[code]
+        g = Graph()
+        g.parse(os.path.join(args.directory, file_name), format='ttl')
+        vocabulary = build(code, g, language_codes, g)
+        built_vocabularies.vocabularies.update({code: vocabulary})
+        if code == "musa":
+            keywords.update({code: [(None, list(vocabulary.labels))]})
+        else:
+            keywords.update({code: [(lc, list(vocabulary.labels[lc])) for lc in language_codes]})
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "vocabularies.pkl")
+        compiled_path = os.path.join(directory, "vocabularies.bin")
+        with open(pickle_path, 'wb') as output:
+            pickle.dump(built_vocabularies, output, pickle.HIGHEST_PROTOCOL)
+        CompiledVocabularies.compile(built_vocabularies, compiled_path)
+        print("%-9s %10s %10s %12s"%("muoto", "koko (kt)", "lataus (s)", "haut (s)"))
+        for name, path, load in [("pickle", pickle_path, load_pickle), ("käännetty", compiled_path, load_compiled)]:
+            load_time = min(timed(load, path) for _ in range(args.rounds))
+            loaded_vocabularies = load(path)
+            lookup_time = min(timed(lookup_labels, loaded_vocabularies, keywords) for _ in range(args.rounds))
+            print("%-9s %10d %10.3f %12.3f"%(name, os.path.getsize(path) // 1024, load_time, lookup_time))
+
+if __name__ == "__main__":
+    main()
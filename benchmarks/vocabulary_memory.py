@@ -0,0 +1,69 @@
+"""
+Mittaa käsiteltyjen sanastojen muistinkäytön static_vocabularies-kansion TTL-tiedostoilla:
+käsittelyssä muodostettujen hakutaulujen koon (tracemalloc), hakutauluissa olevien
+merkkijono-olioiden määrän sekä käännetyn tiedoston koon.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.vocabulary_memory
+"""
+from rdflib import Graph
+from vocabularies import Vocabularies
+from vocabulary import ConceptIndex
+from compiled_vocabularies import CompiledVocabularies
+from benchmarks.vocabulary_build import static_vocabulary_files, build
+from collections.abc import Mapping
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+def count_objects(value, strings, references):
+    """
+    laskee hakutaulujen merkkijonoviittaukset ja erilliset merkkijono-oliot
+    """
+    if isinstance(value, str):
+        strings.add(id(value))
+        references[0] += 1
+    elif isinstance(value, Mapping):
+        for key in value:
+            count_objects(key, strings, references)
+            count_objects(value[key], strings, references)
+    else:
+        for v in value:
+            count_objects(v, strings, references)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sanastojen muistinkäytön mittaus.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    args = parser.parse_args()
+
+    built_vocabularies = Vocabularies()
+    print("%-7s %12s %14s %14s"%("sanasto", "taulut (Mt)", "viittaukset", "merkkijonot"))
+    for code in static_vocabulary_files:
+        file_name, language_codes = static_vocabulary_files[code]
+        index = ConceptIndex()
+        g = Graph()
+        g.parse(os.path.join(args.directory, file_name), format='ttl')
+        index.add_graph(g)
+        del g
+        gc.collect()
+        tracemalloc.start()
+        vocabulary = build(code, index, language_codes, index)
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        strings = set()
+        references = [0]
+        for table_name in CompiledVocabularies.table_names:
+            count_objects(getattr(vocabulary, table_name), strings, references)
+        built_vocabularies.vocabularies.update({code: vocabulary})
+        print("%-7s %12.1f %14d %14d"%(code, size / 1024 / 1024, references[0], len(strings)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "vocabularies.bin")
+        CompiledVocabularies.compile(built_vocabularies, path)
+        print("käännetty tiedosto: %d kt"%(os.path.getsize(path) // 1024))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Vertaa sanastotiedoston lukemista rdflib-graafiin ja suoraan ConceptIndexiin
+static_vocabularies-kansion TTL-tiedostoilla. Muistin huippukäyttö mitataan tracemallocilla,
+joka hidastaa suoritusta, joten kesto mitataan erikseen.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.vocabulary_read
+"""
+from rdflib import Graph
+from vocabulary import ConceptIndex
+from triple_reader import read_triples
+from benchmarks.vocabulary_build import static_vocabulary_files, timed
+import argparse
+import os
+import tracemalloc
+
+def read_graph(path):
+    g = Graph()
+    g.parse(path, format='ttl')
+    index = ConceptIndex()
+    index.add_graph(g)
+    return index
+
+def read_stream(path):
+    index = ConceptIndex()
+    read_triples(path, index)
+    return index
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Sanastotiedostojen lukemisen suorituskykytesti.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    parser.add_argument("-r", "--rounds", type=int, default=3,
+        help="Number of measurement rounds")
+    args = parser.parse_args()
+
+    print("%-7s %10s %10s %14s %14s"%("sanasto", "graafi (s)", "suora (s)", "graafi (Mt)", "suora (Mt)"))
+    for code in static_vocabulary_files:
+        path = os.path.join(args.directory, static_vocabulary_files[code][0])
+        graph_time = min(timed(read_graph, path) for _ in range(args.rounds))
+        stream_time = min(timed(read_stream, path) for _ in range(args.rounds))
+        graph_memory = peak_memory(read_graph, path) / 1024 / 1024
+        stream_memory = peak_memory(read_stream, path) / 1024 / 1024
+        print("%-7s %10.3f %10.3f %14.1f %14.1f"%(code, graph_time, stream_time, graph_memory, stream_memory))
+
+if __name__ == "__main__":
+    main()
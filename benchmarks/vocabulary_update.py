@@ -0,0 +1,102 @@
+"""
+Vertaa sanastojen päivittämistä edellisestä sukupolvesta (VocabularyBuilder.update) kokonaan uudelleen
+muodostamiseen, kun suuresta sanastotiedostosta on muuttunut vain osa käsitteistä.
+Ysa- ja YSO-tiedostot luodaan synteettisesti, SLM, Seko ja Musa luetaan static_vocabularies-kansiosta.
+Lopuksi tarkistetaan, että päivitetyt sanastot ovat samat kuin uudelleen muodostetut.
+
+Käynnistys ohjelman pääkansiosta: python -m benchmarks.vocabulary_update
+"""
+from vocabulary_builder import VocabularyBuilder
+from compiled_vocabularies import CompiledVocabularies, CompiledProvenance
+from benchmarks.vocabulary_build import static_vocabulary_files, timed
+import argparse
+import logging
+import os
+import random
+import tempfile
+
+prefixes = """@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix owl: <http://www.w3.org/2002/07/owl#> .
+@prefix dct: <http://purl.org/dc/terms/> .
+@prefix ysa: <http://www.yso.fi/onto/ysa/> .
+@prefix yso: <http://www.yso.fi/onto/yso/> .
+@prefix ysameta: <http://www.yso.fi/onto/ysa-meta/> .
+
+"""
+
+def write_ysa(path, concepts, changed):
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(prefixes)
+        for idx in range(concepts):
+            label = "muutettu käsite %s"%idx if idx in changed else "käsite %s"%idx
+            if idx % 10 == 0:
+                output.write('ysa:Y%s a skos:Concept, ysameta:GeographicalConcept ;\n'
+                    '    skos:prefLabel "%s"@fi ;\n    skos:altLabel "paikka %s -- osa"@fi ;\n'%(idx, label, idx))
+            else:
+                output.write('ysa:Y%s a skos:Concept ;\n    skos:prefLabel "%s"@fi ;\n'
+                    '    skos:altLabel "Käsite %s (tarkenne)"@fi ;\n'%(idx, label, idx))
+            output.write('    skos:exactMatch yso:p%s .\n\n'%idx)
+
+def write_yso(path, concepts, changed):
+    with open(path, 'w', encoding='utf-8') as output:
+        output.write(prefixes)
+        for idx in range(concepts):
+            label = "muutettu käsite %s"%idx if idx in changed else "käsite %s"%idx
+            output.write('yso:p%s a skos:Concept ;\n    skos:prefLabel "%s"@fi, "begrepp %s"@sv'%(idx, label, idx))
+            if idx % 50 == 49:
+                output.write(' ;\n    owl:deprecated true ;\n    dct:isReplacedBy yso:p%s'%(idx + 1))
+            output.write(' .\n\n')
+
+def write_files(directory, static_directory, concepts, changed, suffix):
+    vocabulary_files = {}
+    for code, write in [('ysa', write_ysa), ('yso', write_yso)]:
+        path = os.path.join(directory, "%s-%s.ttl"%(code, suffix))
+        write(path, concepts, changed)
+        vocabulary_files.update({code: path})
+    for code, (file_name, _) in static_vocabulary_files.items():
+        vocabulary_files.update({code: os.path.join(static_directory, file_name)})
+    return vocabulary_files
+
+def update(vocabularies_path, provenance_path, old_files, new_files):
+    previous_vocabularies = CompiledVocabularies(vocabularies_path).get_vocabularies()
+    CompiledProvenance(provenance_path).add_tables(previous_vocabularies)
+    return VocabularyBuilder().update(previous_vocabularies, old_files, new_files)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sanastojen päivittämisen suorituskykytesti.")
+    parser.add_argument("-d", "--directory", default="static_vocabularies",
+        help="Directory of static vocabulary files")
+    parser.add_argument("-c", "--concepts", type=int, default=50000,
+        help="Number of concepts in generated vocabularies")
+    parser.add_argument("-n", "--changes", type=int, default=100,
+        help="Number of changed concepts")
+    parser.add_argument("-r", "--rounds", type=int, default=3,
+        help="Number of measurement rounds")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    changed = set(random.Random(0).sample(range(args.concepts), args.changes))
+    with tempfile.TemporaryDirectory() as directory:
+        old_files = write_files(directory, args.directory, args.concepts, set(), "vanha")
+        new_files = write_files(directory, args.directory, args.concepts, changed, "uusi")
+        vocabularies_path = os.path.join(directory, "vocabularies.bin")
+        provenance_path = os.path.join(directory, "provenance.bin")
+        previous_vocabularies = VocabularyBuilder().build(old_files)
+        CompiledVocabularies.compile(previous_vocabularies, vocabularies_path)
+        CompiledProvenance.compile(previous_vocabularies, provenance_path)
+
+        build_time = min(timed(VocabularyBuilder().build, new_files) for _ in range(args.rounds))
+        update_time = min(timed(update, vocabularies_path, provenance_path, old_files, new_files)
+            for _ in range(args.rounds))
+        differences = VocabularyBuilder().get_differences(
+            update(vocabularies_path, provenance_path, old_files, new_files), VocabularyBuilder().build(new_files))
+        print("käsitteitä %s, muuttuneita %s"%(args.concepts, args.changes))
+        print("%-26s %10.3f"%("uudelleen muodostus (s)", build_time))
+        print("%-26s %10.3f"%("päivitys (s)", update_time))
+        print("%-26s %9.1fx"%("nopeutus", build_time / update_time))
+        print("%-26s %10d"%("vocabularies.bin (kt)", os.path.getsize(vocabularies_path) // 1024))
+        print("%-26s %10d"%("provenance.bin (kt)", os.path.getsize(provenance_path) // 1024))
+        print("%-26s %10s"%("eroavat taulut", ", ".join(differences) or "-"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+from vocabulary import Vocabulary
+from vocabularies import Vocabularies
+from bisect import bisect_left
+from collections.abc import Mapping, MutableMapping, Set
+from array import array
+import json
+import mmap
+import struct
+import sys
+import zlib
+
+class CompiledVocabularies():
+    """
+    Käännettyjen sanastojen tiedostomuoto, joka avataan mmap-muistikuvauksena.
+    Kaikki sanastojen merkkijonot tallennetaan kerran aakkosjärjestettyyn merkkijonotauluun,
+    ja hakutaulut tallennetaan merkkijonojen tunnisteista koostuvina järjestettyinä kokonaislukutaulukkoina.
+    Tiedostoa ei pureta avattaessa, vaan hakutaulut luetaan suoraan muistikuvauksesta, joten samaa tiedostoa
+    käyttävät prosessit jakavat käyttöjärjestelmän sivuvälimuistin.
+
+    Tiedoston rakenne (kokonaisluvut 32-bittisiä, tavujärjestys otsakkeessa):
+    tunniste, merkkijonojen alkukohdat, merkkijonot, merkkijonojen hajautustaulu, arvot
+    ja lopussa JSON-otsake sekä sen sijainti ja pituus.
+    Arvot alkavat tyyppitunnisteella ja pituudella:
+    merkkijono (tunniste), joukko (järjestetyt tunnisteet), lista (tunnisteet alkuperäisessä järjestyksessä)
+    ja sanakirja (avainten tunnisteiden ja arvojen sijaintien parit avainten mukaan järjestettynä).
+    Samansisältöiset arvot tallennetaan vain kerran, joten esim. kaikki saman URI-joukon viittaukset
+    eri hakutauluista osoittavat samaan tunnistetaulukkoon.
+    Sama sisältö tuottaa aina tavu tavulta saman tiedoston.
+    """
+    magic = b"YSOVOC01"
+    trailer = struct.Struct("<QQ")
+    STRING, SET, LIST, DICT = range(4)
+    #Vocabulary-olion hakutaulut, jotka tallennetaan tiedostoon:
+    table_names = ['geographical_concepts', 'geographical_chained_labels', 'deprecated_concepts',
+        'aggregate_concepts', 'labels', 'labels_lowercase', 'stripped_labels',
+        'labels_with_and_without_specifiers', 'labels_with_specifiers', 'translations', 'resolutions',
+        'geographical_chains', 'deprecated_replacements']
+
+    def __init__(self, path):
+        with open(path, 'rb') as input_file:
+            self.mm = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(self.magic)] != self.magic:
+            raise ValueError("Tiedosto %s ei ole käännetty sanastotiedosto"%path)
+        header_offset, header_length = self.trailer.unpack(self.mm[-self.trailer.size:])
+        self.header = json.loads(self.mm[header_offset:header_offset + header_length].decode('utf-8'))
+        if self.header['byteorder'] != sys.byteorder:
+            raise ValueError("Tiedoston %s tavujärjestys ei vastaa koneen tavujärjestystä"%path)
+        data = memoryview(self.mm)
+        integers = data[:header_offset].cast('I')
+        self.string_offsets = integers[self.header['string_offsets'] // 4:][:self.header['strings'] + 1]
+        self.string_data = data[self.header['string_data']:]
+        self.hash_table = integers[self.header['hash_table'] // 4:][:self.header['hash_size']]
+        self.values = integers[self.header['values'] // 4:]
+
+    def get_string(self, string_id):
+        return str(self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]],
+            'utf-8', 'surrogatepass')
+
+    def find_string(self, string):
+        """
+        palauttaa merkkijonon tunnisteen tai None, jos merkkijonoa ei ole tiedostossa
+        """
+        if not isinstance(string, str):
+            return None
+        encoded = string.encode('utf-8', 'surrogatepass')
+        mask = len(self.hash_table) - 1
+        slot = zlib.crc32(encoded) & mask
+        while self.hash_table[slot]:
+            string_id = self.hash_table[slot] - 1
+            if self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]] == encoded:
+                return string_id
+            slot = (slot + 1) & mask
+        return None
+
+    def get_value(self, position):
+        value_type = self.values[position]
+        length = self.values[position + 1]
+        if value_type == self.STRING:
+            return self.get_string(length)
+        if value_type == self.DICT:
+            return CompiledMapping(self, position)
+        string_ids = self.values[position + 2:position + 2 + length]
+        if value_type == self.SET:
+            return frozenset(self.get_string(string_id) for string_id in string_ids)
+        return [self.get_string(string_id) for string_id in string_ids]
+
+    def get_vocabularies(self):
+        """
+        palauttaa Vocabularies-olion, jonka sanastojen hakutaulut luetaan tiedostosta
+        Sanastot muodostetaan vasta, kun niitä käytetään ensimmäisen kerran (ks. LazyVocabularies).
+        """
+        compiled_vocabularies = Vocabularies()
+        compiled_vocabularies.vocabularies = LazyVocabularies(self)
+        return compiled_vocabularies
+
+    def get_vocabulary(self, vocabulary_code):
+        """
+        palauttaa sanaston Vocabulary-oliona, jonka hakutaulut luetaan tiedostosta
+        """
+        info = self.header['vocabularies'][vocabulary_code]
+        vocabulary = Vocabulary(vocabulary_code, info['language_codes'])
+        vocabulary.target_vocabulary_code = info['target_vocabulary_code']
+        for table_name, position in info['tables'].items():
+            setattr(vocabulary, table_name, self.get_table(position))
+        return vocabulary
+
+    def get_table(self, position):
+        if self.values[position] == self.SET:
+            return CompiledSet(self, position)
+        return self.get_value(position)
+
+    @classmethod
+    def compile(cls, compiled_vocabularies, path):
+        """
+        compiled_vocabularies: tallennettava Vocabularies-olio
+        path: käännetyn tiedoston polku
+        """
+        vocabulary_codes = sorted(compiled_vocabularies.vocabularies)
+        strings = set()
+        for vocabulary_code in vocabulary_codes:
+            for table_name in cls.table_names:
+                cls.collect_strings(getattr(compiled_vocabularies.vocabularies[vocabulary_code], table_name), strings)
+        encoded_strings = sorted(s.encode('utf-8', 'surrogatepass') for s in strings)
+        string_ids = {}
+        string_offsets = array('I', [0])
+        hash_size = 1
+        while hash_size < 2 * len(encoded_strings):
+            hash_size *= 2
+        hash_table = array('I', [0]) * hash_size
+        for string_id, encoded in enumerate(encoded_strings):
+            string_ids.update({encoded.decode('utf-8', 'surrogatepass'): string_id})
+            string_offsets.append(string_offsets[-1] + len(encoded))
+            slot = zlib.crc32(encoded) & (hash_size - 1)
+            while hash_table[slot]:
+                slot = (slot + 1) & (hash_size - 1)
+            hash_table[slot] = string_id + 1
+        string_data = b"".join(encoded_strings)
+        string_data += b"\0" * (-len(string_data) % 4)
+
+        values = array('I')
+        encoded_values = {}
+        header = {'byteorder': sys.byteorder, 'strings': len(encoded_strings), 'hash_size': hash_size,
+            'vocabularies': {}}
+        for vocabulary_code in vocabulary_codes:
+            vocabulary = compiled_vocabularies.vocabularies[vocabulary_code]
+            tables = {}
+            for table_name in cls.table_names:
+                tables.update({table_name: cls.encode_value(getattr(vocabulary, table_name), string_ids, values, encoded_values)})
+            header['vocabularies'].update({vocabulary_code: {
+                'language_codes': vocabulary.language_codes,
+                'target_vocabulary_code': vocabulary.target_vocabulary_code,
+                'tables': tables}})
+
+        with open(path, 'wb') as output:
+            output.write(cls.magic)
+            header['string_offsets'] = output.tell()
+            string_offsets.tofile(output)
+            header['string_data'] = output.tell()
+            output.write(string_data)
+            header['hash_table'] = output.tell()
+            hash_table.tofile(output)
+            header['values'] = output.tell()
+            values.tofile(output)
+            header_offset = output.tell()
+            encoded_header = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            output.write(encoded_header)
+            output.write(cls.trailer.pack(header_offset, len(encoded_header)))
+
+    @classmethod
+    def collect_strings(cls, value, strings):
+        if isinstance(value, str):
+            strings.add(value)
+        elif isinstance(value, Mapping):
+            for key in value:
+                strings.add(key)
+                cls.collect_strings(value[key], strings)
+        else:
+            strings.update(value)
+
+    @classmethod
+    def encode_value(cls, value, string_ids, values, encoded_values):
+        """
+        lisää arvon arvotaulukkoon ja palauttaa sen sijainnin
+        encoded_values: jo tallennetut arvot sijainteineen, jotta samansisältöiset arvot tallennetaan vain kerran
+        """
+        if isinstance(value, str):
+            encoded = (cls.STRING, string_ids[value])
+        elif isinstance(value, Mapping):
+            keys = sorted(string_ids[key] for key in value)
+            key_strings = {string_ids[key]: key for key in value}
+            #sisäkkäiset arvot tallennetaan ennen sanakirjaa:
+            encoded = [cls.DICT, len(keys)]
+            for key in keys:
+                encoded.append(key)
+                encoded.append(cls.encode_value(value[key_strings[key]], string_ids, values, encoded_values))
+            encoded = tuple(encoded)
+        elif isinstance(value, (set, frozenset, Set)):
+            encoded = (cls.SET, len(value)) + tuple(sorted(string_ids[v] for v in value))
+        else:
+            encoded = (cls.LIST, len(value)) + tuple(string_ids[v] for v in value)
+        if encoded in encoded_values:
+            return encoded_values[encoded]
+        position = len(values)
+        values.extend(encoded)
+        encoded_values.update({encoded: position})
+        return position
+
+class CompiledProvenance(CompiledVocabularies):
+    """
+    Sanastojen päivittämiseen tarvittavat taulut (ks. Vocabulary.label_concepts), jotka tallennetaan
+    hakutauluista erilliseen tiedostoon samassa muodossa. Tiedostoa ei tarvita sanastohakuihin,
+    joten sitä ei avata, ellei sanastoja päivitetä.
+    """
+    magic = b"YSOPRV01"
+    table_names = ['label_concepts', 'concept_uris', 'replaced_by', 'geographical_sources', 'label_variants',
+        'pref_labels']
+
+    def add_tables(self, provenance_vocabularies):
+        """
+        lisää tiedoston taulut Vocabularies-olion niille sanastoille, jotka ovat tiedostossa
+        """
+        for vocabulary_code, info in self.header['vocabularies'].items():
+            if vocabulary_code in provenance_vocabularies.vocabularies:
+                vocabulary = provenance_vocabularies.vocabularies[vocabulary_code]
+                for table_name, position in info['tables'].items():
+                    setattr(vocabulary, table_name, self.get_table(position))
+        return provenance_vocabularies
+
+class CompiledMapping(Mapping):
+    """
+    käännetyn tiedoston sanakirja, jonka avaimet haetaan puolitushaulla tiedostosta
+    """
+
+    def __init__(self, compiled_vocabularies, position):
+        self.compiled_vocabularies = compiled_vocabularies
+        values = compiled_vocabularies.values
+        self.length = values[position + 1]
+        self.keys_and_values = values[position + 2:position + 2 + 2 * self.length]
+        self.key_ids = self.keys_and_values[::2]
+
+    def get_index(self, key):
+        string_id = self.compiled_vocabularies.find_string(key)
+        if string_id is not None:
+            index = bisect_left(self.key_ids, string_id)
+            if index < self.length and self.key_ids[index] == string_id:
+                return index
+        return None
+
+    def __getitem__(self, key):
+        index = self.get_index(key)
+        if index is None:
+            raise KeyError(key)
+        return self.compiled_vocabularies.get_value(self.keys_and_values[2 * index + 1])
+
+    def __contains__(self, key):
+        return self.get_index(key) is not None
+
+    def __iter__(self):
+        for string_id in self.key_ids:
+            yield self.compiled_vocabularies.get_string(string_id)
+
+    def __len__(self):
+        return self.length
+
+class CompiledSet(Set):
+    """
+    käännetyn tiedoston joukko, jonka jäsenyys tarkistetaan puolitushaulla tiedostosta
+    """
+
+    def __init__(self, compiled_vocabularies, position):
+        self.compiled_vocabularies = compiled_vocabularies
+        values = compiled_vocabularies.values
+        self.length = values[position + 1]
+        self.string_ids = values[position + 2:position + 2 + self.length]
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return set(iterable)
+
+    def __contains__(self, value):
+        string_id = self.compiled_vocabularies.find_string(value)
+        if string_id is None:
+            return False
+        index = bisect_left(self.string_ids, string_id)
+        return index < self.length and self.string_ids[index] == string_id
+
+    def __iter__(self):
+        for string_id in self.string_ids:
+            yield self.compiled_vocabularies.get_string(string_id)
+
+    def __len__(self):
+        return self.length
+
+class LazyVocabularies(MutableMapping):
+    """
+    Vocabularies.vocabularies-sanakirjan korvaaja, joka muodostaa sanaston käännetystä tiedostosta
+    vasta, kun sanastoa haetaan ensimmäisen kerran. Sanaston olemassaolon tarkistaminen ei lataa sanastoa.
+    """
+
+    def __init__(self, compiled_vocabularies):
+        self.compiled_vocabularies = compiled_vocabularies
+        #sanastokoodit tiedoston järjestyksessä, arvoina ladatut sanastot tai None:
+        self.vocabularies = dict.fromkeys(compiled_vocabularies.header['vocabularies'])
+
+    def __getitem__(self, vocabulary_code):
+        vocabulary = self.vocabularies[vocabulary_code]
+        if vocabulary is None:
+            vocabulary = self.compiled_vocabularies.get_vocabulary(vocabulary_code)
+            self.vocabularies[vocabulary_code] = vocabulary
+        return vocabulary
+
+    def __setitem__(self, vocabulary_code, vocabulary):
+        self.vocabularies[vocabulary_code] = vocabulary
+
+    def __delitem__(self, vocabulary_code):
+        del self.vocabularies[vocabulary_code]
+
+    def __contains__(self, vocabulary_code):
+        return vocabulary_code in self.vocabularies
+
+    def __iter__(self):
+        return iter(self.vocabularies)
+
+    def __len__(self):
+        return len(self.vocabularies)
+
+    def get_loaded(self):
+        """
+        palauttaa ladattujen sanastojen koodit
+        """
+        return [code for code, vocabulary in self.vocabularies.items() if vocabulary is not None]
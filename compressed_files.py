@@ -0,0 +1,169 @@
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+import zlib
+
+#pakkausmuodot, niiden tiedostopäätteet ja tiedostojen alun tunnisteet:
+compression_formats = {
+    'gzip': ('.gz', b'\x1f\x8b'),
+    'bz2': ('.bz2', b'BZh'),
+    'xz': ('.xz', b'\xfd7zXZ\x00')
+}
+
+def detect_compression(path, read_magic=True):
+    """
+    Palauttaa tiedoston pakkausmuodon tiedostopäätteen tai tiedoston alun tunnisteen perusteella
+    tai None, jos tiedostoa ei ole pakattu.
+    read_magic: tarkistetaanko tiedoston alku, jos tiedostopääte ei ole pakkausmuodon pääte
+    """
+    for compression, (suffix, magic) in compression_formats.items():
+        if path.lower().endswith(suffix):
+            return compression
+    if read_magic:
+        with open(path, 'rb') as input_file:
+            start = input_file.read(8)
+        for compression, (suffix, magic) in compression_formats.items():
+            if start.startswith(magic):
+                return compression
+    return None
+
+def open_input(path):
+    """
+    Avaa luettavan tiedoston. Pakattu tiedosto puretaan virtana, jolloin tiedoston kohdat
+    (tell ja seek) ovat puretun tiedoston kohtia.
+    """
+    compression = detect_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
+
+def open_output(path, mode='wb', compression_level=None, background=False):
+    """
+    Avaa kirjoitettavan tiedoston. Tiedosto pakataan, jos sen tiedostopääte on jonkin pakkausmuodon pääte.
+    mode: 'wb' tai 'ab', jolloin pakattuun tiedostoon lisätään uusi pakattu jakso
+    compression_level: pakkaustaso, None jos käytetään pakkausmuodon oletustasoa
+    background: pakataanko tiedot taustasäikeessä
+    """
+    compression = detect_compression(path, read_magic=False)
+    if compression:
+        return CompressedWriter(path, compression, mode, compression_level, background)
+    return open(path, mode)
+
+class CompressedWriter():
+    """
+    Pakattu tulostiedosto, johon voi kirjoittaa kuten tavalliseen tiedostoon.
+    flush päättää pakatun jakson ja aloittaa uuden, joten tiedoston kohta (tell) on sen jälkeen jakson raja,
+    johon tiedosto voidaan katkaista ja jota voidaan jatkaa (ks. YsoConverter.write_checkpoint).
+    Kaikkien pakkausmuotojen purkajat lukevat peräkkäiset jaksot yhtenä tiedostona.
+    Taustasäikeessä pakattaessa kirjoitettavat tiedot välitetään säikeelle jonossa, ja zlib-, bz2- ja
+    lzma-pakkaus vapauttavat GIL-lukon, joten pakkaaminen tapahtuu samaan aikaan kuin konversio.
+    """
+    #taustasäikeen jonossa odottavien kirjoitusten enimmäismäärä:
+    queue_size = 64
+
+    def __init__(self, path, compression, mode='wb', compression_level=None, background=False):
+        self.name = path
+        self.compression = compression
+        self.compression_level = compression_level
+        self.file = open(path, mode)
+        self.compressor = None
+        self.error = None
+        self.thread = None
+        if background:
+            self.queue = queue.Queue(self.queue_size)
+            self.thread = threading.Thread(target=self.compress_queue, daemon=True)
+            self.thread.start()
+
+    def new_compressor(self):
+        if self.compression == 'gzip':
+            if self.compression_level is None:
+                return zlib.compressobj(wbits=31)
+            return zlib.compressobj(self.compression_level, wbits=31)
+        if self.compression == 'bz2':
+            if self.compression_level is None:
+                return bz2.BZ2Compressor()
+            return bz2.BZ2Compressor(self.compression_level)
+        if self.compression_level is None:
+            return lzma.LZMACompressor()
+        return lzma.LZMACompressor(preset=self.compression_level)
+
+    def compress(self, data):
+        if self.compressor is None:
+            self.compressor = self.new_compressor()
+        self.file.write(self.compressor.compress(data))
+
+    def end_section(self):
+        if self.compressor is not None:
+            self.file.write(self.compressor.flush())
+            self.compressor = None
+        self.file.flush()
+
+    def compress_queue(self):
+        """
+        Taustasäikeen silmukka: tavujonot pakataan, None päättää pakatun jakson ja False lopettaa säikeen.
+        """
+        while True:
+            data = self.queue.get()
+            if data is False:
+                self.queue.task_done()
+                return
+            try:
+                if data is None:
+                    self.end_section()
+                elif self.error is None:
+                    self.compress(data)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def check_error(self):
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise error
+
+    def write(self, data):
+        if self.thread:
+            self.check_error()
+            self.queue.put(bytes(data))
+        else:
+            self.compress(data)
+        return len(data)
+
+    def flush(self):
+        if self.thread:
+            self.queue.put(None)
+            self.queue.join()
+            self.check_error()
+        else:
+            self.end_section()
+
+    def tell(self):
+        return self.file.tell()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            if self.thread:
+                self.queue.put(False)
+                self.thread.join()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
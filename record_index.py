@@ -0,0 +1,199 @@
+from pymarc import constants
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+
+def read_record_id(data, start, end):
+    """
+    palauttaa tietueen 001-kentän sisällön tavujonona tai tyhjän tavujonon, jos kenttää ei löydy
+    data: tietueen sisältävä tavujono tai muistikuvaus, jossa tietue on kohdissa start-end
+    """
+    try:
+        base_address = int(data[start + 12:start + 17])
+        directory = data[start + constants.LEADER_LEN:min(start + base_address - 1, end)]
+    except ValueError:
+        return b""
+    for entry_start in range(0, len(directory), constants.DIRECTORY_ENTRY_LEN):
+        if directory[entry_start:entry_start + 3] == b"001":
+            try:
+                entry_length = int(directory[entry_start + 3:entry_start + 7])
+                entry_offset = int(directory[entry_start + 7:entry_start + 12])
+            except ValueError:
+                return b""
+            field_start = start + base_address + entry_offset
+            return data[field_start:min(field_start + entry_length - 1, end)]
+    return b""
+
+class RecordIndex():
+    """
+    MARC21-tiedoston tietueiden sijaintihakemisto. Tiedosto avataan mmap-muistikuvauksena, ja tietueiden
+    alkukohdat ja pituudet selvitetään tietueiden nimiöistä purkamatta tietueita. Tietueet jaetaan samoin
+    kuin YsoConverter.read_raw_records-metodissa: tietue, jonka pituutta ei voida tulkita, merkitään pituudella 0.
+    Tietueiden alkukohdat ovat peräkkäisiä, joten mikä tahansa tietueiden väli vastaa yhtä tavualuetta,
+    jonka työprosessi voi lukea itse (ks. get_ranges).
+
+    Hakemisto voidaan tallentaa lähdetiedoston viereen, jolloin se luetaan seuraavalla kerralla tiedostosta,
+    jos lähdetiedoston koko ja muokkausaika eivät ole muuttuneet.
+    Tiedoston rakenne: tunniste, tietueiden alkukohdat (64-bittisiä, viimeisenä tiedoston pituus),
+    tietueiden pituudet, tietueiden 001-kenttien tunnisteet erotinmerkein eroteltuina
+    ja lopussa JSON-otsake sekä sen sijainti ja pituus.
+    """
+    magic = b"YSOIDX01"
+    trailer = struct.Struct("<QQ")
+    suffix = ".idx"
+
+    def __init__(self, path, save=False):
+        """
+        path: MARC21-tiedoston polku
+        save: tallennetaanko hakemisto lähdetiedoston viereen ja luetaanko aiemmin tallennettu hakemisto
+        """
+        self.path = path
+        self.index_path = path + self.suffix
+        self.mm = None
+        stat = os.stat(path)
+        self.source = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        if stat.st_size > 0:
+            with open(path, 'rb') as input_file:
+                self.mm = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.record_ids = None
+        if not (save and self.load()):
+            self.build()
+            if save:
+                self.save()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
+    def build(self):
+        """
+        Käy tiedoston läpi tietueiden nimiöiden pituuksien mukaan.
+        """
+        self.offsets = array('Q')
+        self.lengths = array('Q')
+        record_ids = []
+        size = self.source['size']
+        position = 0
+        while position < size:
+            self.offsets.append(position)
+            try:
+                if position + 5 > size:
+                    raise ValueError
+                length = int(self.mm[position:position + 5])
+            except ValueError:
+                #nimiön pituus ei ole kokonaisluku tai tiedosto päättyy kesken nimiön:
+                self.lengths.append(0)
+                record_ids.append(b"")
+                position = min(position + 5, size)
+                continue
+            if length < 5:
+                #MARCReaderin tavoin lyhyeksi merkitty tietue jatkuu tiedoston loppuun:
+                end = size
+            else:
+                end = min(position + length, size)
+            self.lengths.append(end - position)
+            record_ids.append(self.read_record_id(position, end))
+            position = end
+        self.offsets.append(size)
+        self.record_ids = record_ids
+
+    def read_record_id(self, start, end):
+        return read_record_id(self.mm, start, end)
+
+    def save(self):
+        record_ids = b"\x1e".join(self.record_ids)
+        header = {'source': self.source, 'byteorder': sys.byteorder, 'records': len(self.lengths)}
+        with open(self.index_path, 'wb') as output_file:
+            output_file.write(self.magic)
+            header['offsets'] = output_file.tell()
+            self.offsets.tofile(output_file)
+            header['lengths'] = output_file.tell()
+            self.lengths.tofile(output_file)
+            header['record_ids'] = output_file.tell()
+            output_file.write(record_ids)
+            header_offset = output_file.tell()
+            encoded_header = json.dumps(header, sort_keys=True).encode('utf-8')
+            output_file.write(encoded_header)
+            output_file.write(self.trailer.pack(header_offset, len(encoded_header)))
+
+    def load(self):
+        """
+        Lukee tallennetun hakemiston. Palauttaa False, jos hakemistoa ei ole tai se ei vastaa lähdetiedostoa.
+        """
+        try:
+            with open(self.index_path, 'rb') as index_file:
+                data = index_file.read()
+            if data[:len(self.magic)] != self.magic:
+                return False
+            header_offset, header_length = self.trailer.unpack(data[-self.trailer.size:])
+            header = json.loads(data[header_offset:header_offset + header_length].decode('utf-8'))
+        except (OSError, ValueError, struct.error):
+            return False
+        if header['source'] != self.source or header['byteorder'] != sys.byteorder:
+            return False
+        records = header['records']
+        self.offsets = array('Q')
+        self.offsets.frombytes(data[header['offsets']:header['lengths']])
+        self.lengths = array('Q')
+        self.lengths.frombytes(data[header['lengths']:header['record_ids']])
+        if len(self.offsets) != records + 1 or len(self.lengths) != records:
+            return False
+        if records:
+            self.record_ids = data[header['record_ids']:header_offset].split(b"\x1e")
+        else:
+            self.record_ids = []
+        #erotinmerkki voi esiintyä viallisen tietueen tunnisteessa:
+        return len(self.record_ids) == records
+
+    def get_view(self, position):
+        """
+        palauttaa tietueen muistikuvauksen osana kopioimatta sitä tai None, jos tietueen pituus on virheellinen
+        """
+        if not self.lengths[position]:
+            return None
+        offset = self.offsets[position]
+        return memoryview(self.mm)[offset:offset + self.lengths[position]]
+
+    def get_record(self, position):
+        """
+        palauttaa tietueen tavujonona tai None, jos tietueen pituus on virheellinen
+        """
+        if not self.lengths[position]:
+            return None
+        offset = self.offsets[position]
+        return self.mm[offset:offset + self.lengths[position]]
+
+    def get_records(self, first=0, last=None):
+        """
+        palauttaa tietueet järjestysnumeroiden first ja last väliltä kuten read_raw_records
+        """
+        if last is None:
+            last = len(self)
+        for position in range(first, last):
+            yield self.get_record(position)
+
+    def find(self, record_ids, first=0, last=None):
+        """
+        palauttaa niiden tietueiden järjestysnumerot, joiden 001-kenttä on record_ids-joukossa
+        """
+        if last is None:
+            last = len(self)
+        encoded_ids = set(record_id.encode('utf-8') for record_id in record_ids)
+        return [position for position in range(first, last) if self.record_ids[position] in encoded_ids]
+
+    def get_ranges(self, first=0, last=None, records=500):
+        """
+        Jakaa tietueet first ja last väliltä enintään records tietueen eriin.
+        Palauttaa erien alku- ja loppukohdat tiedostossa.
+        """
+        if last is None:
+            last = len(self)
+        return [(self.offsets[start], self.offsets[min(start + records, last)])
+            for start in range(first, last, records)]
@@ -0,0 +1,105 @@
+import unittest
+import os
+import shutil
+import tempfile
+from rdflib import Graph
+from vocabularies import Vocabularies
+from compiled_vocabularies import CompiledVocabularies
+
+class CompiledVocabulariesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.vocabularies = Vocabularies()
+        vocabulary_files = {
+            'allars': 'test/allars-skos-test.rdf',
+            'musa': 'test/musa-skos-test.rdf',
+            'seko': 'test/seko-skos-test.rdf',
+            'slm': 'test/slm-skos-test.rdf',
+            'ysa': 'test/ysa-skos-test.rdf',
+            'yso-paikat': 'test/yso-paikat-skos-test.rdf',
+            'yso': 'test/yso-skos-test.rdf'
+        }
+        graphs = {}
+        vocabulary_names = ['ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'cilla', 'seko']
+        for vf in vocabulary_files:
+            g = Graph()
+            graphs.update({vf: g})
+            g.parse(vocabulary_files[vf])
+        for vocabulary_name in vocabulary_names:
+            cls.vocabularies.parse_vocabulary(vocabulary_name, graphs)
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, "vocabularies.bin")
+        CompiledVocabularies.compile(cls.vocabularies, path)
+        cls.compiled_vocabularies = CompiledVocabularies(path).get_vocabularies()
+        return super(CompiledVocabulariesTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_tables(self):
+        for vocabulary_code, vocabulary in self.vocabularies.vocabularies.items():
+            compiled_vocabulary = self.compiled_vocabularies.vocabularies[vocabulary_code]
+            self.assertEqual(compiled_vocabulary.target_vocabulary_code, vocabulary.target_vocabulary_code)
+            self.assertEqual(compiled_vocabulary.language_codes, vocabulary.language_codes)
+            for table_name in CompiledVocabularies.table_names:
+                table = getattr(vocabulary, table_name)
+                compiled_table = getattr(compiled_vocabulary, table_name)
+                self.assertEqual(len(compiled_table), len(table))
+                self.assertEqual(sorted(compiled_table), sorted(table))
+                if isinstance(table, dict):
+                    for key in table:
+                        self.assertEqual(self.to_builtin(compiled_table[key]), table[key])
+                else:
+                    self.assertEqual(set(compiled_table), table)
+
+    def to_builtin(self, value):
+        if isinstance(value, (str, list)):
+            return value
+        if isinstance(value, frozenset):
+            return set(value)
+        return {key: self.to_builtin(value[key]) for key in value}
+
+    def test_missing_keys(self):
+        ysa = self.compiled_vocabularies.vocabularies['ysa']
+        self.assertFalse('puuttuva termi' in ysa.labels)
+        self.assertFalse(None in ysa.labels)
+        self.assertFalse('puuttuva termi' in ysa.geographical_concepts)
+        with self.assertRaises(KeyError):
+            ysa.labels['puuttuva termi']
+        #termi, joka on tallennettu vain toisen sanaston taulukkoon:
+        self.assertFalse('http://www.yso.fi/onto/yso/p29959' in ysa.labels)
+
+    def test_search(self):
+        vocabulary_orders = [[('numeric', 'fi'), ('ysa', 'fi'), ('allars', 'sv')],
+            [('slm', 'fi'), ('musa', 'fi'), ('ysa', 'fi'), ('slm', 'sv'), ('cilla', 'sv'), ('allars', 'sv')]]
+        for keyword in ['1900-luku', 'ragat', 'Ragor', 'tuomarit', 'roudarit', 'membraanit', 'puuttuva termi']:
+            for vocabulary_order in vocabulary_orders:
+                for all_languages in [False, True]:
+                    self.assertEqual(self.search(self.compiled_vocabularies, keyword, vocabulary_order, all_languages),
+                        self.search(self.vocabularies, keyword, vocabulary_order, all_languages))
+
+    def test_lazy_loading(self):
+        compiled_vocabularies = CompiledVocabularies(os.path.join(self.directory, "vocabularies.bin")).get_vocabularies()
+        self.assertEqual(compiled_vocabularies.get_loaded_vocabularies(), [])
+        self.assertTrue('ysa' in compiled_vocabularies.vocabularies)
+        self.assertFalse('puuttuva' in compiled_vocabularies.vocabularies)
+        self.assertEqual(sorted(compiled_vocabularies.vocabularies), sorted(self.vocabularies.vocabularies))
+        self.assertEqual(compiled_vocabularies.get_loaded_vocabularies(), [])
+        compiled_vocabularies.search('ragat', [('ysa', 'fi'), ('allars', 'sv')], True)
+        self.assertEqual(sorted(compiled_vocabularies.get_loaded_vocabularies()), ['ysa', 'yso'])
+        compiled_vocabularies.load_vocabularies(['slm', 'puuttuva'])
+        self.assertEqual(sorted(compiled_vocabularies.get_loaded_vocabularies()), ['slm', 'ysa', 'yso'])
+        #korvattu sanasto:
+        compiled_vocabularies.vocabularies.update({'seko': self.vocabularies.vocabularies['seko']})
+        self.assertTrue(compiled_vocabularies.vocabularies['seko'] is self.vocabularies.vocabularies['seko'])
+
+    def search(self, vocabularies, keyword, vocabulary_order, all_languages):
+        try:
+            return vocabularies.search(keyword, vocabulary_order, True, all_languages)
+        except ValueError as e:
+            return str(e)
+
+if __name__ == "__main__":
+    unittest.main()
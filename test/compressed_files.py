@@ -0,0 +1,64 @@
+import unittest
+import os
+import shutil
+import tempfile
+from compressed_files import detect_compression, open_input, open_output, CompressedWriter
+
+class CompressedFilesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        with open("test/test_records.mrc", 'rb') as input_file:
+            cls.data = input_file.read()
+        return super(CompressedFilesTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_detect_compression(self):
+        path = os.path.join(self.directory, "records.mrc.gz")
+        with open_output(path) as output_file:
+            output_file.write(self.data)
+        self.assertEqual(detect_compression(path), 'gzip')
+        #pakkausmuoto tunnistetaan tiedoston alusta, jos tiedostopääte ei ole pakkausmuodon pääte:
+        renamed_path = os.path.join(self.directory, "records.dat")
+        shutil.copyfile(path, renamed_path)
+        self.assertEqual(detect_compression(renamed_path), 'gzip')
+        self.assertIsNone(detect_compression(renamed_path, read_magic=False))
+        self.assertIsNone(detect_compression("test/test_records.mrc"))
+        with open_input(renamed_path) as input_file:
+            self.assertEqual(input_file.read(), self.data)
+
+    def test_write_and_read(self):
+        for suffix in [".gz", ".bz2", ".xz"]:
+            for background in [False, True]:
+                with self.subTest(suffix=suffix, background=background):
+                    path = os.path.join(self.directory, "output.mrc" + suffix)
+                    with open_output(path, compression_level=1, background=background) as output_file:
+                        self.assertIsInstance(output_file, CompressedWriter)
+                        output_file.write(self.data[:1000])
+                        output_file.write(memoryview(self.data)[1000:])
+                    with open_input(path) as input_file:
+                        self.assertEqual(input_file.read(), self.data)
+
+    def test_append_after_flush(self):
+        for suffix in [".gz", ".bz2", ".xz"]:
+            with self.subTest(suffix=suffix):
+                path = os.path.join(self.directory, "appended.mrc" + suffix)
+                output_file = open_output(path, background=True)
+                output_file.write(self.data[:1000])
+                output_file.flush()
+                position = output_file.tell()
+                #tarkistuspisteen jälkeen kirjoitetut tiedot poistetaan katkaisemalla tiedosto:
+                output_file.write(b"kesken")
+                output_file.close()
+                os.truncate(path, position)
+                with open_output(path, 'ab') as output_file:
+                    output_file.write(self.data[1000:])
+                with open_input(path) as input_file:
+                    self.assertEqual(input_file.read(), self.data)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from pymarc import MARCReader
+from record_index import RecordIndex
+
+class RecordIndexTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        with open("test/test_records.mrc", 'rb') as input_file:
+            cls.data = input_file.read()
+        cls.record_ids = [record['001'].data for record in MARCReader(io.BytesIO(cls.data), to_unicode=True)]
+        return super(RecordIndexTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def write_input(self, name, data):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as output_file:
+            output_file.write(data)
+        return path
+
+    def test_records(self):
+        path = self.write_input("records.mrc", self.data + b"x0")
+        record_index = RecordIndex(path)
+        records = list(record_index.get_records())
+        self.assertEqual(len(record_index), len(self.record_ids) + 1)
+        self.assertEqual(b"".join(records[:-1]), self.data)
+        #tiedoston lopussa oleva vaillinainen nimiö:
+        self.assertIsNone(records[-1])
+        self.assertEqual(bytes(record_index.get_view(1)), records[1])
+        self.assertEqual(list(record_index.get_records(2, 4)), records[2:4])
+        positions = [position for position, record_id in enumerate(self.record_ids) if record_id == self.record_ids[3]]
+        self.assertEqual(record_index.find([self.record_ids[3], "puuttuu"]), positions)
+        self.assertEqual(record_index.find([self.record_ids[3]], 3, 4), [3])
+        record_index.close()
+
+    def test_ranges(self):
+        path = self.write_input("ranges.mrc", self.data)
+        record_index = RecordIndex(path)
+        ranges = record_index.get_ranges(1, 12, 5)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(b"".join(self.data[start:end] for start, end in ranges),
+            b"".join(record_index.get_records(1, 12)))
+        record_index.close()
+
+    def test_save(self):
+        path = self.write_input("saved.mrc", self.data)
+        record_index = RecordIndex(path, True)
+        record_index.close()
+        self.assertTrue(os.path.exists(path + RecordIndex.suffix))
+        loaded_index = RecordIndex(path, True)
+        self.assertEqual(loaded_index.offsets, record_index.offsets)
+        self.assertEqual(loaded_index.record_ids, record_index.record_ids)
+        loaded_index.close()
+        #muuttunut lähdetiedosto luetaan uudelleen:
+        self.write_input("saved.mrc", self.data[:record_index.offsets[2]])
+        changed_index = RecordIndex(path, True)
+        self.assertEqual(len(changed_index), 2)
+        changed_index.close()
+
+    def test_empty_file(self):
+        record_index = RecordIndex(self.write_input("empty.mrc", b""))
+        self.assertEqual(len(record_index), 0)
+        self.assertEqual(record_index.get_ranges(), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import os
+import shutil
+import tempfile
+from rdflib import Graph
+from rdflib.namespace import SKOS
+from vocabulary import ConceptIndex
+from triple_reader import read_triples, read_turtle
+
+class TripleReaderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.graphs = {}
+        for code in ['yso', 'ysa', 'slm']:
+            g = Graph()
+            g.parse('test/%s-skos-test.rdf'%code)
+            g.serialize(os.path.join(cls.directory, code + ".ttl"), format='turtle')
+            g.serialize(os.path.join(cls.directory, code + ".nt"), format='nt')
+            cls.graphs.update({code: g})
+        return super(TripleReaderTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def assertSameIndex(self, index, g):
+        graph_index = ConceptIndex()
+        graph_index.add_graph(g)
+        self.assertEqual(sorted(index.subjects), sorted(graph_index.subjects))
+        for subject, properties in graph_index.subjects.items():
+            self.assertEqual(set(index.subjects[subject]), set(properties))
+            for key in properties:
+                self.assertEqual(sorted(index.subjects[subject][key]), sorted(properties[key]))
+
+    def test_read_triples(self):
+        for code, g in self.graphs.items():
+            for extension in ['ttl', 'nt']:
+                index = ConceptIndex()
+                read_triples(os.path.join(self.directory, code + "." + extension), index)
+                self.assertSameIndex(index, g)
+
+    def test_read_turtle_in_chunks(self):
+        #pienellä palakoolla tiedosto jäsennetään useassa osassa:
+        for code, g in self.graphs.items():
+            index = ConceptIndex()
+            read_turtle(os.path.join(self.directory, code + ".ttl"), index, chunk_size=100)
+            self.assertSameIndex(index, g)
+
+    def test_duplicate_triples(self):
+        path = os.path.join(self.directory, "duplicates.nt")
+        with open(path, 'w', encoding='utf-8') as output:
+            for _ in range(2):
+                output.write('<http://www.yso.fi/onto/yso/p1> <http://www.w3.org/2004/02/skos/core#prefLabel> "testi"@fi .\n')
+        index = ConceptIndex()
+        read_triples(path, index)
+        self.assertEqual(len(index.subjects['http://www.yso.fi/onto/yso/p1'][SKOS.prefLabel]), 1)
+
+if __name__ == "__main__":
+    unittest.main()
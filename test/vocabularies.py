@@ -1,8 +1,12 @@
 import unittest
+import copy
+import random
+import re
+import unicodedata
 from rdflib import Graph, URIRef, Namespace, RDF
 from pymarc import Record, Field
 from vocabulary import Vocabulary
-from vocabularies import Vocabularies
+from vocabularies import Vocabularies, SearchCache
 
 
 class VocabulariesTest(unittest.TestCase):
@@ -79,6 +83,184 @@ class VocabulariesTest(unittest.TestCase):
         with self.assertRaises(ValueError) as e:
             result = self.vocabularies.search('tuomarit', [('ysa', 'fi')], True)
         self.assertTrue("4" in str(e.exception)) 
+    def test_search_cache(self):
+        self.vocabularies.search_cache = SearchCache(2)
+        vocabulary_order = [('ysa', 'fi'), ('allars', 'sv')]
+        result = self.vocabularies.search('ragat', vocabulary_order, True)
+        self.assertTrue(self.vocabularies.search('ragat', vocabulary_order, True) is result)
+        #vastauksia ei voi muuttaa:
+        with self.assertRaises(TypeError):
+            result[0]['label'] = "muutettu"
+        self.assertTrue(isinstance(result[0]['uris'], tuple))
+        #virhekoodit tallennetaan:
+        for _ in range(2):
+            with self.assertRaises(ValueError) as e:
+                self.vocabularies.search('membraanit', vocabulary_order, True)
+            self.assertEqual(str(e.exception), "2")
+        self.assertEqual(self.vocabularies.search_cache.get_statistics(), {"osumia": 2, "ohituksia": 2, "poistettuja": 0})
+        #eri parametrit ovat eri hakuja:
+        self.vocabularies.search('ragat', vocabulary_order, True, True)
+        self.assertEqual(self.vocabularies.search_cache.get_statistics(), {"osumia": 2, "ohituksia": 3, "poistettuja": 1})
+        self.assertTrue(self.vocabularies.search('ragat', vocabulary_order, True) == result)
+        self.assertEqual(self.vocabularies.search_cache.get_statistics()["ohituksia"], 4)
+        self.vocabularies.search_cache = SearchCache(0)
+        self.vocabularies.search('ragat', vocabulary_order, True)
+        self.assertEqual(len(self.vocabularies.search_cache.results), 0)
+        self.vocabularies.search_cache = SearchCache()
+
+    def test_search_many(self):
+        self.vocabularies.search_cache = SearchCache()
+        vocabulary_order = [('ysa', 'fi'), ('allars', 'sv')]
+        searches = [
+            ('ragat', vocabulary_order, True, False),
+            ('membraanit', vocabulary_order, True, False),
+            ('ragat', vocabulary_order, True, True),
+            ('ragat', [('ysa', 'fi'), ('allars', 'sv')], True, False)
+        ]
+        results = self.vocabularies.search_many(searches)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(results[0], (self.vocabularies.search('ragat', vocabulary_order, True), None))
+        self.assertEqual(results[1], (None, "2"))
+        self.assertEqual(results[2][0], self.vocabularies.search('ragat', vocabulary_order, True, True))
+        #toistuva haku tehdään vain kerran:
+        self.assertTrue(results[3][0] is results[0][0])
+        self.assertEqual(self.vocabularies.search_cache.get_statistics()["ohituksia"], 3)
+        self.assertEqual(self.vocabularies.search_many([]), [])
+        self.vocabularies.search_cache = SearchCache()
+
+    def test_search_plan(self):
+        #hakujärjestykset ja all_languages-parametrin arvot:
+        vocabulary_orders = [
+            ([('numeric', 'fi'), ('ysa', 'fi'), ('allars', 'sv')], True),
+            ([('slm', 'sv'), ('cilla', 'sv'), ('allars', 'sv'), ('slm', 'fi'), ('musa', 'fi'), ('ysa', 'fi'), ('numeric', 'sv')], True),
+            ([('seko', 'fi')], False)
+        ]
+        keywords = set()
+        for code in ['ysa', 'allars', 'musa', 'seko']:
+            for label in self.vocabularies.vocabularies[code].labels:
+                keywords.update([label, label.upper(), label.capitalize(), label + " ", label + "x"])
+        keywords.update(['1900-luku', 'Helsinki -- Töölö', 'RAGAT', 'ragor'])
+        #hakusuunnitelman tulokset ovat samat kuin sanastoista yksi kerrallaan haettaessa:
+        for vocabulary_order, all_languages in vocabulary_orders:
+            for search_geographical_concepts in [True, False]:
+                for keyword in keywords:
+                    try:
+                        responses = self.vocabularies.search_vocabularies(keyword, vocabulary_order,
+                            search_geographical_concepts, all_languages)
+                    except ValueError as e:
+                        responses = str(e)
+                    normalized_keyword = unicodedata.normalize('NFKC', keyword).strip()
+                    try:
+                        expected_responses, _ = self.vocabularies.search_vocabulary_steps(normalized_keyword,
+                            vocabulary_order, search_geographical_concepts, all_languages)
+                        if expected_responses is None:
+                            raise ValueError("1")
+                        expected_responses = self.vocabularies.freeze_responses(expected_responses)
+                    except ValueError as e:
+                        expected_responses = str(e)
+                    self.assertEqual(responses, expected_responses, keyword)
+                #hakusuunnitelma käännetään kerran hakujärjestystä ja hakuparametreja kohden:
+                key = (tuple(vocabulary_order), search_geographical_concepts, all_languages)
+                self.assertTrue(self.vocabularies.get_search_plan(vocabulary_order, search_geographical_concepts,
+                    all_languages) is self.vocabularies.search_plans[key])
+
+    def test_search_plan_errors(self):
+        #YSO-paikkojen käsitteellä korvattu YSO-käsite on umpikuja, eikä sen virhe vaikuta muihin hakusanoihin:
+        yso = copy.copy(self.vocabularies.vocabularies['yso'])
+        uri = 'http://www.yso.fi/onto/yso/p30038'
+        yso.labels = {key: value for key, value in yso.labels.items() if key != uri}
+        yso.deprecated_concepts = {}
+        yso.deprecated_replacements = {}
+        yso.resolve_deprecated_concepts(dict(yso.replaced_by, **{uri: ['http://www.yso.fi/onto/yso/p94137']}))
+        vocabularies = Vocabularies()
+        vocabularies.vocabularies.update(self.vocabularies.vocabularies)
+        vocabularies.vocabularies.update({'yso': yso})
+        vocabulary_order = [('ysa', 'fi'), ('allars', 'sv')]
+        for keyword in ['ragat', 'Helsinki', 'abstrakti taide', 'puuttuva termi', 'ragat']:
+            try:
+                responses = vocabularies.search_vocabularies(keyword, vocabulary_order, True)
+            except ValueError as e:
+                responses = str(e)
+            try:
+                expected_responses, _ = vocabularies.search_vocabulary_steps(keyword, vocabulary_order, True)
+                if expected_responses is None:
+                    raise ValueError("1")
+                expected_responses = vocabularies.freeze_responses(expected_responses)
+            except ValueError as e:
+                expected_responses = str(e)
+            self.assertEqual(responses, expected_responses, keyword)
+            if keyword == 'ragat':
+                self.assertEqual(responses, "2")
+        #vain hakusanat, joilla on tulos, tallennetaan hakusuunnitelmaan:
+        _, results = vocabularies.get_search_plan(vocabulary_order, True)[0]
+        self.assertEqual(results['ragat'], "2")
+        self.assertNotIn('puuttuva termi', results)
+
+    def test_is_numeric(self):
+        def is_numeric(keyword):
+            #aiempi toteutus, jolla käännettyjen lausekkeiden tuloksia verrataan
+            if keyword:
+                suffixes = ['-luku', '-luvut', '-talet', '-tal', 'ekr.', 'jkr.', 'fkr.', 'eaa.', 'jaa.', 'ekr', 'jkr', 'fkr', 'eaa', 'jaa']
+                keyword = keyword.replace(" ", "")
+                for suffix in suffixes:
+                    keyword = keyword.replace(suffix, "")
+                    keyword = re.sub(r'(?i)' + suffix, '', keyword)
+                if any(not char.isdigit() and char not in Vocabularies.dashes for char in keyword):
+                    return False
+                return True
+            return False
+
+        for keyword in ['1900-luku', '1939–1945', '400 fKr.', '1800-TALET', '44 e.Kr.', '-', '', 'kemia', '²']:
+            self.assertEqual(self.vocabularies.is_numeric(keyword), is_numeric(keyword), keyword)
+        #satunnaiset merkkijonot päätteiden kirjaimista, numeroista, viivoista ja muista merkeistä:
+        characters = "0123456789 -.–²lukvtaerjfLUKVTAERJF\u212axmäÅ\n"
+        random_generator = random.Random(648)
+        for _ in range(20000):
+            length = random_generator.randint(0, 12)
+            keyword = "".join(random_generator.choice(characters) for _ in range(length))
+            if random_generator.random() < 0.5:
+                suffix = random_generator.choice(Vocabularies.numeric_suffixes)
+                suffix = "".join(random_generator.choice([char, char.upper()]) for char in suffix)
+                position = random_generator.randint(0, len(keyword))
+                keyword = keyword[:position] + suffix + keyword[position:]
+            self.assertEqual(self.vocabularies.is_numeric(keyword), is_numeric(keyword), keyword)
+
+    def test_find_geographical_chain(self):
+        self.assertEqual(self.vocabularies.find_geographical_chain(['Helsinki', 'Töölö']), 2)
+        self.assertEqual(self.vocabularies.find_geographical_chain(['Helsinki', 'Töölö', 'polkka']), 2)
+        self.assertEqual(self.vocabularies.find_geographical_chain(['Töölö', 'Helsinki']), 0)
+        vocabularies = Vocabularies()
+        ysa = Vocabulary('ysa', ['fi'])
+        ysa.geographical_chained_labels.update(['Suomi -- Helsinki', 'Suomi -- Helsinki -- Töölö', 'Helsinki -- Töölö'])
+        ysa.create_geographical_chains()
+        allars = Vocabulary('allars', ['sv'])
+        allars.geographical_chained_labels.update(['Finland -- Åbo'])
+        allars.create_geographical_chains()
+        vocabularies.vocabularies.update({'ysa': ysa, 'allars': allars})
+        self.assertEqual(ysa.geographical_chains['Suomi']['Helsinki'][Vocabulary.chain_separator], {})
+        #pisin ketju valitaan:
+        self.assertEqual(vocabularies.find_geographical_chain(['Suomi', 'Helsinki', 'Töölö', 'Kamppi']), 3)
+        self.assertEqual(vocabularies.find_geographical_chain(['Suomi', 'Helsinki', 'Kamppi']), 2)
+        self.assertEqual(vocabularies.find_geographical_chain(['Suomi -- Helsinki', 'Töölö']), 2)
+        self.assertEqual(vocabularies.find_geographical_chain(['Finland', 'Åbo']), 2)
+        #yksi osakenttä ei muodosta ketjua:
+        self.assertEqual(vocabularies.find_geographical_chain(['Suomi -- Helsinki']), 0)
+        self.assertEqual(vocabularies.find_geographical_chain(['Suomi']), 0)
+
+    def test_get_deprecated_missing_relations(self):
+        vocabularies = Vocabularies()
+        yso = Vocabulary('yso', ['fi', 'sv'])
+        yso.labels.update({'p1': {'fi': 'yksi'}, 'p2': {'fi': 'kaksi'}})
+        #p3 korvattu voimassaolevalla, p4 deprekoidulla ja p5 ilman korvaajaa:
+        yso.deprecated_concepts.update({'p3': ['p1'], 'p4': ['p5'], 'p5': []})
+        ysa = Vocabulary('ysa', ['fi'])
+        ysa.labels.update({'a': {'p1'}, 'b': {'p3'}, 'c': {'p4'}, 'd': set(), 'e': {'p5'}, 'f': {'p6'}})
+        vocabularies.vocabularies.update({'yso': yso, 'ysa': ysa})
+        missing_relations = vocabularies.get_missing_relations(['ysa'], ['yso'])
+        self.assertEqual(missing_relations, [{'ysa': ['d']}, {'ysa': {'c': 'p4', 'e': 'p5', 'f': 'p6'}}])
+        ysa.labels.update({'c': {'p1'}, 'd': {'p2'}, 'e': {'p2'}, 'f': {'p2'}})
+        self.assertEqual(vocabularies.get_missing_relations(['ysa'], ['yso']), [{}, {}])
+
     """
     def test_get_missing_relations(self):
         #testi-YSAa, jonka kaikille käsitteille on vastine testi-YSOssa:
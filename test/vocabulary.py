@@ -1,7 +1,10 @@
 import unittest
-from rdflib import Graph, URIRef, Namespace, RDF
+import re
+import unidecode
+from rdflib import Graph, URIRef, Literal, Namespace, RDF
+from rdflib.namespace import SKOS
 from pymarc import Record, Field
-from vocabulary import Vocabulary
+from vocabulary import Vocabulary, ConceptIndex, PatchedMapping
 
 class VocabularyTest(unittest.TestCase):
 
@@ -54,7 +57,8 @@ class VocabularyTest(unittest.TestCase):
 
     def test_get_concept_with_label(self):
         result = self.slm.get_concept_with_label('ragat', 'fi')
-        self.assertEqual(result['label'], 'rāgat')
+        #prefLabel on tallennettu hakutuloksissa käytettävässä muodossa, jossa koostemerkki on kaksiosainen:
+        self.assertEqual(result['label'], 'ra\u0304gat')
         self.assertEqual(result['code'], 'slm/fin')
         self.assertTrue('http://urn.fi/URN:NBN:fi:au:slm:s786' in result['uris'])
         result = self.slm.get_concept_with_label('ragor', 'fi')
@@ -97,10 +101,177 @@ class VocabularyTest(unittest.TestCase):
         result = self.yso.get_concept_with_uri('http://www.yso.fi/onto/yso/p13y5y3007', 'sv')
         self.assertEqual(result, None) 
     
+    def test_concept_index(self):
+        slm_graph = Graph()
+        slm_graph.parse('test/slm-skos-test.rdf')
+        index = ConceptIndex()
+        index.add_graph(slm_graph)
+        concepts = dict(index.concepts())
+        properties = concepts['http://urn.fi/URN:NBN:fi:au:slm:s786']
+        self.assertEqual([str(l) for l in ConceptIndex.get_values(properties, lang='fi')], ['rāgat'])
+        self.assertEqual([str(l) for l in ConceptIndex.get_values(properties, lang='sv')], ['ragor'])
+        self.assertEqual([str(l) for l in ConceptIndex.get_values(properties, lang='fi', label_properties=[SKOS.altLabel])], ['ragat'])
+        self.assertEqual(ConceptIndex.get_values(properties, lang='sv', label_properties=[SKOS.altLabel]), [])
+        self.assertEqual([str(m) for m in ConceptIndex.get_values(properties, label_properties=[SKOS.exactMatch])],
+            ['http://id.loc.gov/authorities/genreForms/gf2014027180'])
+        #käsitejärjestelmä ei ole skos:Concept:
+        self.assertFalse('http://urn.fi/URN:NBN:fi:au:slm:s861' in concepts)
+
+    def test_shared_label_tables(self):
+        #samansisältöiset URI-joukot jaetaan hakutaulujen kesken:
+        self.assertTrue(self.ysa.labels['ragat'] is self.ysa.labels_lowercase['ragat'])
+        self.assertTrue(self.ysa.labels['ragat'] is self.ysa.stripped_labels['ragat'])
+        self.assertEqual(self.ysa.labels['ragat'], {'http://www.yso.fi/onto/yso/p30038'})
+        label_info = self.slm.labels['fi']['ragat']
+        self.assertTrue(label_info is self.slm.labels_lowercase['fi']['ragat'])
+        self.assertEqual(label_info, {"pref_label": {'rāgat'}, "uris": {'http://urn.fi/URN:NBN:fi:au:slm:s786'}})
+        for table in [self.ysa.labels, self.ysa.labels_lowercase, self.ysa.stripped_labels, self.ysa.labels_with_specifiers]:
+            self.assertTrue(all(isinstance(uris, frozenset) for uris in table.values()))
+
+    def test_resolutions(self):
+        #valmiiksi ratkaistujen hakujen tulokset vastaavat hakutaulujen läpikäyntiä järjestyksessä:
+        for vocabulary in [self.ysa, self.allars, self.musa]:
+            keywords = set()
+            for table in [vocabulary.labels, vocabulary.stripped_labels, vocabulary.labels_with_specifiers]:
+                for key in table:
+                    keywords.update([key, key.upper(), key.capitalize(), key + "x"])
+            for keyword in keywords:
+                self.assertEqual(self.resolve(vocabulary.get_uris_with_concept, keyword),
+                    self.resolve(self.get_uris_with_concept, vocabulary, keyword))
+
+    def resolve(self, function, *args):
+        try:
+            return function(*args)
+        except ValueError as e:
+            return str(e)
+
+    def get_uris_with_concept(self, vocabulary, concept):
+        uris = []
+        if concept in vocabulary.labels:
+            uris = vocabulary.labels[concept]
+        elif concept.lower() in vocabulary.labels_lowercase:
+            uris = vocabulary.labels_lowercase[concept.lower()]
+        elif concept.lower() in vocabulary.stripped_labels:
+            uris = vocabulary.stripped_labels[concept.lower()]
+        elif concept.lower() in vocabulary.labels_with_specifiers:
+            uris = vocabulary.labels_with_specifiers[concept.lower()]
+            if len(uris) > 1:
+                raise ValueError("4")
+            elif len(uris) == 1:
+                raise ValueError("3")
+        valid_uris = [uri for uri in sorted(uris) if uri not in vocabulary.deprecated_concepts]
+        if valid_uris:
+            return {"uris": valid_uris}
+
     def test_translate_label(self):
         result = self.slm.translate_label("http://urn.fi/URN:NBN:fi:au:slm:s786", "fi")
         self.assertEqual(result['label'], 'ragor')
         self.assertEqual(result['code'], 'slm/swe')
 
+    def test_resolve_deprecated_concepts(self):
+        def get_replacers(deprecated_dict, concept_uri, replacers):
+            #aiempi rekursiivinen toteutus
+            if concept_uri in deprecated_dict:
+                for replacer in deprecated_dict[concept_uri]:
+                    if not replacer in deprecated_dict:
+                        replacers.append(replacer)
+                    get_replacers(deprecated_dict, replacer, replacers)
+
+        deprecated_dict = {'d1': ['d2'], 'd2': ['d3'], 'd3': ['p1'], 'd4': ['p2', 'p3'], 'd5': [],
+            'd6': ['d7', 'd8'], 'd7': ['p4'], 'd8': ['p4'], 'd9': ['d1', 'p5'], 'd10': ['p6']}
+        vocabulary = Vocabulary("yso", ['fi', 'sv'])
+        #p6 ei ole sanaston käsite (esim. YSO-paikkojen käsite):
+        vocabulary.labels.update({'p1': {'fi': 'yksi'}, 'p4': {'sv': 'fyra'}})
+        with self.assertLogs(level='INFO') as logs:
+            report = vocabulary.resolve_deprecated_concepts(deprecated_dict)
+        for uri in deprecated_dict:
+            replacers = []
+            get_replacers(deprecated_dict, uri, replacers)
+            self.assertEqual(vocabulary.deprecated_concepts[uri], replacers)
+        self.assertEqual(vocabulary.deprecated_replacements, {'d1': 'p1', 'd2': 'p1', 'd3': 'p1', 'd4': '', 'd5': '',
+            'd6': '', 'd7': 'p4', 'd8': 'p4', 'd9': '', 'd10': ''})
+        self.assertEqual(report, {"depths": {0: 1, 1: 5, 2: 2, 3: 1, 4: 1}, "cycles": []})
+        self.assertTrue(any("ketjujen pituudet: 0: 1, 1: 5, 2: 2, 3: 1, 4: 1" in line for line in logs.output))
+        self.assertEqual(vocabulary.get_concept_with_uri('d1', 'fi')['uris'], ['p1'])
+        self.assertEqual(vocabulary.get_concept_with_uri('d7', 'sv')['label'], 'fyra')
+        #monitulkintainen korvaaja, korvaajaton käsite, sanastoon kuulumaton korvaaja
+        #ja korvaaja, jolla ei ole labelia haetulla kielellä:
+        for uri, language in [('d4', 'fi'), ('d5', 'fi'), ('d6', 'fi'), ('d10', 'fi'), ('d10', 'sv'), ('d7', 'fi')]:
+            with self.assertRaises(ValueError) as e:
+                vocabulary.get_concept_with_uri(uri, language)
+            self.assertEqual(str(e.exception), "2")
+
+        #syklit ja pitkät ketjut eivät keskeytä käsittelyä:
+        deprecated_dict = {'c1': ['c2'], 'c2': ['c3', 'p1'], 'c3': ['c1']}
+        deprecated_dict.update({'e%s'%i: ['e%s'%(i + 1)] for i in range(5000)})
+        deprecated_dict.update({'e5000': ['p2']})
+        vocabulary = Vocabulary("yso", ['fi'])
+        vocabulary.labels.update({'p1': {'fi': 'yksi'}, 'p2': {'fi': 'kaksi'}})
+        with self.assertLogs(level='WARNING') as logs:
+            report = vocabulary.resolve_deprecated_concepts(deprecated_dict)
+        self.assertEqual(report["cycles"], [['c1', 'c2', 'c3']])
+        self.assertTrue(any("c1 -> c2 -> c3 -> c1" in line for line in logs.output))
+        self.assertEqual(vocabulary.deprecated_replacements['c1'], 'p1')
+        self.assertEqual(vocabulary.deprecated_replacements['e0'], 'p2')
+        self.assertEqual(max(report["depths"]), 5001)
+
+    def test_patched_mapping(self):
+        base = {'a': 1, 'b': 2}
+        patched = PatchedMapping(base)
+        patched['c'] = 3
+        patched['a'] = 4
+        del patched['b']
+        self.assertEqual(dict(patched), {'a': 4, 'c': 3})
+        self.assertEqual(len(patched), 2)
+        self.assertFalse('b' in patched)
+        del patched['a']
+        self.assertEqual(dict(patched), {'c': 3})
+        self.assertEqual(base, {'a': 1, 'b': 2})
+
+    def test_patch_origin_vocabulary(self):
+        g = ConceptIndex()
+        g.add_graph(Graph().parse('test/ysa-skos-test.rdf'))
+        uri = "http://www.yso.fi/onto/ysa/Y112596"
+        old_concepts = {uri: g.subjects[uri]}
+        new_index = ConceptIndex()
+        for predicate, values in g.subjects[uri].items():
+            if predicate != SKOS.prefLabel and not isinstance(predicate, tuple):
+                for value in values:
+                    new_index.add_value(uri, predicate, value)
+        new_index.add_value(uri, SKOS.prefLabel, Literal("univaje (muutettu)", lang="fi"))
+        patched = Vocabulary("ysa", ['fi'])
+        patched.parse_origin_vocabulary(g)
+        patched.patch_origin_vocabulary(old_concepts, {uri: new_index.subjects[uri]})
+        g.subjects.update(new_index.subjects)
+        rebuilt = Vocabulary("ysa", ['fi'])
+        rebuilt.parse_origin_vocabulary(g)
+        for table_name in ['labels', 'labels_lowercase', 'stripped_labels', 'labels_with_and_without_specifiers',
+            'labels_with_specifiers', 'resolutions', 'label_concepts', 'label_variants']:
+            self.assertEqual(getattr(patched, table_name), getattr(rebuilt, table_name))
+        self.assertEqual(patched.resolve("univaje (muutettu)")[0], rebuilt.resolve("univaje (muutettu)")[0])
+
+    def test_remove_diacritical_chars(self):
+        def remove_diacritical_chars(word):
+            #aiempi toteutus, jossa jokainen merkki tarkistettiin säännöllisellä lausekkeella
+            result = ""
+            for letter in word:
+                match = re.match(r'.*([0-9a-zA-ZåäöÅÄÖ\- \'])', letter)
+                if match:
+                    result += letter
+                else:
+                    result += unidecode.unidecode(letter)
+            return result
+        characters = "".join(chr(ordinal) for ordinal in range(0x250)) + "ḀẞΩЖ—‐€"
+        self.assertEqual(self.slm.remove_diacritical_chars(characters), remove_diacritical_chars(characters))
+        self.assertEqual(self.slm.remove_diacritical_chars("Ääkkönen Zoë Ångström"), "Ääkkönen Zoe Ångström")
+
+    def test_normalize_characters(self):
+        self.assertEqual(self.slm.normalize_characters("rāgat Åbo Ärrä öljy"), "ra\u0304gat Åbo Ärrä öljy")
+        self.assertEqual(self.slm.normalize_characters("A\u030abo"), "Åbo")
+        #sanastojen labelit on normalisoitu valmiiksi:
+        for uri, labels in self.yso.labels.items():
+            for label in labels.values():
+                self.assertEqual(self.yso.normalize_characters(label), label)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
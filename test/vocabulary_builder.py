@@ -0,0 +1,108 @@
+import unittest
+import os
+import shutil
+import tempfile
+from rdflib import Graph, URIRef, Literal, Namespace
+from rdflib.namespace import SKOS, OWL, RDF
+from vocabulary_builder import VocabularyBuilder
+from compiled_vocabularies import CompiledVocabularies, CompiledProvenance
+
+class VocabularyBuilderTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.vocabulary_files = {}
+        for code in ['ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'seko']:
+            g = Graph()
+            g.parse('test/%s-skos-test.rdf'%code)
+            path = os.path.join(cls.directory, code + "-skos.ttl")
+            g.serialize(path, format='turtle')
+            cls.vocabulary_files.update({code: path})
+        return super(VocabularyBuilderTest, cls).setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_build(self):
+        builder = VocabularyBuilder()
+        built_vocabularies = builder.build(self.vocabulary_files)
+        self.assertEqual(sorted(built_vocabularies.vocabularies),
+            ['allars', 'cilla', 'musa', 'seko', 'slm', 'ysa', 'yso', 'yso-paikat'])
+        self.assertEqual(sorted(builder.timings), sorted(built_vocabularies.vocabularies))
+        result = built_vocabularies.search('ragat', [('slm', 'fi'), ('musa', 'fi'), ('ysa', 'fi')])
+        self.assertEqual(result[0]['uris'], ('http://urn.fi/URN:NBN:fi:au:slm:s786',))
+
+    def test_build_in_processes(self):
+        built_vocabularies = VocabularyBuilder().build(self.vocabulary_files)
+        builder = VocabularyBuilder(workers=2)
+        compiled_vocabularies = builder.build(self.vocabulary_files)
+        self.assertEqual(sorted(builder.timings), sorted(built_vocabularies.vocabularies))
+        for vocabulary_code, vocabulary in built_vocabularies.vocabularies.items():
+            compiled_vocabulary = compiled_vocabularies.vocabularies[vocabulary_code]
+            for table_name in CompiledVocabularies.table_names:
+                self.assertEqual(sorted(getattr(compiled_vocabulary, table_name)), sorted(getattr(vocabulary, table_name)))
+
+    def test_musa_dependency(self):
+        builder = VocabularyBuilder()
+        with self.assertRaises(ValueError):
+            builder.build({'musa': self.vocabulary_files['musa']})
+        #Ysan käsittelyn jälkeen Musa voidaan käsitellä erikseen:
+        builder.build({'ysa': self.vocabulary_files['ysa']})
+        built_vocabularies = builder.build({'musa': self.vocabulary_files['musa']})
+        self.assertEqual(sorted(built_vocabularies.vocabularies), ['cilla', 'musa'])
+        #Ysa voidaan käsitellä uudelleen, vaikka edelliset vastineet ovat tallessa:
+        built_vocabularies = builder.build({'ysa': self.vocabulary_files['ysa']})
+        self.assertEqual(built_vocabularies.vocabularies['ysa'].labels,
+            VocabularyBuilder().build({'ysa': self.vocabulary_files['ysa']}).vocabularies['ysa'].labels)
+
+    def test_update(self):
+        builder = VocabularyBuilder()
+        previous_path = os.path.join(self.directory, "previous.bin")
+        provenance_path = os.path.join(self.directory, "provenance.bin")
+        built_vocabularies = builder.build(self.vocabulary_files)
+        CompiledVocabularies.compile(built_vocabularies, previous_path)
+        CompiledProvenance.compile(built_vocabularies, provenance_path)
+        previous_vocabularies = CompiledVocabularies(previous_path).get_vocabularies()
+        CompiledProvenance(provenance_path).add_tables(previous_vocabularies)
+        new_files = dict(self.vocabulary_files)
+        yso = Namespace("http://www.yso.fi/onto/yso/")
+        dct = Namespace("http://purl.org/dc/terms/")
+        changes = {
+            #muutettu ja lisätty käsite sekä Musan käsitteen korvaajan muuttunut YSO-vastine:
+            'ysa': lambda g: (g.set((URIRef("http://www.yso.fi/onto/ysa/Y112596"), SKOS.prefLabel, Literal("univaje (muutettu)", lang="fi"))),
+                g.set((URIRef("http://www.yso.fi/onto/ysa/Y214680"), SKOS.exactMatch, yso.p2)),
+                g.add((URIRef("http://www.yso.fi/onto/ysa/Y1"), RDF.type, SKOS.Concept)),
+                g.add((URIRef("http://www.yso.fi/onto/ysa/Y1"), SKOS.prefLabel, Literal("uusi käsite", lang="fi"))),
+                g.add((URIRef("http://www.yso.fi/onto/ysa/Y1"), SKOS.exactMatch, yso.p1))),
+            #deprekoitu käsite ja poistettu käsite:
+            'yso': lambda g: (g.add((yso.p10, OWL.deprecated, Literal(True))),
+                g.add((yso.p10, dct.isReplacedBy, yso.p100)),
+                g.remove((yso.p1000, None, None)))
+        }
+        for code, change in changes.items():
+            g = Graph()
+            g.parse(self.vocabulary_files[code], format='ttl')
+            change(g)
+            path = os.path.join(self.directory, code + "-uusi.ttl")
+            g.serialize(path, format='turtle')
+            new_files.update({code: path})
+        with self.assertLogs(level='INFO') as logs:
+            updated_vocabularies = VocabularyBuilder().update(previous_vocabularies, self.vocabulary_files, new_files)
+        self.assertTrue(any("sanastossa ysa lisättyjä käsitteitä 1, poistettuja 0 ja muuttuneita 2" in line
+            for line in logs.output))
+        self.assertTrue(any("sanasto slm ei ole muuttunut" in line for line in logs.output))
+        rebuilt_vocabularies = VocabularyBuilder().build(new_files)
+        self.assertEqual(builder.get_differences(updated_vocabularies, rebuilt_vocabularies), [])
+        self.assertEqual(updated_vocabularies.vocabularies['ysa'].labels['uusi käsite'], {'http://www.yso.fi/onto/yso/p1'})
+        self.assertEqual(updated_vocabularies.vocabularies['musa'].labels['steel pan'], {'http://www.yso.fi/onto/yso/p2'})
+        #edellisen version sanastot eivät muutu:
+        self.assertEqual(previous_vocabularies.vocabularies['musa'].labels['steel pan'], {'http://www.yso.fi/onto/yso/p29959'})
+        #tarkistustilassa tulos verrataan kokonaan uudelleen muodostettuihin sanastoihin:
+        with self.assertLogs(level='INFO') as logs:
+            VocabularyBuilder().update(previous_vocabularies, self.vocabulary_files, new_files, verify=True)
+        self.assertTrue(any("päivitetyt sanastot tarkistettu" in line for line in logs.output))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import unittest
+import os
+import shutil
+import tempfile
+from vocabularies import Vocabularies
+from vocabulary import Vocabulary
+from vocabulary_cache import VocabularyCache
+
+class VocabularyCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, "cache")
+        self.source_files = {}
+        for code in ['ysa', 'yso']:
+            path = os.path.join(self.directory, code + "-skos.ttl")
+            with open(path, 'w') as output:
+                output.write(code)
+            self.source_files.update({code: path})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_key(self):
+        cache = VocabularyCache(self.cache_directory)
+        key = cache.get_key(self.source_files)
+        self.assertEqual(key, cache.get_key(self.source_files))
+        with open(self.source_files['yso'], 'w') as output:
+            output.write("yso 2")
+        self.assertNotEqual(key, cache.get_key(self.source_files))
+        with self.assertRaises(FileNotFoundError):
+            cache.get_key({'ysa': os.path.join(self.directory, "puuttuva.ttl")})
+
+    def test_store_and_load(self):
+        cache = VocabularyCache(self.cache_directory)
+        key = cache.get_key(self.source_files)
+        self.assertEqual(cache.load(key), None)
+        stored_vocabularies = Vocabularies()
+        stored_vocabularies.vocabularies.update({'ysa': Vocabulary('ysa', ['fi'])})
+        stored_vocabularies.vocabularies['ysa'].labels.update({'ragat': {'http://www.yso.fi/onto/yso/p29959'}})
+        cache.store(key, stored_vocabularies)
+        loaded_vocabularies = cache.load(key)
+        self.assertTrue('ysa' in loaded_vocabularies.vocabularies)
+        self.assertEqual(loaded_vocabularies.vocabularies['ysa'].labels['ragat'], {'http://www.yso.fi/onto/yso/p29959'})
+        #viallinen tiedosto käsitellään kuin puuttuva sukupolvi:
+        with open(cache.get_path(key), 'wb') as output:
+            output.write(b"viallinen")
+        self.assertEqual(cache.load(key), None)
+
+    def test_find_previous(self):
+        cache = VocabularyCache(self.cache_directory)
+        self.assertEqual(cache.find_previous(), None)
+        key = cache.get_key(self.source_files)
+        stored_vocabularies = Vocabularies()
+        stored_vocabularies.vocabularies.update({'ysa': Vocabulary('ysa', ['fi'])})
+        stored_vocabularies.vocabularies['ysa'].label_concepts.update({'ragat': {'http://www.yso.fi/onto/ysa/Y1'}})
+        cache.store(key, stored_vocabularies, self.source_files)
+        previous_vocabularies, previous_files = cache.find_previous()
+        #sanastojen päivittämiseen tarvittavat taulut luetaan erillisestä tiedostosta:
+        self.assertEqual(previous_vocabularies.vocabularies['ysa'].label_concepts['ragat'], {'http://www.yso.fi/onto/ysa/Y1'})
+        self.assertEqual(sorted(previous_files), ['ysa', 'yso'])
+        with open(previous_files['yso']) as input_file:
+            self.assertEqual(input_file.read(), "yso")
+
+    def test_missing_relations(self):
+        cache = VocabularyCache(self.cache_directory)
+        key = cache.get_key(self.source_files)
+        missing_relations = [{'ysa': ['ragat']}, {'allars': {'ragor': 'http://www.yso.fi/onto/yso/p1'}}]
+        cache.store(key, Vocabularies())
+        self.assertEqual(cache.load_missing_relations(key), None)
+        cache.store(key, Vocabularies(), missing_relations=missing_relations)
+        self.assertEqual(cache.load_missing_relations(key), missing_relations)
+
+    def test_evict_by_generations(self):
+        cache = VocabularyCache(self.cache_directory, max_generations=2)
+        keys = []
+        for idx in range(3):
+            with open(self.source_files['yso'], 'w') as output:
+                output.write("yso %s"%idx)
+            key = cache.get_key(self.source_files)
+            keys.append(key)
+            cache.store(key, Vocabularies())
+            #sukupolvien järjestys ratkaistaan muokkausajasta:
+            os.utime(os.path.join(self.cache_directory, key), (idx, idx))
+        cache.evict(keys[2])
+        self.assertEqual([key for key, _ in cache.get_generations()], [keys[2], keys[1]])
+
+    def test_evict_by_size(self):
+        cache = VocabularyCache(self.cache_directory, max_generations=10, max_size=1)
+        first_key = cache.get_key(self.source_files)
+        cache.store(first_key, Vocabularies())
+        with open(self.source_files['yso'], 'w') as output:
+            output.write("yso 2")
+        second_key = cache.get_key(self.source_files)
+        cache.store(second_key, Vocabularies())
+        #käytössä olevaa sukupolvea ei poisteta, vaikka se ylittäisi kokorajan:
+        self.assertEqual([key for key, _ in cache.get_generations()], [second_key])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import unittest
+import hashlib
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+from vocabulary_downloader import VocabularyDownloader
+
+class VocabularyRequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Finto-rajapintaa korvaava palvelin, joka tarjoilee testisanastot ETag- ja Last-Modified-otsakkeineen.
+    """
+    last_modified = "Mon, 01 Jun 2020 00:00:00 GMT"
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        code, file_name = self.path.strip("/").split("/")[-2:]
+        path = os.path.join(self.server.directory, code + "-skos-test.rdf")
+        if code in self.server.failing or not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as input_file:
+            data = input_file.read()
+        etag = '"%s"'%hashlib.sha1(data).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.last_modified)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if code in self.server.truncated:
+            #keskeytynyt lataus:
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class VocabularyDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.server_directory = os.path.join(self.directory, "server")
+        os.makedirs(self.server_directory)
+        for code in ['ysa', 'yso', 'slm']:
+            shutil.copyfile(os.path.join(os.path.dirname(__file__), code + "-skos-test.rdf"),
+                os.path.join(self.server_directory, code + "-skos-test.rdf"))
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), VocabularyRequestHandler)
+        self.server.directory = self.server_directory
+        self.server.requests = []
+        self.server.failing = set()
+        self.server.truncated = set()
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        self.data_url = "http://127.0.0.1:%s/download/"%self.server.server_port
+        self.vocabulary_files = {"ysa": "ysa-skos.ttl", "yso": "yso-skos.ttl", "slm": "slm-skos.ttl"}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as input_file:
+            return input_file.read()
+
+    def test_download(self):
+        downloader = VocabularyDownloader(self.data_url, self.directory)
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results, {code: VocabularyDownloader.DOWNLOADED for code in self.vocabulary_files})
+        for code, file_name in self.vocabulary_files.items():
+            self.assertEqual(self.read(os.path.join(self.directory, file_name)),
+                self.read(os.path.join(self.server_directory, code + "-skos-test.rdf")))
+        self.assertFalse(any(file_name.endswith(".tmp") for file_name in os.listdir(self.directory)))
+
+        #muuttumattomia sanastoja ei ladata uudelleen:
+        path = os.path.join(self.directory, "yso-skos.ttl")
+        mtime = os.stat(path).st_mtime_ns
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results, {code: VocabularyDownloader.NOT_MODIFIED for code in self.vocabulary_files})
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+        #muuttunut sanasto ladataan:
+        with open(os.path.join(self.server_directory, "yso-skos-test.rdf"), 'ab') as output:
+            output.write(b"\n")
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results['yso'], VocabularyDownloader.DOWNLOADED)
+        self.assertEqual(results['ysa'], VocabularyDownloader.NOT_MODIFIED)
+        self.assertEqual(self.read(path), self.read(os.path.join(self.server_directory, "yso-skos-test.rdf")))
+
+        #levyltä poistettu tai muutettu tiedosto ladataan ehdoitta:
+        os.remove(path)
+        with open(os.path.join(self.directory, "ysa-skos.ttl"), 'ab') as output:
+            output.write(b"muutos")
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results['yso'], VocabularyDownloader.DOWNLOADED)
+        self.assertEqual(results['ysa'], VocabularyDownloader.DOWNLOADED)
+        self.assertEqual(results['slm'], VocabularyDownloader.NOT_MODIFIED)
+
+    def test_failed_download(self):
+        downloader = VocabularyDownloader(self.data_url, self.directory)
+        downloader.download(self.vocabulary_files)
+        path = os.path.join(self.directory, "yso-skos.ttl")
+        content = self.read(path)
+        with open(os.path.join(self.server_directory, "yso-skos-test.rdf"), 'ab') as output:
+            output.write(b"\n")
+        self.server.truncated.add('yso')
+        self.server.failing.add('ysa')
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results, {'ysa': VocabularyDownloader.FAILED, 'yso': VocabularyDownloader.FAILED,
+            'slm': VocabularyDownloader.NOT_MODIFIED})
+        #keskeytynyt lataus ei korvaa edellistä tiedostoa:
+        self.assertEqual(self.read(path), content)
+        self.assertFalse(any(file_name.endswith(".tmp") for file_name in os.listdir(self.directory)))
+        self.server.truncated.clear()
+        results = downloader.download(self.vocabulary_files)
+        self.assertEqual(results['yso'], VocabularyDownloader.DOWNLOADED)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,14 @@ import unittest
 import re
 from vocabularies import Vocabularies
 from rdflib import Graph, URIRef, Namespace, RDF
-from pymarc import Record, Field
-from yso_converter import YsoConverter, readCommandLineArguments
+from pymarc import Record, Field, MARCReader, MARCWriter, XMLWriter
+from yso_converter import YsoConverter, LazyField, readCommandLineArguments
 import csv
+import io
+import os
+import shutil
 import sys
+import tempfile
 from unittest.mock import Mock, patch
 
 class YsoConversionTest(unittest.TestCase):
@@ -473,6 +477,214 @@ class YsoConversionTest(unittest.TestCase):
             for r in test_field['results']:
                 self.assertTrue(any(r == str(rf) for rf in result_fields))
       
+    def test_scan_vocabulary_codes(self):
+        directory = tempfile.mkdtemp()
+        records = []
+        for codes in [['yso/fin'], ['ysa', 'rdacontent'], ['ysaa', 'cilla']]:
+            record = Record()
+            record.add_field(Field(tag='001', data="00000001"))
+            for code in codes:
+                record.add_field(self.new_field("650", [' ', '7'], ['a', 'ysa', '2', code]))
+            records.append(record)
+        try:
+            for file_format, writer_class in [('marc21', MARCWriter), ('marcxml', XMLWriter)]:
+                path = os.path.join(directory, "records." + file_format)
+                with open(path, 'wb') as output:
+                    writer = writer_class(output)
+                    for record in records:
+                        writer.write(record)
+                    writer.close(close_fh=False)
+                with patch.multiple(self.cc, input_file=path, input_directory=None, file_format=file_format):
+                    source_codes = self.cc.scan_vocabulary_codes()
+                self.assertEqual(source_codes, {'ysa', 'cilla'})
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(self.cc.get_required_vocabularies(set()), [])
+        self.assertEqual(self.cc.get_required_vocabularies({'ysa'}),
+            ['ysa', 'allars', 'yso', 'yso-paikat', 'slm', 'seko'])
+        self.assertTrue('musa' in self.cc.get_required_vocabularies({'cilla'}))
+
+    def test_get_record_searches(self):
+        record = Record()
+        record.leader = "XXXXXXaX"
+        record.add_field(Field(tag='001', data="00000001"))
+        record.add_field(self.new_field("650", [' ', '7'], ['a', 'ragat', 'z', 'Helsinki', 'e', 'ohjaaja', '2', 'ysa']))
+        record.add_field(self.new_field("650", [' ', '7'], ['a', 'ragat', '2', 'yso/fin']))
+        record.add_field(self.new_field("655", [' ', '7'], ['a', 'romaanit', 'y', '1900-luku', '2', 'allars']))
+        vocabulary_order = [('ysa', 'fi'), ('allars', 'sv'), ('numeric', 'fi')]
+        searches = self.cc.get_record_searches(record)
+        self.assertEqual(searches, [
+            ('ragat', vocabulary_order, True, False),
+            ('Helsinki', vocabulary_order, True, False),
+            ('romaanit', [('slm', 'sv'), ('slm', 'fi')], False, False)
+        ])
+        #hakuparametrit ovat samat kuin konversiossa:
+        with patch.object(self.cc.vocabularies, 'search', side_effect=ValueError("1")) as search:
+            self.cc.process_record(record)
+        self.assertEqual([tuple(c[0]) for c in search.call_args_list], searches)
+        record.leader = "XXXXXdaX"
+        self.assertEqual(self.cc.get_record_searches(record), [])
+
+    def test_scan_raw_record(self):
+        record = Record()
+        record.add_field(Field(tag='001', data="00000001"))
+        record.add_field(self.new_field("650", [' ', '7'], ['a', 'kissat', '2', 'yso/fin']))
+        record.add_field(self.new_field("651", [' ', '7'], ['a', 'Somero', '2', 'yso/fin']))
+        record.add_field(self.new_field("500", [' ', ' '], ['a', 'huomautus']))
+        self.assertEqual(self.cc.scan_raw_record(record.as_marc()), 2)
+        record.leader = record.leader[:5] + "d" + record.leader[6:]
+        self.assertEqual(self.cc.scan_raw_record(record.as_marc()), 0)
+        #konvertoitavan sanaston koodi muussa kentässä kirjataan lokiin, joten tietue on purettava:
+        record.add_field(self.new_field("500", [' ', ' '], ['a', 'huomautus', '2', 'ysa']))
+        self.assertEqual(self.cc.scan_raw_record(record.as_marc()), None)
+        record.remove_fields('500')
+        record.leader = record.leader[:5] + "c" + record.leader[6:]
+        record.add_field(self.new_field("567", [' ', ' '], ['b', 'ragat']))
+        self.assertEqual(self.cc.scan_raw_record(record.as_marc()), None)
+        self.assertEqual(self.cc.scan_raw_record(b"00026nam a2200000   4500"), None)
+        #purkamaton tietue kirjoitetaan sellaisenaan vain write_all-parametrilla:
+        raw_record = b"00047nam a2200037   4500001000900000\x1e00000001\x1e\x1d"
+        statistics = dict.fromkeys(self.cc.statistics, 0)
+        for write_all, expected_output in [(False, b""), (True, raw_record)]:
+            output = io.BytesIO()
+            with patch.multiple(self.cc, create=True, write_all=write_all, writer=MARCWriter(output), statistics=statistics):
+                self.cc.convert_raw_record(raw_record)
+            self.assertEqual(output.getvalue(), expected_output)
+        self.assertEqual(statistics['käsiteltyjä tietueita'], 2)
+
+    def test_lazy_field(self):
+        #MARC-8-merkistön tietue, jonka kenttää ei voi kirjoittaa takaisin muuttumattomana purkamisen jälkeen:
+        raw_record = (b"00078nam  2200049   4500001000900000500001900009\x1e00000001\x1e  "
+                      b"\x1fa\xe2ecole\x1f2ysa\x1fax\x1e\x1d")
+        record = Record(raw_record, to_unicode=True)
+        field = record['500']
+        self.assertIsInstance(field, LazyField)
+        self.assertEqual(field.get_subfields('2'), ['ysa'])
+        self.assertFalse(field.is_decoded())
+        self.assertEqual(record.as_marc(), raw_record)
+        self.assertEqual(field.indicators, [' ', ' '])
+        self.assertTrue(field.is_decoded())
+        self.assertEqual(field.get_subfields('a'), ['\u00e9cole', 'x'])
+        field.delete_subfield('2')
+        self.assertEqual(record.as_marc()[49:], b"00000001\x1e  \x1fa\xe9cole\x1fax\x1e\x1d")
+
+    def test_splice_record(self):
+        raw_record = (b"00078nam  2200049   4500001000900000500001900009\x1e00000001\x1e  "
+                      b"\x1fa\xe2ecole\x1f2ysa\x1fax\x1e\x1d")
+        record = Record(raw_record, to_unicode=True)
+        #purettu mutta muuttamaton kenttä kirjoitetaan alkuperäisenä:
+        self.assertEqual(record['500']['a'], '\u00e9cole')
+        self.assertEqual(self.cc.splice_record(record, set()), raw_record)
+        record['500'].delete_subfield('2')
+        self.assertEqual(self.cc.splice_record(record, {'500'}), record.as_marc())
+        record.add_ordered_field(self.new_field("650", [' ', '7'], ['a', 'kissat', '2', 'yso/fin']))
+        self.assertEqual(self.cc.splice_record(record, {'500', '650'}), record.as_marc())
+
+    def test_get_record_range(self):
+        #ohitettavat ja konvertoitavat tietueet lasketaan kaikista lähdetiedostoista yhteensä:
+        with patch.multiple(self.cc, create=True, records_to_skip=3, records_left=4):
+            self.assertEqual(self.cc.get_record_range(2), (2, 2))
+            self.assertEqual(self.cc.get_record_range(3), (1, 3))
+            self.assertEqual(self.cc.get_record_range(5), (0, 2))
+            self.assertEqual(self.cc.get_record_range(5), (0, 0))
+        with patch.multiple(self.cc, create=True, records_to_skip=0, records_left=None):
+            self.assertEqual(self.cc.get_record_range(5), (0, 5))
+
+    def test_select_records(self):
+        with open("test/test_records.mrc", 'rb') as input_file:
+            raw_records = list(self.cc.read_raw_records(input_file))
+        with patch.multiple(self.cc, create=True, records_to_skip=2, records_left=3, record_ids=None):
+            self.assertEqual(list(self.cc.select_records(raw_records)), raw_records[2:5])
+            self.assertEqual(self.cc.records_left, 0)
+        record_id = Record(raw_records[4], to_unicode=True)['001'].data
+        with patch.multiple(self.cc, create=True, records_to_skip=0, records_left=None, record_ids=[record_id]):
+            selected_records = list(self.cc.select_records(raw_records))
+            self.assertIn(raw_records[4], selected_records)
+            self.assertEqual(set(Record(raw_record, to_unicode=True)['001'].data for raw_record in selected_records), {record_id})
+
+    def test_add_to_block(self):
+        #tietueen MARC21-virheet tilastoidaan samoin lohkoja käytettäessä ja ilman niitä:
+        for block_size in [0, 2]:
+            statistics = dict.fromkeys(self.cc.statistics, 0)
+            statistics["virheluokkia"] = {}
+            with patch.multiple(self.cc, create=True, block_size=block_size, record_block=[], search_cache_size=0,
+                    statistics=statistics, read_and_write_record=Mock(side_effect=ValueError)):
+                self.cc.add_to_block(Record())
+                self.cc.add_to_block(Record())
+                self.cc.process_block()
+            self.assertEqual(statistics['MARC21-virheitä'], 2)
+            self.assertEqual(statistics["virheluokkia"], {'ValueError': 2})
+
+    def test_checkpoint(self):
+        directory = tempfile.mkdtemp()
+        try:
+            output_path = os.path.join(directory, "output.mrc")
+            log_paths = [os.path.join(directory, name + ".csv") for name in ['removed', 'new', 'error', 'remaining']]
+            writer = MARCWriter(open(output_path, 'wb'))
+            log_handlers = [self.cc.open_log(path) for path in log_paths]
+            statistics = dict.fromkeys(self.cc.statistics, 0)
+            statistics["virheluokkia"] = {}
+            vocabularies = Vocabularies()
+            with patch.multiple(self.cc, create=True, input_file='test/test_records.mrc', input_directory=None,
+                    checkpoint_path=os.path.join(directory, "output.mrc.checkpoint"), checkpoint_interval=2, checkpoint_records=0,
+                    checkpoint_state={'input_files': ['test/test_records.mrc'], 'file': 0, 'last': 12}, records_to_skip=0, records_left=None,
+                    writer=writer, log_handlers=log_handlers, statistics=statistics, vocabularies=vocabularies,
+                    removed_fields_log=log_paths[0], new_fields_log=log_paths[1], error_log=log_paths[2],
+                    remaining_log=log_paths[3], results_log="results.log"):
+                writer.file_handle.write(b"tietue")
+                log_handlers[2].write("virhe\n")
+                statistics['käsiteltyjä tietueita'] = 2
+                self.cc.count_checkpoint_records(1, 100)
+                self.assertFalse(os.path.exists(self.cc.checkpoint_path))
+                self.cc.count_checkpoint_records(1, 200)
+                #tarkistuspisteen jälkeen kirjoitetut tiedot poistetaan jatkettaessa:
+                writer.file_handle.write(b"kesken")
+                log_handlers[2].write("keskeneräinen\n")
+                writer.close()
+                for handler in log_handlers:
+                    handler.close()
+                self.cc.statistics = {}
+                self.cc.removed_fields_log = self.cc.new_fields_log = self.cc.error_log = self.cc.remaining_log = None
+                checkpoint = self.cc.read_checkpoint()
+                self.assertEqual(checkpoint['offset'], 200)
+                self.assertEqual([self.cc.removed_fields_log, self.cc.new_fields_log, self.cc.error_log,
+                    self.cc.remaining_log], log_paths)
+                self.assertEqual(self.cc.statistics['käsiteltyjä tietueita'], 2)
+                self.cc.open_writer(MARCWriter, output_path, self.cc.get_output_position(checkpoint, output_path))
+                self.cc.writer.close()
+                self.cc.open_log(log_paths[2], checkpoint).close()
+            with open(output_path, 'rb') as output:
+                self.assertEqual(output.read(), b"tietue")
+            with open(log_paths[2], encoding='utf-8-sig') as log:
+                self.assertEqual(log.read(), "virhe\n")
+        finally:
+            shutil.rmtree(directory)
+
+    def test_convert_with_workers(self):
+        results = []
+        for workers in [1, 2]:
+            output = io.BytesIO()
+            logs = [io.StringIO(newline='') for _ in range(4)]
+            log_writers = [csv.writer(log, delimiter=self.cc.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL) for log in logs]
+            statistics = dict.fromkeys(self.cc.statistics, 0)
+            statistics["virheluokkia"] = {}
+            with patch.multiple(self.cc, create=True, workers=workers, worker_chunk_size=3, statistics=statistics,
+                    writer=MARCWriter(output), log_handlers=logs, rf_writer=log_writers[0], nf_writer=log_writers[1],
+                    error_writer=log_writers[2], remaining_writer=log_writers[3]):
+                with open('test/test_records.mrc', 'rb') as input_handler:
+                    if workers > 1:
+                        self.cc.convert_with_workers(input_handler)
+                        self.cc.executor.shutdown()
+                        self.cc.executor = None
+                    else:
+                        for record in MARCReader(input_handler, to_unicode=True):
+                            self.cc.read_and_write_record(record)
+            results.append((output.getvalue(), [log.getvalue() for log in logs], statistics))
+        self.assertTrue(results[0][0])
+        self.assertEqual(results[0][2]['käsiteltyjä tietueita'], 12)
+        #työprosessien tulokset ovat samat ja samassa järjestyksessä kuin yhdessä prosessissa:
+        self.assertEqual(results[0], results[1])
+
     def test_process_record(self):
         for record_type in self.records:
             for r in self.records[record_type]:
@@ -0,0 +1,140 @@
+from rdflib import Graph, BNode
+from rdflib.plugins.parsers.notation3 import SinkParser, RDFSink
+from rdflib.plugins.parsers.ntriples import NTriplesParser
+import codecs
+import os
+import pathlib
+
+class SubjectRecorder():
+    """
+    Välittää triplet kohteen add-metodille ja tallentaa niiden subjektit.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        #URI-subjektit merkkijonoina:
+        self.subjects = set()
+        #True, jos jonkin triplen subjekti on tyhjä solmu:
+        self.blank_nodes = False
+
+    def add(self, triple):
+        subject = triple[0]
+        if isinstance(subject, BNode):
+            self.blank_nodes = True
+        else:
+            self.subjects.add(str(subject))
+        self.target.add(triple)
+
+class TripleSink(RDFSink):
+    """
+    Välittää Turtle-jäsentimen triplet suoraan kohteen add-metodille rakentamatta rdflib-graafia.
+    """
+
+    def newBlankNode(self, arg=None, uri=None, why=None):
+        self.counter += 1
+        return BNode('n' + str(self.counter))
+
+    def triple(self, subject, predicate, obj):
+        #N-Triples-jäsennin kutsuu tätä metodia:
+        self.graph.add((subject, predicate, obj))
+
+def read_triples(path, target, file_format=None):
+    """
+    Lukee sanastotiedoston triplet yksi kerrallaan ja välittää ne kohteen add-metodille (esim. ConceptIndex).
+    path: sanastotiedoston polku
+    target: olio, jolla on add-metodi tripleille
+    file_format: "ttl" tai "nt", oletuksena päätellään tiedostopäätteestä.
+    Muut tiedostomuodot luetaan rdflib-graafiin, jonka triplet välitetään kohteelle.
+    """
+    if not file_format:
+        file_format = os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format in ["ttl", "turtle"]:
+        read_turtle(path, target)
+    elif file_format in ["nt", "ntriples"]:
+        with open(path, 'rb') as input_file:
+            NTriplesParser(TripleSink(target)).parse(input_file)
+    else:
+        g = Graph()
+        g.parse(path)
+        for triple in g:
+            target.add(triple)
+
+def read_turtle(path, target, chunk_size=1024 * 1024):
+    """
+    Jäsentää Turtle-tiedoston paloissa, jotta koko tiedostoa ei tarvitse lukea kerralla muistiin.
+    """
+    parser = get_turtle_parser(path, target)
+    chunk = []
+    size = 0
+    for block in turtle_blocks(path):
+        chunk.append(block)
+        size += len(block)
+        if size >= chunk_size:
+            parser.feed("".join(chunk))
+            chunk = []
+            size = 0
+    parser.feed("".join(chunk))
+    parser.endDoc()
+
+def read_turtle_blocks(path, blocks, target):
+    """
+    Jäsentää Turtle-tiedostosta turtle_blocks-funktiolla erotetut lohkot.
+    path: tiedosto, jonka mukaan suhteelliset URIt ratkaistaan
+    blocks: jäsennettävät lohkot, etuliitemääritykset ensin
+    """
+    parser = get_turtle_parser(path, target)
+    for block in blocks:
+        parser.feed(block)
+    parser.endDoc()
+
+def get_turtle_parser(path, target):
+    sink = TripleSink(target)
+    parser = SinkParser(sink, openFormula=target, baseURI=pathlib.Path(os.path.abspath(path)).as_uri(), turtle=True)
+    parser.startDoc()
+    return parser
+
+def turtle_blocks(path):
+    """
+    Jakaa Turtle-tiedoston tyhjien rivien kohdalta lohkoiksi, jotka voi jäsentää toisistaan erillään.
+    Lohko katkaistaan vain, kun edellinen lause on päättynyt pisteeseen
+    eikä lohko pääty kolminkertaisin lainausmerkein rajatun literaalin sisälle.
+    """
+    with open(path, encoding='utf-8-sig') as input_file:
+        for lines in split_blocks(input_file, ['"""', "'''"], "."):
+            yield "".join(lines)
+
+def turtle_byte_blocks(path):
+    """
+    Jakaa Turtle-tiedoston lohkoiksi kuten turtle_blocks, mutta purkamatta merkistökoodausta.
+    Palauttaa lohkot pareina (sijainti tiedostossa tavuina, lohkon tavut), jotta lohkon voi lukea myöhemmin uudelleen.
+    """
+    with open(path, 'rb') as input_file:
+        position = 0
+        if input_file.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+            position = len(codecs.BOM_UTF8)
+        input_file.seek(position)
+        for lines in split_blocks(input_file, [b'"""', b"'''"], b"."):
+            block = b"".join(lines)
+            yield position, block
+            position += len(block)
+
+def split_blocks(lines, long_quotes, period):
+    """
+    ryhmittelee rivit lohkoiksi (ks. turtle_blocks), rivit ja merkit joko merkkijonoina tai tavuina
+    long_quotes: pitkien literaalien kaksinkertaiset ja yksinkertaiset lainausmerkit
+    """
+    block = []
+    last_line = period[:0]
+    long_literals = 0
+    for line in lines:
+        block.append(line)
+        long_literals += line.count(long_quotes[0]) + line.count(long_quotes[1])
+        stripped_line = line.strip()
+        if stripped_line:
+            last_line = stripped_line
+        elif last_line.endswith(period) and long_literals % 2 == 0:
+            yield block
+            block = []
+            last_line = period[:0]
+    if block:
+        yield block
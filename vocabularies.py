@@ -1,19 +1,114 @@
 from vocabulary import Vocabulary
 from rdflib import Graph, URIRef, Namespace, RDF
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
 import unicodedata
 import re
 
+class SearchCache():
+    """
+    Vocabularies.search-metodin tulosten LRU-välimuisti. Välimuistiin tallennetaan löytyneet vastaukset
+    ja virhekoodit 1-4, joten toistuvia hakusanoja ei tarvitse hakea sanastoista uudelleen.
+    Kun välimuisti on täynnä, pisimpään käyttämättä ollut tulos poistetaan.
+    """
+    #virhekoodit, jotka riippuvat vain hakuparametreista ja sanastoista:
+    cached_error_codes = ['1', '2', '3', '4']
+
+    def __init__(self, max_size=100000):
+        """
+        max_size: tallennettavien tulosten enimmäismäärä, 0 jos tuloksia ei tallenneta
+        """
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        palauttaa tallennetun tuloksen (vastaukset, virhekoodi) tai None, jos tulosta ei ole tallennettu
+        """
+        result = self.results.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.results.move_to_end(key)
+        return result
+
+    def add(self, key, responses, error_code=None):
+        if self.max_size <= 0:
+            return
+        self.results[key] = (responses, error_code)
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+            self.evictions += 1
+
+    def get_statistics(self):
+        return {"osumia": self.hits, "ohituksia": self.misses, "poistettuja": self.evictions}
+
 class Vocabularies:
+    #is_numeric-metodin aikatermien päätteet poistojärjestyksessä (pisteet ovat säännöllisissä lausekkeissa jokerimerkkejä):
+    numeric_suffixes = ['-luku', '-luvut', '-talet', '-tal', 'ekr.', 'jkr.', 'fkr.', 'eaa.', 'jaa.', 'ekr', 'jkr', 'fkr', 'eaa', 'jaa']
+    dashes = {"\u002D": "hyphen-minus",
+              "\u007E": "tilde",
+              "\u00AD": "soft hyphen",
+              "\u058A": "armenian hyphen",
+              "\u05BE": "hebrew punctuation maqaf",
+              "\u1400": "canadian syllabics hyphen",
+              "\u1806": "mongolian todo soft hyphen",
+              "\u2010": "hyphen",
+              "\u2011": "non-breaking hyphen",
+              "\u2012": "figure dash",
+              "\u2013": "en dash",
+              "\u2014": "em dash",
+              "\u2015": "horizontal bar",
+              "\u2053": "swung dash",
+              "\u207B": "superscript minus",
+              "\u208B": "subscript minus",
+              "\u2212": "minus sign",
+              "\u2E17": "double oblique hyphen",
+              "\u2E3A": "two-em dash",
+              "\u2E3B": "three-em dash",
+              "\u301C": "wave dash",
+              "\u3030": "wavy dash",
+              "\u30A0": "katakana-hiragana double hyphen",
+              "\uFE31": "presentation form for vertical em dash",
+              "\uFE32": "presentation form for vertical en dash",
+              "\uFE58": "small em dash",
+              "\uFE63": "small hyphen-minus",
+              "\uFF0D": "fullwidth hyphen-minus",
+              "\u002E": "full stop"}
+    numeric_suffix_patterns = [(suffix, re.compile(suffix, re.IGNORECASE)) for suffix in numeric_suffixes]
+    #numerot ja viivat, joita seuraa korkeintaan yksi pääte:
+    numeric_term = re.compile(r'[\d' + "".join(re.escape(dash) for dash in dashes) + r']*(?i:'
+        + "|".join(re.escape(suffix) for suffix in numeric_suffixes) + r')?')
+    #merkit, jotka eivät ole viivoja ja joita päätteet eivät voi poistaa ilman jokerimerkkiä:
+    non_numeric_character = re.compile(r'[^' + "".join(re.escape(char) for char in sorted(set("".join(numeric_suffixes) + "".join(dashes))))
+        + r'\d]', re.IGNORECASE)
+    #kirjaimet, joista voi muodostua pisteellä päättyvän päätteen alku:
+    numeric_wildcard_prefix = re.compile(r'[ejf].*k.*r|[ej].*a.*a', re.IGNORECASE | re.DOTALL)
 
     def __init__(self):
         
         self.vocabularies = {}
+        self.search_cache = SearchCache()
+        #käännetyt hakusuunnitelmat hakujärjestyksen ja hakuparametrien mukaan, ks. get_search_plan:
+        self.search_plans = {}
 
     def parse_vocabulary(self, vocabulary_code, graphs):
+        """
+        vocabulary_code: käsiteltävän sanaston koodi
+        graphs: sanastokoodit avaimina ja arvoina graafit tai niistä muodostetut ConceptIndexit.
+        Käsitellyn graafin tilalle tallennetaan sen ConceptIndex, jotta samaa graafia
+        ei käydä läpi uudestaan (Musa ja Cilla käyttävät samaa graafia ja kumpikin Ysan graafia).
+        Ysan graafin tilalla voi olla siitä Vocabulary.get_exact_matches-metodilla muodostetut YSO-vastineet.
+        """
         if vocabulary_code == "cilla":
-            graph = graphs["musa"]
+            graph_code = "musa"
         else:
-            graph = graphs[vocabulary_code]
+            graph_code = vocabulary_code
         if vocabulary_code in ['ysa', 'musa', 'seko']:
             language_codes = ['fi']
         elif vocabulary_code in ['allars', 'cilla']:
@@ -21,6 +116,10 @@ class Vocabularies:
         elif vocabulary_code in ['yso', 'yso-paikat', 'slm']:
             language_codes = ['fi', 'sv']
         vocabulary = Vocabulary(vocabulary_code, language_codes)
+        graphs[graph_code] = vocabulary.index_concepts(graphs[graph_code])
+        graph = graphs[graph_code]
+        if vocabulary_code in ['musa', 'cilla'] and not isinstance(graphs['ysa'], Mapping):
+            graphs['ysa'] = vocabulary.index_concepts(graphs['ysa'])
         if vocabulary_code.startswith("yso"):
             vocabulary.parse_yso_vocabulary(graph)
         elif vocabulary_code == "ysa" or vocabulary_code == "allars":
@@ -31,6 +130,46 @@ class Vocabularies:
             vocabulary.parse_label_vocabulary(graph)
 
         self.vocabularies.update({vocabulary_code: vocabulary})
+        self.search_plans = {}
+
+    def patch_vocabulary(self, vocabulary_code, vocabulary, old_concepts, new_concepts, exact_matches=None, changed_matches=()):
+        """
+        Päivittää aiemmin muodostetun sanaston muuttuneiden käsitteiden osalta (ks. Vocabulary.patch_origin_vocabulary).
+        vocabulary: päivitettävä sanasto, jonka hakutaulut voivat olla käännetystä tiedostosta
+        exact_matches ja changed_matches: Musan ja Cillan tarvitsemat Ysan YSO-vastineet ja muuttuneet Ysan käsitteet
+        Palauttaa Ysan ja Allärsin käsitteet, joiden YSO-vastineet muuttuivat, muille sanastoille tyhjän joukon.
+        """
+        changed_concepts = set()
+        if vocabulary_code.startswith("yso"):
+            vocabulary.patch_yso_vocabulary(old_concepts, new_concepts)
+        elif vocabulary_code == "ysa" or vocabulary_code == "allars":
+            changed_concepts = vocabulary.patch_origin_vocabulary(old_concepts, new_concepts)
+        elif vocabulary_code == "musa" or vocabulary_code == "cilla":
+            vocabulary.patch_musa_vocabulary(old_concepts, new_concepts, exact_matches, changed_matches)
+        elif vocabulary_code in ['slm', 'seko']:
+            vocabulary.patch_label_vocabulary(old_concepts, new_concepts)
+
+        self.vocabularies.update({vocabulary_code: vocabulary})
+        self.search_plans = {}
+        return changed_concepts
+
+    def load_vocabularies(self, vocabulary_codes):
+        """
+        Lataa sanastot etukäteen. Välimuistista luettavat sanastot ladataan muuten vasta,
+        kun niitä käytetään ensimmäisen kerran.
+        vocabulary_codes: ladattavien sanastojen koodit
+        """
+        for vocabulary_code in vocabulary_codes:
+            if vocabulary_code in self.vocabularies:
+                self.vocabularies[vocabulary_code]
+
+    def get_loaded_vocabularies(self):
+        """
+        palauttaa niiden sanastojen koodit, jotka on ladattu muistiin
+        """
+        if hasattr(self.vocabularies, 'get_loaded'):
+            return self.vocabularies.get_loaded()
+        return list(self.vocabularies)
 
     def search(self, keyword, vocabulary_codes, search_geographical_concepts=False, all_languages=False):
         """
@@ -48,36 +187,170 @@ class Vocabularies:
         7: kentän 650/651 osakentän $g "muut tiedot" on viety kenttään 653
         8: Kenttä sisältää MARC-formaattiin kuulumattomia osakenttäkoodeja tai ei sisällä asiasanaosakenttiä
         9: tyhjä osakenttä
+
+        Vastaukset palautetaan muuttumattomina (sanakirjat MappingProxyType-olioina ja listat tupleina),
+        koska samat vastaukset palautetaan välimuistista toistuville hauille.
+        """
+        key = (keyword, tuple(tuple(vc) for vc in vocabulary_codes), search_geographical_concepts, all_languages)
+        result = self.search_cache.get(key)
+        if result is None:
+            try:
+                responses = self.search_vocabularies(keyword, vocabulary_codes,
+                    search_geographical_concepts, all_languages)
+            except ValueError as e:
+                if str(e) in SearchCache.cached_error_codes:
+                    self.search_cache.add(key, None, str(e))
+                raise
+            self.search_cache.add(key, responses)
+            return responses
+        responses, error_code = result
+        if error_code:
+            raise ValueError(error_code)
+        return responses
+
+    def search_many(self, searches):
+        """
+        Hakee joukon hakusanoja kerralla. Toistuvat haut tehdään vain kerran ja tulokset tallennetaan
+        hakujen välimuistiin, joten haut voidaan kerätä esim. usean tietueen osakentistä ennen konversiota.
+        searches: lista hakuja muodossa (hakusana, hakujärjestys, search_geographical_concepts, all_languages)
+        palauttaa hakujen tulokset samassa järjestyksessä muodossa (vastaukset, virhekoodi),
+        jossa vastaukset on None, jos haku päättyi virhekoodiin
+        """
+        results = {}
+        keys = []
+        for keyword, vocabulary_codes, search_geographical_concepts, all_languages in searches:
+            key = (keyword, tuple(tuple(vc) for vc in vocabulary_codes), search_geographical_concepts, all_languages)
+            keys.append(key)
+            if key in results:
+                continue
+            try:
+                results[key] = (self.search(*key), None)
+            except ValueError as e:
+                results[key] = (None, str(e))
+        return [results[key] for key in keys]
+
+    def freeze_responses(self, responses):
+        frozen_responses = []
+        for response in responses:
+            frozen_response = {}
+            for key, value in response.items():
+                if isinstance(value, list):
+                    value = tuple(value)
+                frozen_response.update({key: value})
+            frozen_responses.append(MappingProxyType(frozen_response))
+        return tuple(frozen_responses)
+
+    def search_vocabularies(self, keyword, vocabulary_codes, search_geographical_concepts=False, all_languages=False):
+        """
+        hakee hakusanan hakujärjestyksen hakusuunnitelmasta välimuistia käyttämättä,
+        parametrit, virhekoodit ja muuttumattomat vastaukset kuten search-metodissa
         """
         keyword = unicodedata.normalize('NFKC', keyword)
         keyword = keyword.strip()
+        search_plan = self.get_search_plan(vocabulary_codes, search_geographical_concepts, all_languages)
+        geographical_concept = False
+        for step in search_plan:
+            if step[0] == "numeric":
+                response = self.get_numeric_response(keyword, step[1])
+                if response:
+                    response.update({'geographical': geographical_concept})
+                    return self.freeze_responses([response])
+                continue
+            result = self.get_step_result(step, keyword, search_geographical_concepts, all_languages)
+            if not result:
+                continue
+            if result is True:
+                #käsite oli maantieteellinen, mutta sitä ei löytynyt YSO-paikoista:
+                geographical_concept = True
+            elif isinstance(result, str):
+                raise ValueError(result)
+            else:
+                if geographical_concept and not result[0]['geographical']:
+                    result = self.freeze_responses([dict(response, geographical=True) for response in result])
+                return result
+        raise ValueError("1")
+
+    def get_search_plan(self, vocabulary_codes, search_geographical_concepts=False, all_languages=False):
+        """
+        Palauttaa hakujärjestyksen ja hakuparametrien hakusuunnitelman.
+        Hakusuunnitelma on lista vaiheita: numeeriset haut ovat muotoa ('numeric', kielikoodi)
+        ja peräkkäisten sanastojen haut on yhdistetty vaiheeksi (sanastot, tulokset).
+        Vaiheen tulokset täytetään hakusana kerrallaan (ks. get_step_result), joten suunnitelman
+        muodostaminen ei käy läpi sanastojen hakutauluja eikä lataa sanastoja.
+        """
+        key = (tuple(tuple(vc) for vc in vocabulary_codes), search_geographical_concepts, all_languages)
+        if key in self.search_plans:
+            return self.search_plans[key]
+        search_plan = []
+        vocabulary_steps = []
+        for vc in vocabulary_codes:
+            if vc[0] == "numeric":
+                if vocabulary_steps:
+                    search_plan.append((tuple(vocabulary_steps), {}))
+                    vocabulary_steps = []
+                search_plan.append(tuple(vc))
+            else:
+                vocabulary_steps.append(tuple(vc))
+        if vocabulary_steps:
+            search_plan.append((tuple(vocabulary_steps), {}))
+        self.search_plans.update({key: search_plan})
+        return search_plan
+
+    def get_step_result(self, step, keyword, search_geographical_concepts, all_languages):
+        """
+        Palauttaa normalisoidun hakusanan tuloksen hakusuunnitelman vaiheesta. Tulos haetaan sanastoista
+        search_vocabulary_steps-metodilla ensimmäisellä kerralla ja tallennetaan vaiheeseen, joten ensimmäinen
+        osuma voittaa, maantieteelliset käsitteet ohjataan YSO-paikkoihin ja käännökset haetaan kuten ennenkin.
+        Tulos on vastausten tuple, virhekoodi, True, jos käsite oli maantieteellinen eikä sitä haettu,
+        tai False, jos hakusanalla ei ole tulosta. Tuloksettomia hakusanoja ei tallenneta, joten tallennetut
+        tulokset rajoittuvat sanastoista löytyviin hakusanoihin.
+        """
+        vocabulary_codes, results = step
+        result = results.get(keyword)
+        if result is not None:
+            return result
+        try:
+            responses, geographical_concept = self.search_vocabulary_steps(keyword, vocabulary_codes,
+                search_geographical_concepts, all_languages)
+        except ValueError as e:
+            result = str(e)
+        else:
+            if responses:
+                result = self.freeze_responses(responses)
+            elif geographical_concept:
+                result = True
+            else:
+                return False
+        results.update({keyword: result})
+        return result
+
+    def search_vocabulary_steps(self, keyword, vocabulary_codes, search_geographical_concepts=False, all_languages=False):
+        """
+        Hakee normalisoitua hakusanaa sanastoista yksi kerrallaan hakujärjestyksessä.
+        Palauttaa ensimmäisen osuman vastaukset tai None ja tiedon, löytyikö maantieteellinen käsite.
+        """
         geographical_concept = False
         for vc in vocabulary_codes:
             response = {}
             if vc[0] == "numeric":
-                if self.is_numeric(keyword):
-                    response.update({'numeric': True})
-                    response.update({'label': keyword})
-                    if vc[1] == "fi":
-                        response.update({'code': 'yso/fin'})
-                    if vc[1] == "sv":
-                        response.update({'code': 'yso/swe'})
+                response = self.get_numeric_response(keyword, vc[1])
             if vc[0] in ['ysa', 'allars', 'musa', 'cilla']:
-                response = self.vocabularies[vc[0]].get_uris_with_concept(keyword)
-                if response:
-                    if "uris" in response:
-                        if len(response['uris']) > 1:
-                            raise ValueError("2")
-                        if response["uris"][0] in self.vocabularies[vc[0]].geographical_concepts:
-                            if search_geographical_concepts:
-                                response = self.vocabularies['yso-paikat'].get_concept_with_uri(response["uris"][0], vc[1]) 
-                                geographical_concept = True
-                            else:
-                                response = None
+                valid_uris, _ = self.vocabularies[vc[0]].resolve(keyword)
+                if valid_uris:
+                    if len(valid_uris) > 1:
+                        raise ValueError("2")
+                    if valid_uris[0] in self.vocabularies[vc[0]].geographical_concepts:
+                        if search_geographical_concepts:
+                            response = self.vocabularies['yso-paikat'].get_concept_with_uri(valid_uris[0], vc[1])
+                            geographical_concept = True
                         else:
-                            response = self.vocabularies['yso'].get_concept_with_uri(response["uris"][0], vc[1])           
+                            response = None
+                    else:
+                        response = self.vocabularies['yso'].get_concept_with_uri(valid_uris[0], vc[1])
             elif vc[0] == "slm" or vc[0] == "seko":
-                response = self.vocabularies[vc[0]].get_concept_with_label(keyword, vc[1])    
+                valid_uris, pref_label = self.vocabularies[vc[0]].resolve(keyword, vc[1])
+                if valid_uris:
+                    response = self.vocabularies[vc[0]].get_label_response(valid_uris, pref_label, vc[1])
             if response:
                 if "uris" in response:
                     responses = []
@@ -93,18 +366,53 @@ class Vocabularies:
                         translated_response = self.vocabularies[vocabulary_code].translate_label(response['uris'][0], vc[1])
                         if translated_response:
                             responses.append(self.vocabularies[vocabulary_code].translate_label(response['uris'][0], vc[1]))
+                    #labelit on normalisoitu valmiiksi sanastojen käsittelyssä:
                     for r in responses:
                         r.update({'geographical': geographical_concept})
-                        r['label'] = self.normalize_characters(r['label'])
                     #HUOM! Vocabularyn on palautettava vastauksessa sanastokoodi, esim. YSO-paikat
                     if len(response['uris']) > 1:
                         raise ValueError("2")
                     if len(response['uris']) == 1:
-                        return responses
+                        return responses, geographical_concept
                 if "numeric" in response:
                     response.update({'geographical': geographical_concept})
-                    return [response]
-        raise ValueError("1")
+                    return [response], geographical_concept
+        return None, geographical_concept
+
+    def get_numeric_response(self, keyword, language_code):
+        response = {}
+        if self.is_numeric(keyword):
+            response.update({'numeric': True})
+            response.update({'label': keyword})
+            if language_code == "fi":
+                response.update({'code': 'yso/fin'})
+            if language_code == "sv":
+                response.update({'code': 'yso/swe'})
+        return response
+
+    def find_geographical_chain(self, values, vocabulary_codes=('ysa', 'allars')):
+        """
+        Etsii osakenttien arvoista alkavan pisimmän ketjutetun maantieteellisen termin
+        sanastojen Vocabulary.geographical_chains-puista.
+        values: ketjun ensimmäisen osakentän ja sitä seuraavien osakenttien arvot
+        Palauttaa ketjuun kuuluvien arvojen määrän (vähintään 2) tai 0, jos ketjua ei löydy.
+        """
+        length = 0
+        for vocabulary_code in vocabulary_codes:
+            node = self.vocabularies[vocabulary_code].geographical_chains
+            for index, value in enumerate(values):
+                if Vocabulary.chain_separator in value:
+                    for part in value.split(Vocabulary.chain_separator):
+                        node = node.get(part)
+                        if node is None:
+                            break
+                else:
+                    node = node.get(value)
+                if node is None:
+                    break
+                if index > 0 and Vocabulary.chain_separator in node:
+                    length = max(length, index + 1)
+        return length
 
     def get_missing_relations(self, source_vocabularies, target_vocabularies):
         """
@@ -116,73 +424,55 @@ class Vocabularies:
         missing_matches: ne lähdesanastojen käsitteet, joista puuttuu close- tai exactMatch 
         missing_uris: ne kohdesanastojen käsitteet, joista puuttuu uri
         """  
-        missing_relations = []
         missing_matches = {}
         missing_uris = {}
-        missing_relations.append(missing_matches)
-        missing_relations.append(missing_uris)
+        #kohdesanastojen voimassaolevat URIt ja deprekoidut URIt, joilla on voimassaoleva korvaaja:
+        target_uris = set()
+        replaced_uris = set()
+        for vc in target_vocabularies:
+            target_uris.update(self.vocabularies[vc].labels)
+            deprecated_concepts = self.vocabularies[vc].deprecated_concepts
+            for uri in deprecated_concepts:
+                if any(r not in deprecated_concepts for r in deprecated_concepts[uri]):
+                    replaced_uris.add(uri)
         for source_vocabulary in source_vocabularies:
-            for label in self.vocabularies[source_vocabulary].labels:
-                if len(self.vocabularies[source_vocabulary].labels[label]) == 0:
-                    if source_vocabulary in missing_matches:
-                        missing_matches[source_vocabulary].append(label)
-                    else:
-                        missing_matches.update({source_vocabulary: [label]})
-                for uri in self.vocabularies[source_vocabulary].labels[label]:
-                    replaced_by = False
-                    if not any(uri in self.vocabularies[vc].labels for vc in target_vocabularies):
-                        for vc in target_vocabularies:
-                            if uri in self.vocabularies[vc].deprecated_concepts:
-                                replacers = self.vocabularies[vc].deprecated_concepts[uri]
-                                if replacers:
-                                    if any(r not in self.vocabularies[vc].deprecated_concepts for r in replacers):
-                                        replaced_by = True
-                        #rekisteröidään käsitteet, jotka on deprekoitu ja joille ei ole korvaajaa:
-                        if not replaced_by:
-                            if source_vocabulary in missing_uris:
-                                missing_uris[source_vocabulary].update({label: uri})
-                            else:
-                                missing_uris.update({source_vocabulary: {label: uri}})
-        return missing_relations
+            labels = self.vocabularies[source_vocabulary].labels
+            vocabulary_missing_matches = []
+            vocabulary_missing_uris = {}
+            for label, uris in labels.items():
+                if not uris:
+                    vocabulary_missing_matches.append(label)
+                for uri in uris:
+                    #rekisteröidään käsitteet, jotka on deprekoitu ja joille ei ole korvaajaa:
+                    if uri not in target_uris and uri not in replaced_uris:
+                        vocabulary_missing_uris[label] = uri
+            if vocabulary_missing_matches:
+                missing_matches[source_vocabulary] = vocabulary_missing_matches
+            if vocabulary_missing_uris:
+                missing_uris[source_vocabulary] = vocabulary_missing_uris
+        return [missing_matches, missing_uris]
 
     def is_numeric(self, keyword):
+        """
+        Tunnistaa aikatermit poistamalla hakusanasta välilyönnit ja numeric_suffixes-päätteet
+        ja tarkistamalla, että jäljelle jää vain numeroita ja viivoja. Säännölliset lausekkeet
+        on käännetty luokan määrittelyssä, ja yleisimmät tapaukset ratkaistaan ilman päätteiden
+        poistoa: numeric_term hyväksyy suoraan numerot ja viivat, joita seuraa yksi pääte,
+        ja hakusana hylätään, jos siinä on merkki, jota mikään pääte ei voi poistaa.
+        """
         if keyword:
-            suffixes = ['-luku', '-luvut', '-talet', '-tal', 'ekr.', 'jkr.', 'fkr.', 'eaa.', 'jaa.', 'ekr', 'jkr', 'fkr', 'eaa', 'jaa']
-            dashes = {"\u002D": "hyphen-minus",
-                      "\u007E": "tilde",
-                      "\u00AD": "soft hyphen",
-                      "\u058A": "armenian hyphen",
-                      "\u05BE": "hebrew punctuation maqaf",
-                      "\u1400": "canadian syllabics hyphen",
-                      "\u1806": "mongolian todo soft hyphen",
-                      "\u2010": "hyphen",
-                      "\u2011": "non-breaking hyphen",
-                      "\u2012": "figure dash",
-                      "\u2013": "en dash",
-                      "\u2014": "em dash",
-                      "\u2015": "horizontal bar",
-                      "\u2053": "swung dash",
-                      "\u207B": "superscript minus",
-                      "\u208B": "subscript minus",
-                      "\u2212": "minus sign",
-                      "\u2E17": "double oblique hyphen",
-                      "\u2E3A": "two-em dash",
-                      "\u2E3B": "three-em dash",
-                      "\u301C": "wave dash",
-                      "\u3030": "wavy dash",
-                      "\u30A0": "katakana-hiragana double hyphen",
-                      "\uFE31": "presentation form for vertical em dash",
-                      "\uFE32": "presentation form for vertical en dash",
-                      "\uFE58": "small em dash",
-                      "\uFE63": "small hyphen-minus",
-                      "\uFF0D": "fullwidth hyphen-minus",
-                      "\u002E": "full stop"}
-            
             keyword = keyword.replace(" ", "")
-            for suffix in suffixes:
+            if self.numeric_term.fullmatch(keyword):
+                return True
+            #pisteellä päättyvät päätteet voivat poistaa minkä tahansa merkin, jos sitä edeltää ekr, eaa tms.:
+            if not self.numeric_wildcard_prefix.search(keyword):
+                for match in self.non_numeric_character.finditer(keyword):
+                    if not match.group().isdigit():
+                        return False
+            for suffix, pattern in self.numeric_suffix_patterns:
                 keyword = keyword.replace(suffix, "")
-                keyword = re.sub(r'(?i)' + suffix, '', keyword)
-            if any(not char.isdigit() and char not in dashes for char in keyword):
+                keyword = pattern.sub('', keyword)
+            if any(not char.isdigit() and char not in self.dashes for char in keyword):
                 return False            
             """
             TAL/TALET?
@@ -192,10 +482,3 @@ class Vocabularies:
             """
             return True
         return False
-
-    def normalize_characters(self, string):
-        #koodaa skandinaaviset merkit yksiosaisiksi ja muut kaksiosaisiksi: 
-        string = unicodedata.normalize('NFD', string)
-        return (string.replace("A\u030a", "Å").replace("a\u030a", "å").
-            replace("A\u0308", "Ä").replace("a\u0308", "ä").
-            replace("O\u0308", "Ö").replace("o\u0308", "ö"))
\ No newline at end of file
@@ -1,12 +1,151 @@
-from rdflib import Graph, URIRef, Namespace, RDF
+from rdflib import Graph, URIRef, Namespace, RDF, RDFS
 from rdflib.namespace import SKOS, XSD, OWL, DC
+from collections.abc import Mapping, MutableMapping, Set, MutableSet
 import logging
-import copy
 import re
 import unicodedata
 import unidecode
 
+class ConceptIndex():
+    """
+    Kerää sanaston tripleistä yhdellä läpikäynnillä ne ominaisuudet, joita sanastojen käsittelyssä tarvitaan.
+    Triplet ryhmitellään subjektin ja predikaatin mukaan, joten käsitteiden tietoja ei tarvitse hakea
+    graafista käsite ja kieli kerrallaan.
+    """
+    dct = Namespace("http://purl.org/dc/terms/")
+    predicates = frozenset([SKOS.prefLabel, RDFS.label, SKOS.altLabel, SKOS.exactMatch, SKOS.closeMatch,
+        dct.isReplacedBy, OWL.deprecated, SKOS.inScheme, RDF.type])
+
+    def __init__(self):
+        #subjektit avaimina ja arvoina predikaattien mukaan ryhmitellyt objektit,
+        #kielikoodilliset literaalit myös (predikaatti, kielikoodi)-avaimella:
+        self.subjects = {}
+
+    def add(self, triple):
+        subject, predicate, obj = triple
+        if predicate in self.predicates:
+            self.add_value(str(subject), predicate, obj)
+
+    def add_value(self, subject, predicate, obj):
+        if subject in self.subjects:
+            properties = self.subjects[subject]
+        else:
+            properties = {}
+            self.subjects.update({subject: properties})
+        #graafista poiketen tiedostoa suoraan luettaessa sama triple voi tulla useamman kerran:
+        if predicate in properties:
+            if obj in properties[predicate]:
+                return
+            properties[predicate].append(obj)
+        else:
+            properties.update({predicate: [obj]})
+        language = getattr(obj, 'language', None)
+        if language:
+            key = (predicate, language)
+            if key in properties:
+                properties[key].append(obj)
+            else:
+                properties.update({key: [obj]})
+
+    def add_graph(self, g):
+        #käydään läpi vain tarvittavien predikaattien triplet, kukin triple kerran:
+        for predicate in self.predicates:
+            for subject, _, obj in g.triples((None, predicate, None)):
+                self.add_value(str(subject), predicate, obj)
+
+    def concepts(self):
+        """
+        palauttaa (URI, ominaisuudet)-pareina ne subjektit, joiden tyyppi on skos:Concept
+        """
+        for subject, properties in self.subjects.items():
+            if SKOS.Concept in properties.get(RDF.type, ()):
+                yield subject, properties
+
+    @staticmethod
+    def get_values(properties, lang=None, label_properties=(SKOS.prefLabel, RDFS.label)):
+        """
+        vastaa rdflibin Graph.preferredLabel-metodia, mutta palauttaa pelkät objektit:
+        ensimmäisen predikaatin arvot, joille löytyy annetun kielinen arvo
+        """
+        for lp in label_properties:
+            if lang is not None:
+                lp = (lp, lang)
+            if lp in properties:
+                return properties[lp]
+        return []
+
+class PatchedMapping(MutableMapping):
+    """
+    Muokattava näkymä muuttumattomaan sanakirjaan (esim. käännetyn tiedoston CompiledMapping):
+    lisätyt ja muutetut avaimet tallennetaan erilliseen sanakirjaan ja poistetut joukkoon,
+    joten sanaston päivittäminen ei kopioi koko hakutaulua.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.changes = {}
+        self.deleted = set()
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        if key in self.deleted:
+            raise KeyError(key)
+        return self.base[key]
+
+    def __setitem__(self, key, value):
+        self.changes[key] = value
+        self.deleted.discard(key)
+
+    def __delitem__(self, key):
+        if key in self.changes:
+            del self.changes[key]
+            if key in self.base:
+                self.deleted.add(key)
+        elif key in self.base and key not in self.deleted:
+            self.deleted.add(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.changes or key not in self.deleted and key in self.base
+
+    def __iter__(self):
+        for key in self.base:
+            if key not in self.changes and key not in self.deleted:
+                yield key
+        yield from self.changes
+
+    def __len__(self):
+        return len(self.base) - len(self.deleted) + len([key for key in self.changes if key not in self.base])
+
+class DiacriticTranslations(dict):
+    """
+    str.translate-metodin merkkitaulu, joka poistaa tarkkeet kaikista muista merkeistä paitsi å, ä, ö.
+    Merkin korvaava merkkijono haetaan unidecodella merkin ensimmäisellä esiintymällä ja tallennetaan tauluun.
+    """
+    kept_characters = frozenset("0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZåäöÅÄÖ- '")
+
+    def __missing__(self, ordinal):
+        character = chr(ordinal)
+        if character in self.kept_characters:
+            translation = character
+        else:
+            translation = unidecode.unidecode(character)
+        self[ordinal] = translation
+        return translation
+
 class Vocabulary():
+    #kaikkien sanastojen yhteinen tarkkeiden poistotaulu:
+    diacritic_translations = DiacriticTranslations()
+    #maantieteellisten ketjujen osien erotin:
+    chain_separator = " -- "
+    #sulkutarkenne:
+    specifier_pattern = r"[\(].*?[\)]"
+    #Ysan ja Allärsin maantieteellisten käsitteiden tyypit:
+    geographical_types = frozenset([URIRef("http://www.yso.fi/onto/ysa-meta/GeographicalConcept"),
+        URIRef("http://www.yso.fi/onto/allars-meta/GeographicalConcept")])
+    aggregate_concept_scheme = URIRef("http://www.yso.fi/onto/yso/aggregateconceptscheme")
 
     def __init__(self, vocabulary_code, language_codes):
         if vocabulary_code.startswith('slm'):
@@ -20,8 +159,15 @@ class Vocabulary():
         self.geographical_concepts = set()
         #ketjutetut maantieteelliset termit:
         self.geographical_chained_labels = set()
+        #ketjutettujen termien osat puuna, ks. create_geographical_chains:
+        self.geographical_chains = {}
         #sisältää deprekoidut käsitteet avaimina ja arvoina lista korvaajista
         self.deprecated_concepts = {}
+        #deprekoidut käsitteet avaimina ja arvoina ainoa voimassaoleva korvaaja tai tyhjä merkkijono,
+        #jos korvaajia on useita tai ei yhtään tai korvaaja ei ole sanaston käsite:
+        self.deprecated_replacements = {}
+        #deprekointiketjujen pituudet ja syklit, ks. resolve_deprecated_concepts:
+        self.deprecation_report = {}
         self.aggregate_concepts = set()
         #sisältää pref- ja altLabelit:
         self.labels = {}
@@ -35,225 +181,434 @@ class Vocabulary():
         self.labels_with_specifiers = {}
         #vastinsanat toisella kielellä (SLM-sanastoon):
         self.translations = {}
+        #hakusanat avaimina ja arvoina hakutauluista valmiiksi ratkaistut hakutulokset (ks. create_resolutions):
+        self.resolutions = {}
+        #Seuraavat taulut tarvitaan vain sanaston päivittämiseen muuttuneiden käsitteiden osalta (ks. patch-alkuiset
+        #metodit), ja ne tallennetaan erillään hakutauluista (ks. CompiledProvenance).
+        #labelit avaimina ja arvoina käsitteet, joiden pref- tai altLabel label on (Ysa, Allärs, Musa ja Cilla):
+        self.label_concepts = {}
+        #käsitteet avaimina ja arvoina niiden YSO-vastineet tai Musassa ja Cillassa korvaajien YSO-vastineet:
+        self.concept_uris = {}
+        #käsitteet avaimina ja arvoina niiden isReplacedBy-korvaajat (YSOssa vain deprekoidut käsitteet):
+        self.replaced_by = {}
+        #maantieteelliset käsitteet, joiden YSO-vastineet ovat geographical_concepts-joukossa:
+        self.geographical_sources = set()
+        #hakuavaimet avaimina ja arvoina labelit, joista avain muodostuu (ks. get_label_keys):
+        self.label_variants = {}
+        #kielikoodit avaimina ja arvoina käsitteiden prefLabelit (SLM ja Seko):
+        self.pref_labels = {}
         self.dct = Namespace("http://purl.org/dc/terms/")
         self.namespace = 'http://www.yso.fi/onto/yso/'
-        self.nodes = [] #for temporary use
 
-    def parse_musa_vocabulary(self, g, secondary_graph):
+    def index_concepts(self, g):
         """
-        g: käsiteltävän sanaston graafi
-        secondary_graph: Ysa-sanaston graafi
+        g: sanaston graafi tai valmiiksi muodostettu ConceptIndex
+        """
+        if isinstance(g, ConceptIndex):
+            return g
+        index = ConceptIndex()
+        index.add_graph(g)
+        return index
+
+    def get_exact_matches(self, g):
         """
-        #sisältää pelkät prefLabelit (tarvitaan poikkeustapauksiin, jossa voi olla sama termi pref- ja altLabelina):
+        g: Ysa-sanaston graafi
+        palauttaa käsitteiden URIt avaimina ja arvoina niiden YSO-vastineet
+        """
+        g = self.index_concepts(g)
         exact_matches = {}
-        for conc in secondary_graph.subjects(RDF.type, SKOS.Concept):
-            matches = secondary_graph.preferredLabel(conc, labelProperties=[SKOS.exactMatch]) 
-            uris = set()
+        for conc, properties in g.concepts():
+            exact_matches.update({conc: self.get_match_uris(properties)})
+        return exact_matches
+
+    def get_match_uris(self, properties):
+        """
+        palauttaa käsitteen exactMatch-vastineista YSO-linkit tai niiden puuttuessa closeMatch-vastineista YSO-linkit
+        """
+        uris = set()
+        for match_property in [SKOS.exactMatch, SKOS.closeMatch]:
+            matches = ConceptIndex.get_values(properties, label_properties=[match_property])
             for m in matches:
-                #lisää YSO-linkit:
-                if self.namespace in str(m[1]):
-                    uris.add(str(m[1])) 
-            if not uris:
-                matches = secondary_graph.preferredLabel(conc, labelProperties=[SKOS.closeMatch]) 
-                for m in matches:
-                    if self.namespace in str(m[1]):
-                        uris.add(str(m[1])) 
-            exact_matches.update({str(conc): uris})        
-
-        for conc in g.subjects(RDF.type, SKOS.Concept):
-            replaced_by = g.preferredLabel(conc, labelProperties=[self.dct.isReplacedBy])
-            replacer = None
-            replacers = set()
-            for rb in replaced_by:
-                #HUOM! oletetaan, että musa-käsitteillä on vain yksi korvaaja:
-                replacer = str(rb[1])
-                if replacer in exact_matches:
-                    for em in exact_matches[replacer]:
-                        replacers.add(em)
-            for lc in self.language_codes:
-                alt_labels = g.preferredLabel(conc, lang=lc, labelProperties=[SKOS.altLabel])
-                for al in alt_labels:
-                    alt_label = str(al[1])
-                    uris = copy.copy(replacers)
-                    if alt_label in self.labels:
-                        self.labels[alt_label].update(uris)
-                    else:
-                        self.labels.update({alt_label: uris})
-                pref_label = g.preferredLabel(conc, lang=lc)
-                if pref_label:
-                    pref_label = str(pref_label[0][1])
-                    uris = copy.copy(replacers)
-                    if pref_label in self.labels:
-                        self.labels[pref_label].update(uris)
-                    else:
-                        self.labels.update({pref_label: uris})     
+                #lisätään YSO-vastineiden linkit:
+                if self.namespace in str(m):
+                    uris.add(str(m))
+            if uris:
+                break
+        return uris
+
+    def get_language_labels(self, properties, language):
+        """
+        palauttaa käsitteen ensimmäisen prefLabelin ja altLabelit annetulla kielellä
+        """
+        labels = [str(pl) for pl in ConceptIndex.get_values(properties, lang=language)[:1]]
+        alt_labels = ConceptIndex.get_values(properties, lang=language, label_properties=[SKOS.altLabel])
+        labels.extend(str(al) for al in alt_labels)
+        return labels
+
+    def get_concept_labels(self, properties):
+        """
+        palauttaa käsitteen ensimmäiset prefLabelit ja altLabelit sanaston kaikilla kielillä
+        """
+        return [label for lc in self.language_codes for label in self.get_language_labels(properties, lc)]
+
+    def add_concept_labels(self, concept, labels, uris):
+        """
+        lisää käsitteen URIt sen labeleille ja käsitteen labelien lähteisiin (label_concepts)
+        """
+        for label in labels:
+            if label in self.labels:
+                self.labels[label].update(uris)
+                self.label_concepts[label].add(concept)
+            else:
+                self.labels.update({label: set(uris)})
+                self.label_concepts.update({label: {concept}})
+
+    def parse_musa_vocabulary(self, g, secondary_graph):
+        """
+        g: käsiteltävän sanaston graafi
+        secondary_graph: Ysa-sanaston graafi tai get_exact_matches-metodilla siitä muodostetut YSO-vastineet
+        """
+        g = self.index_concepts(g)
+        if isinstance(secondary_graph, Mapping):
+            exact_matches = secondary_graph
+        else:
+            exact_matches = self.get_exact_matches(secondary_graph)
+        for conc, properties in g.concepts():
+            replaced_by = [str(rb) for rb in ConceptIndex.get_values(properties, label_properties=[self.dct.isReplacedBy])]
+            if replaced_by:
+                self.replaced_by.update({conc: replaced_by})
+            uris = self.get_replacer_uris(replaced_by, exact_matches)
+            if uris:
+                self.concept_uris.update({conc: frozenset(uris)})
+            self.add_concept_labels(conc, self.get_concept_labels(properties), uris)
         self.create_additional_dicts()
 
-    def parse_yso_vocabulary(self, g):
-        aggregateconceptscheme = URIRef("http://www.yso.fi/onto/yso/aggregateconceptscheme")
-        deprecated_temp = {} #väliaikainen sanasto deprekoiduille käsitteille ja niiden seuraajille
-        for conc in g.subjects(RDF.type, SKOS.Concept):
-            uri = str(conc)
-            in_scheme = g.preferredLabel(conc, labelProperties=[SKOS.inScheme]) 
-            for scheme in in_scheme:
-                if scheme[1] == aggregateconceptscheme:
-                    self.aggregate_concepts.add(uri)
-            #kerätään ensin deprekoitujen käsitteiden seuraajat
-            deprecated = g.preferredLabel(conc, labelProperties=[OWL.deprecated])
-            if deprecated:
-                replaced_by = g.preferredLabel(conc, labelProperties=[self.dct.isReplacedBy])
-                for rb in replaced_by:
-                    replacer = str(rb[1])
-                    if uri in deprecated_temp:
-                        deprecated_temp[uri].append(replacer)
+    def get_replacer_uris(self, replaced_by, exact_matches):
+        """
+        palauttaa Musan käsitteen korvaajien YSO-vastineet
+        """
+        replacers = set()
+        #HUOM! oletetaan, että musa-käsitteillä on vain yksi korvaaja:
+        for replacer in replaced_by:
+            if replacer in exact_matches:
+                replacers.update(exact_matches[replacer])
+        return replacers
+
+    def patch_musa_vocabulary(self, old_concepts, new_concepts, exact_matches, changed_matches=()):
+        """
+        Päivittää parse_musa_vocabulary-metodilla muodostetut hakutaulut muuttuneiden käsitteiden osalta.
+        old_concepts ja new_concepts: kuten patch_origin_vocabulary-metodissa
+        exact_matches: Ysan YSO-vastineet
+        changed_matches: Ysan käsitteet, joiden YSO-vastineet ovat muuttuneet
+        """
+        replaced_by = self.get_patched_table('replaced_by')
+        concept_uris = self.get_patched_table('concept_uris')
+        affected_labels = set()
+        for conc, properties in old_concepts.items():
+            replaced_by.pop(conc, None)
+            concept_uris.pop(conc, None)
+            self.patch_label_concepts(conc, self.get_concept_labels(properties), affected_labels, add=False)
+        for conc, properties in new_concepts.items():
+            concept_replaced_by = [str(rb) for rb in ConceptIndex.get_values(properties, label_properties=[self.dct.isReplacedBy])]
+            if concept_replaced_by:
+                replaced_by[conc] = concept_replaced_by
+            uris = self.get_replacer_uris(concept_replaced_by, exact_matches)
+            if uris:
+                concept_uris[conc] = frozenset(uris)
+            self.patch_label_concepts(conc, self.get_concept_labels(properties), affected_labels)
+        #käsitteet, joiden korvaajan YSO-vastineet ovat muuttuneet Ysassa:
+        if changed_matches:
+            changed_concepts = set()
+            for conc, concept_replaced_by in replaced_by.items():
+                if conc not in new_concepts and any(rb in changed_matches for rb in concept_replaced_by):
+                    uris = self.get_replacer_uris(concept_replaced_by, exact_matches)
+                    if uris:
+                        concept_uris[conc] = frozenset(uris)
                     else:
-                        deprecated_temp.update({uri: [replacer]})
-            else:
-                for lc in self.language_codes:
-                    pref_label = g.preferredLabel(conc, lang=lc)
-                    if pref_label:
-                        pref_label = str(pref_label[0][1])
-                        if uri in self.labels:
-                            self.labels[uri].update({lc: pref_label})
-                        else:
-                            self.labels.update({uri: {lc: pref_label}})
+                        concept_uris.pop(conc, None)
+                    changed_concepts.add(conc)
+            if changed_concepts:
+                for label, concepts in self.label_concepts.items():
+                    if not changed_concepts.isdisjoint(concepts):
+                        affected_labels.add(label)
+        self.patch_labels(affected_labels)
+        self.patch_additional_dicts(affected_labels)
 
+    def parse_yso_vocabulary(self, g):
+        g = self.index_concepts(g)
+        for uri, properties in g.concepts():
+            self.add_yso_concept(uri, properties)
         #selvitetään deprekoitujen käsitteiden korvaajat:
-        for dc in deprecated_temp:
-            replacers = []
-            self.get_replacers(deprecated_temp, dc, replacers)
-            self.deprecated_concepts.update({dc: replacers})
-
-    def get_replacers(self, deprecated_dict, concept_uri, replacers):
-        if concept_uri in deprecated_dict:
-            for replacer in deprecated_dict[concept_uri]:
-                if not replacer in deprecated_dict:
-                    replacers.append(replacer)
-                self.get_replacers(deprecated_dict, replacer, replacers)
+        self.resolve_deprecated_concepts(self.replaced_by)
 
-    def parse_origin_vocabulary(self, g):
-        #sisältää pelkät prefLabelit (tarvitaan poikkeustapauksiin, jossa voi olla sama termi pref- ja altLabelina):
-        geographical_namespaces = [URIRef("http://www.yso.fi/onto/ysa-meta/GeographicalConcept"),
-        URIRef("http://www.yso.fi/onto/allars-meta/GeographicalConcept")]
-        for conc in g.subjects(RDF.type, SKOS.Concept):
-            is_geographical = False
-            rdf_types = g.preferredLabel(conc, labelProperties=[RDF.type]) 
-            for rdf_type in rdf_types:
-                try:
-                    if rdf_type[1] in geographical_namespaces:
-                        is_geographical = True
-                except IndexError:
-                    logging.info("viallinen käsite: %s" %conc)
+    def add_yso_concept(self, uri, properties):
+        in_scheme = ConceptIndex.get_values(properties, label_properties=[SKOS.inScheme])
+        if self.aggregate_concept_scheme in in_scheme:
+            self.aggregate_concepts.add(uri)
+        #kerätään ensin deprekoitujen käsitteiden seuraajat
+        deprecated = ConceptIndex.get_values(properties, label_properties=[OWL.deprecated])
+        if deprecated:
+            replaced_by = [str(rb) for rb in ConceptIndex.get_values(properties, label_properties=[self.dct.isReplacedBy])]
+            if replaced_by:
+                self.replaced_by.update({uri: replaced_by})
+        else:
+            labels = {}
             for lc in self.language_codes:
-                alt_labels = g.preferredLabel(conc, lang=lc, labelProperties=[SKOS.altLabel])
-                matches = g.preferredLabel(conc, labelProperties=[SKOS.exactMatch]) 
-                uris = set()
-                for m in matches:
-                    #lisätään YSO-vastineiden linkit:
-                    if self.namespace in str(m[1]):
-                        uris.add(str(m[1]))
-                        if is_geographical:
-                            self.geographical_concepts.add(str(m[1]))
-                if not uris:
-                    matches = g.preferredLabel(conc, labelProperties=[SKOS.closeMatch]) 
-                    for m in matches:
-                        if self.namespace in str(m[1]):
-                            uris.add(str(m[1]))   
-                            if is_geographical:
-                                self.geographical_concepts.add(str(m[1]))          
-                for al in alt_labels:
-                    alt_label = str(al[1])
-                    uris = copy.copy(uris)
-                    if "--" in alt_label and is_geographical:
-                        self.geographical_chained_labels.add(alt_label)     
-                    if alt_label in self.labels:
-                        self.labels[alt_label].update(uris)
-                    else:
-                        self.labels.update({alt_label: uris})
-                pref_label = g.preferredLabel(conc, lang=lc)
+                pref_label = ConceptIndex.get_values(properties, lang=lc)
                 if pref_label:
-                    pref_label = str(pref_label[0][1])
-                    uris = copy.copy(uris)
-                    if pref_label in self.labels:
-                        self.labels[pref_label].update(uris)
+                    #labelit tallennetaan hakutuloksissa käytettävässä muodossa:
+                    labels.update({lc: self.normalize_characters(str(pref_label[0]))})
+            if labels:
+                self.labels.update({uri: labels})
+
+    def patch_yso_vocabulary(self, old_concepts, new_concepts):
+        """
+        Päivittää parse_yso_vocabulary-metodilla muodostetut hakutaulut muuttuneiden käsitteiden osalta.
+        Deprekointiketjut selvitetään uudelleen tallennetuista suorista korvaajista (replaced_by),
+        koska käsitteen muutos voi vaikuttaa kaikkiin siihen johtaviin ketjuihin.
+        """
+        self.get_patched_table('labels')
+        self.get_patched_table('aggregate_concepts')
+        self.get_patched_table('replaced_by')
+        for uri in old_concepts:
+            self.labels.pop(uri, None)
+            self.aggregate_concepts.discard(uri)
+            self.replaced_by.pop(uri, None)
+        for uri, properties in new_concepts.items():
+            self.add_yso_concept(uri, properties)
+        self.deprecated_concepts = {}
+        self.deprecated_replacements = {}
+        self.resolve_deprecated_concepts(self.replaced_by)
+
+    def resolve_deprecated_concepts(self, deprecated_dict):
+        """
+        Käy deprekointiketjut läpi ja tallentaa jokaiselle deprekoidulle käsitteelle ketjujen päissä olevat
+        voimassaolevat korvaajat (deprecated_concepts) sekä valmiin ratkaisun get_concept_with_uri-metodia varten
+        (deprecated_replacements). Korvaaja, jota ei ole sanaston labels-taulussa, on umpikuja, joten labelit
+        on muodostettava ennen tätä metodia. Korvaaja tulee listaan kerran jokaista siihen johtavaa ketjua kohden,
+        joten useaa reittiä pitkin löytyvä korvaaja on monitulkintainen kuten ennenkin.
+        Ketjut käydään läpi ilman rekursiota pinon avulla, ja jo käsitellyt käsitteet muistetaan.
+        Syklissä oleva korvaaja ohitetaan, joten syklit eivät katkaise käsittelyä.
+        deprecated_dict: deprekoidut käsitteet avaimina ja arvoina niiden isReplacedBy-korvaajat
+        Palauttaa ja tallentaa raportin, jossa depths: ketjujen pisimmät pituudet ja niiden lukumäärät,
+        cycles: syklit käsitelistoina.
+        """
+        replacers = {}
+        depths = {}
+        cycles = []
+        #käydään läpi järjestyksessä, jotta syklien käsittely ei riipu sanakirjan järjestyksestä:
+        for concept_uri in sorted(deprecated_dict):
+            if concept_uri in replacers:
+                continue
+            #pinossa on käsittelyssä olevan ketjun käsitteet ja niiden läpikäymättömät korvaajat:
+            stack = [(concept_uri, iter(deprecated_dict[concept_uri]))]
+            path = [concept_uri]
+            partial = {concept_uri: ([], 0)}
+            while stack:
+                uri, uri_replacers = stack[-1]
+                uri_list, uri_depth = partial[uri]
+                for replacer in uri_replacers:
+                    if replacer not in deprecated_dict:
+                        uri_list.append(replacer)
+                        uri_depth = max(uri_depth, 1)
+                    elif replacer in replacers:
+                        uri_list.extend(replacers[replacer])
+                        uri_depth = max(uri_depth, depths[replacer] + 1)
+                    elif replacer in partial:
+                        cycles.append(path[path.index(replacer):])
                     else:
-                        self.labels.update({pref_label: uris})
-                    if "--" in pref_label and is_geographical:
-                        self.geographical_chained_labels.add(pref_label)
-                       
+                        partial[uri] = (uri_list, uri_depth)
+                        partial.update({replacer: ([], 0)})
+                        stack.append((replacer, iter(deprecated_dict[replacer])))
+                        path.append(replacer)
+                        break
+                else:
+                    stack.pop()
+                    path.pop()
+                    del partial[uri]
+                    replacers.update({uri: uri_list})
+                    depths.update({uri: uri_depth})
+                    if stack:
+                        parent_list, parent_depth = partial[stack[-1][0]]
+                        parent_list.extend(uri_list)
+                        partial[stack[-1][0]] = (parent_list, max(parent_depth, uri_depth + 1))
+        for concept_uri in deprecated_dict:
+            self.deprecated_concepts.update({concept_uri: replacers[concept_uri]})
+            #korvaaja, joka ei ole tämän sanaston käsite (esim. YSO-paikoissa), on umpikuja kuten puuttuva korvaaja:
+            if len(replacers[concept_uri]) == 1 and replacers[concept_uri][0] in self.labels:
+                self.deprecated_replacements.update({concept_uri: replacers[concept_uri][0]})
+            else:
+                self.deprecated_replacements.update({concept_uri: ""})
+        depth_counts = {}
+        for depth in depths.values():
+            depth_counts[depth] = depth_counts.get(depth, 0) + 1
+        self.deprecation_report = {"depths": depth_counts, "cycles": cycles}
+        if deprecated_dict:
+            logging.info("sanastossa %s deprekoituja käsitteitä %s, ketjujen pituudet: %s"%(self.target_vocabulary_code,
+                len(deprecated_dict), ", ".join("%s: %s"%(depth, depth_counts[depth]) for depth in sorted(depth_counts))))
+        for cycle in cycles:
+            logging.warning("Deprekointiketjussa on sykli: %s"%" -> ".join(cycle + cycle[:1]))
+        return self.deprecation_report
+
+    def parse_origin_vocabulary(self, g):
+        g = self.index_concepts(g)
+        for conc, properties in g.concepts():
+            uris = self.get_match_uris(properties)
+            if uris:
+                self.concept_uris.update({conc: frozenset(uris)})
+            labels = self.get_concept_labels(properties)
+            if self.is_geographical(properties):
+                self.geographical_sources.add(conc)
+                self.geographical_concepts.update(uris)
+                for label in labels:
+                    if "--" in label:
+                        self.geographical_chained_labels.add(label)
+            self.add_concept_labels(conc, labels, uris)
+
         self.create_additional_dicts()
- 
+        self.create_geographical_chains()
+
+    def is_geographical(self, properties):
+        rdf_types = ConceptIndex.get_values(properties, label_properties=[RDF.type])
+        return any(rdf_type in self.geographical_types for rdf_type in rdf_types)
+
+    def patch_origin_vocabulary(self, old_concepts, new_concepts):
+        """
+        Päivittää parse_origin_vocabulary-metodilla muodostetut hakutaulut muuttuneiden käsitteiden osalta.
+        old_concepts ja new_concepts: muuttuneiden käsitteiden URIt avaimina ja ominaisuudet (ks. ConceptIndex) arvoina
+        sanastotiedoston edellisessä ja uudessa versiossa (poistetut käsitteet vain edellisessä, lisätyt vain uudessa)
+        Palauttaa käsitteet, joiden YSO-vastineet muuttuivat.
+        """
+        concept_uris = self.get_patched_table('concept_uris')
+        geographical_sources = self.get_patched_table('geographical_sources')
+        previous_uris = {}
+        affected_labels = set()
+        geographical_changed = False
+        for conc, properties in old_concepts.items():
+            previous_uris.update({conc: concept_uris.pop(conc, frozenset())})
+            if conc in geographical_sources:
+                geographical_sources.discard(conc)
+                geographical_changed = True
+            self.patch_label_concepts(conc, self.get_concept_labels(properties), affected_labels, add=False)
+        for conc, properties in new_concepts.items():
+            uris = self.get_match_uris(properties)
+            if uris:
+                concept_uris[conc] = frozenset(uris)
+            if self.is_geographical(properties):
+                geographical_sources.add(conc)
+                geographical_changed = True
+            self.patch_label_concepts(conc, self.get_concept_labels(properties), affected_labels)
+        #maantieteellisten käsitteiden YSO-vastineet kootaan uudelleen maantieteellisistä käsitteistä:
+        if geographical_changed:
+            geographical_concepts = set()
+            for conc in geographical_sources:
+                geographical_concepts.update(concept_uris.get(conc, ()))
+            self.geographical_concepts = geographical_concepts
+        self.patch_labels(affected_labels)
+        self.patch_additional_dicts(affected_labels)
+        return {conc for conc in set(old_concepts) | set(new_concepts)
+            if previous_uris.get(conc, frozenset()) != concept_uris.get(conc, frozenset())}
+
+    def patch_label_concepts(self, concept, labels, affected_labels, add=True):
+        """
+        lisää käsitteen labelien lähteisiin (label_concepts) tai poistaa sen niistä, jos add on False
+        affected_labels: joukko, johon lisätään muuttuneet labelit
+        """
+        label_concepts = self.get_patched_table('label_concepts')
+        for label in labels:
+            if add:
+                concepts = label_concepts.get(label, frozenset()) | {concept}
+            else:
+                concepts = label_concepts.get(label, frozenset()) - {concept}
+            if concepts:
+                label_concepts[label] = concepts
+            else:
+                label_concepts.pop(label, None)
+            affected_labels.add(label)
+
+    def patch_labels(self, affected_labels):
+        """
+        Muodostaa muuttuneiden labelien URIt uudelleen niiden käsitteiden (label_concepts) YSO-vastineista
+        (concept_uris) ja päivittää ketjutetut maantieteelliset termit. Labelit, joilla ei enää ole käsitteitä, poistetaan.
+        """
+        labels = self.get_patched_table('labels')
+        chained_labels = self.get_patched_table('geographical_chained_labels')
+        chains_changed = False
+        interned = {}
+        for label in affected_labels:
+            concepts = self.label_concepts.get(label)
+            is_chained = False
+            if concepts:
+                uris = set()
+                for conc in concepts:
+                    uris.update(self.concept_uris.get(conc, ()))
+                labels[label] = self.intern_value(frozenset(uris), interned)
+                is_chained = "--" in label and any(conc in self.geographical_sources for conc in concepts)
+            else:
+                labels.pop(label, None)
+            if is_chained != (label in chained_labels):
+                chains_changed = True
+                if is_chained:
+                    chained_labels.add(label)
+                else:
+                    chained_labels.discard(label)
+        if chains_changed:
+            self.create_geographical_chains()
+
+    def create_geographical_chains(self):
+        """
+        Muodostaa ketjutetuista maantieteellisistä termeistä puun, jossa ketjun osat (erotin " -- ")
+        ovat avaimina ja arvoina seuraavien osien sanakirjat. Jos ketju päättyy osaan, osan sanakirjassa
+        on avaimena chain_separator, joka ei voi olla ketjun osa. Puun avulla osakentistä voidaan tunnistaa
+        kaksi- ja useampiosaiset ketjut yhdistämättä osakenttiä merkkijonoiksi.
+        """
+        self.geographical_chains = {}
+        for label in self.geographical_chained_labels:
+            node = self.geographical_chains
+            for part in label.split(self.chain_separator):
+                node = node.setdefault(part, {})
+            node.update({self.chain_separator: {}})
+
     def parse_label_vocabulary(self, g):
         """
         muodostaa sanastolle, joka sisältää vain käsitteiden labelit ja niiden prefLabelit
         """
+        g = self.index_concepts(g)
         temp_labels = {}
+        #kielikoodit avaimina ja arvoina labelit ja käsitteet, joiden pref- tai altLabel label on:
+        label_concepts = {}
         for lc in self.language_codes:
             self.labels.update({lc: {}})
             self.labels_lowercase.update({lc: {}})
             self.stripped_labels.update({lc: {}})
             self.labels_with_and_without_specifiers.update({lc: {}})
             self.labels_with_specifiers.update({lc: {}})
+            self.label_variants.update({lc: {}})
+            self.pref_labels.update({lc: {}})
             temp_labels.update({lc: {}})
-        #SLM:n deprekoidut käsitteet laitetaan altLabeleihin 
-        for conc in g.subjects(RDF.type, SKOS.Concept):
-            uri = str(conc)
-            for lc in self.language_codes:
-                pref_label = g.preferredLabel(conc, lang=lc)
-                if pref_label:
-                    pref_label = str(pref_label[0][1])
-                    if len(self.language_codes) > 1:
-                        if uri in self.translations:
-                            self.translations[uri].update({lc: pref_label})
-                        else:
-                            self.translations.update({uri: {lc: pref_label}})
-                    if pref_label in self.labels[lc]:
-                        self.labels[lc][pref_label]["pref_label"].add(pref_label)
-                        self.labels[lc][pref_label]["uris"].add(uri)
-                    else:
-                        self.labels[lc].update({pref_label: {"pref_label": {pref_label}, "uris":{uri}}})
-                alt_labels = g.preferredLabel(conc, lang=lc, labelProperties=[SKOS.altLabel])
-                for al in alt_labels:
-                    alt_label = str(al[1])
-                    if alt_label in self.labels[lc]:
-                        self.labels[lc][alt_label]["pref_label"].add(pref_label)
-                        self.labels[lc][alt_label]["uris"].add(uri)
-                    else:
-                        self.labels[lc].update({alt_label: {"pref_label": {pref_label}, "uris":{uri}}})
+            label_concepts.update({lc: {}})
+        #SLM:n deprekoidut käsitteet laitetaan altLabeleihin
+        for uri, properties in g.concepts():
+            self.add_label_concept(uri, properties, label_concepts)
+        #samansisältöiset joukot ja label-tiedot jaetaan taulujen kesken kopioimisen sijaan:
+        interned = {}
         for lc in self.language_codes:
-            for label in self.labels[lc]:
-                label_info = self.labels[lc][label]
-                ll = label.lower()
-                pref_labels = label_info['pref_label'].copy()
-                uris = label_info['uris'].copy()
-                if ll in self.labels_lowercase[lc]:
-                    self.labels_lowercase[lc][ll]["pref_label"].update(pref_labels)
-                    self.labels_lowercase[lc][ll]["uris"].update(uris)
-                else:
-                    self.labels_lowercase[lc].update({ll: {"pref_label": pref_labels, "uris":uris}}) 
+            for label, uris in label_concepts[lc].items():
+                pref_labels = {self.pref_labels[lc][uri] for uri in uris}
+                self.labels[lc][label] = self.intern_label_info(pref_labels, uris, interned)
+            for label, label_info in self.labels[lc].items():
+                ll = self.intern_value(label.lower(), interned)
+                self.merge_label_info(self.labels_lowercase[lc], ll, label_info, interned)
                 
-            for label in self.labels[lc]:
-                label_info = self.labels[lc][label]
-                ll = self.remove_diacritical_chars(label).lower()
-                pref_labels = label_info['pref_label'].copy()
-                uris = label_info['uris'].copy()
-                if ll in self.stripped_labels[lc]:
-                    self.stripped_labels[lc][ll]["pref_label"].update(pref_labels)  
-                    self.stripped_labels[lc][ll]["uris"].update(uris)
-                else:
-                    self.stripped_labels[lc].update({ll: {"pref_label": pref_labels, "uris":uris}}) 
+            for label, label_info in self.labels[lc].items():
+                ll = self.intern_value(self.remove_diacritical_chars(label).lower(), interned)
+                self.merge_label_info(self.stripped_labels[lc], ll, label_info, interned)
                 
                 #tehdään sanasto termeille, joilla on sulkutarkenteellinen ja sulkutarkenteeton muoto:
-                stripped_label = re.sub("[\(].*?[\)]", "", ll)
-                stripped_label = stripped_label.strip()
-                pref_labels = label_info['pref_label'].copy()
-                uris = label_info['uris'].copy()
-
-                if stripped_label in temp_labels[lc]:
-                    temp_labels[lc][stripped_label]["pref_label"].update(pref_labels)
-                    temp_labels[lc][stripped_label]["uris"].update(uris)
-                else:
-                    temp_labels[lc].update({stripped_label: {"pref_label": pref_labels, "uris":uris}}) 
+                stripped_label = re.sub(self.specifier_pattern, "", ll)
+                stripped_label = self.intern_value(stripped_label.strip(), interned)
+                self.merge_label_info(temp_labels[lc], stripped_label, label_info, interned)
+            self.create_label_variants(self.labels[lc], self.label_variants[lc], interned)
                 
         for lc in self.language_codes:    
             for tl in temp_labels[lc]:
@@ -262,56 +617,361 @@ class Vocabulary():
                         self.labels_with_and_without_specifiers[lc].update({tl: temp_labels[lc][tl]})
                 else:
                     self.labels_with_specifiers[lc].update({tl: temp_labels[lc][tl]}) 
+        for lc in self.language_codes:
+            self.resolutions.update({lc: self.create_resolutions(self.labels[lc], self.labels_lowercase[lc],
+                self.stripped_labels[lc], self.labels_with_specifiers[lc], True)})
+
+    def add_label_concept(self, uri, properties, label_concepts):
+        """
+        tallentaa käsitteen prefLabelit ja käännökset sekä lisää käsitteen sen labelien käsitteisiin
+        label_concepts: kielikoodit avaimina ja arvoina labelit ja niiden käsitteiden joukot
+        """
+        for lc in self.language_codes:
+            pref_label = ConceptIndex.get_values(properties, lang=lc)
+            if pref_label:
+                pref_label = str(pref_label[0])
+                self.pref_labels[lc][uri] = pref_label
+                if len(self.language_codes) > 1:
+                    translation = self.normalize_characters(pref_label)
+                    if uri in self.translations:
+                        self.translations[uri].update({lc: translation})
+                    else:
+                        self.translations[uri] = {lc: translation}
+            for label in self.get_language_labels(properties, lc):
+                label_concepts[lc].setdefault(label, set()).add(uri)
+
+    def patch_label_vocabulary(self, old_concepts, new_concepts):
+        """
+        Päivittää parse_label_vocabulary-metodilla muodostetut hakutaulut muuttuneiden käsitteiden osalta.
+        old_concepts ja new_concepts: kuten patch_origin_vocabulary-metodissa
+        Labelin käsitteet ovat sen label-tiedoissa, ja niiden prefLabelit haetaan pref_labels-taulusta.
+        """
+        self.get_patched_table('translations')
+        label_concepts = {}
+        for lc in self.language_codes:
+            labels = self.get_patched_table('labels', lc)
+            pref_labels = self.get_patched_table('pref_labels', lc)
+            label_concepts.update({lc: {}})
+            for properties in list(old_concepts.values()) + list(new_concepts.values()):
+                for label in self.get_language_labels(properties, lc):
+                    if label not in label_concepts[lc]:
+                        label_concepts[lc].update({label: set(labels[label]["uris"]) if label in labels else set()})
+            for uri, properties in old_concepts.items():
+                pref_labels.pop(uri, None)
+                for label in self.get_language_labels(properties, lc):
+                    label_concepts[lc][label].discard(uri)
+        for uri in old_concepts:
+            self.translations.pop(uri, None)
+        for uri, properties in new_concepts.items():
+            self.add_label_concept(uri, properties, label_concepts)
+        for lc in self.language_codes:
+            interned = {}
+            for label, uris in label_concepts[lc].items():
+                if uris:
+                    pref_labels = {self.pref_labels[lc][uri] for uri in uris}
+                    self.labels[lc][label] = self.intern_label_info(pref_labels, uris, interned)
+                else:
+                    self.labels[lc].pop(label, None)
+            self.patch_additional_dicts(label_concepts[lc], lc)
 
     def create_additional_dicts(self):
         #luo sanahakuja varten 2 dictionaryä, joissa avaimet pienillä kirjaimilla ja ilman diakriittejä
+        #samansisältöiset URI-joukot jaetaan taulujen kesken frozenset-olioina kopioimisen sijaan:
+        interned = {}
         temp_labels = {}
-        for label in self.labels:
-            uris = copy.copy(self.labels[label])
-            ll = label.lower()
-            if ll in self.labels_lowercase:
-                self.labels_lowercase[ll].update(uris)
-            else:
-                self.labels_lowercase.update({ll: uris})
+        for label, uris in self.labels.items():
+            self.labels[label] = self.intern_value(frozenset(uris), interned)
+        for label, concepts in self.label_concepts.items():
+            self.label_concepts[label] = self.intern_value(frozenset(concepts), interned)
+        for label, uris in self.labels.items():
+            ll = self.intern_value(label.lower(), interned)
+            self.merge_uris(self.labels_lowercase, ll, uris, interned)
             #sanasto ilman diakriittejä:
-            uris = copy.copy(uris)
-            stripped_label = self.remove_diacritical_chars(label).lower()
-            if stripped_label in self.stripped_labels:
-                self.stripped_labels[stripped_label].update(uris)
-            else:
-                self.stripped_labels.update({stripped_label: uris})     
+            stripped_label = self.intern_value(self.remove_diacritical_chars(label).lower(), interned)
+            self.merge_uris(self.stripped_labels, stripped_label, uris, interned)
             #sanasto ilman diakriittejä ja sulkutarkenteita:
-            stripped_label = re.sub("[\(].*?[\)]", "", stripped_label)
-            stripped_label = stripped_label.strip()
-            uris = copy.copy(uris)
-            
-            if stripped_label in temp_labels:
-                temp_labels[stripped_label].update(uris)
-            else:
-                temp_labels.update({stripped_label: uris})
+            stripped_label = re.sub(self.specifier_pattern, "", stripped_label)
+            stripped_label = self.intern_value(stripped_label.strip(), interned)
+            self.merge_uris(temp_labels, stripped_label, uris, interned)
+        self.create_label_variants(self.labels, self.label_variants, interned)
         for tl in temp_labels:
             if tl in self.stripped_labels:
                 if len(temp_labels[tl]) > len(self.stripped_labels[tl]):
                     self.labels_with_and_without_specifiers.update({tl: temp_labels[tl]})
             else:
                 self.labels_with_specifiers.update({tl: temp_labels[tl]}) 
+        self.resolutions = self.create_resolutions(self.labels, self.labels_lowercase,
+            self.stripped_labels, self.labels_with_specifiers)
+
+    def get_label_keys(self, label):
+        """
+        palauttaa labelin hakuavaimet: pienaakkosisen muodon, diakriitittömän muodon
+        ja diakriitittömän muodon ilman sulkutarkenteita
+        """
+        stripped_label = self.remove_diacritical_chars(label).lower()
+        return label.lower(), stripped_label, re.sub(self.specifier_pattern, "", stripped_label).strip()
+
+    def create_label_variants(self, labels, label_variants, interned):
+        """
+        tallentaa label_variants-tauluun jokaisen hakuavaimen labelit (ks. get_label_keys)
+        """
+        for label in labels:
+            for key in set(self.get_label_keys(label)):
+                key = self.intern_value(key, interned)
+                if key in label_variants:
+                    label_variants[key].add(label)
+                else:
+                    label_variants.update({key: {label}})
+        for key, variants in label_variants.items():
+            label_variants[key] = frozenset(variants)
+
+    def patch_additional_dicts(self, affected_labels, language=None):
+        """
+        Päivittää create_additional_dicts-metodin (tai kielikohtaisesti parse_label_vocabulary-metodin) hakutaulut
+        ja ratkaisut niiden hakuavainten osalta, joihin muuttuneet labelit vaikuttavat. Avaimen muut labelit
+        haetaan label_variants-taulusta, joten muuttumattomia labeleita ei käydä läpi.
+        affected_labels: labelit, jotka on lisätty tai poistettu tai joiden arvo on muuttunut
+        language: kielikoodi, jos hakutaulut ovat kielikohtaisia (arvoina label-tiedot)
+        """
+        pref_labels = language is not None
+        labels, labels_lowercase, stripped_labels, labels_with_and_without_specifiers, labels_with_specifiers, \
+            resolutions, label_variants = [self.get_patched_table(table_name, language) for table_name in
+            ['labels', 'labels_lowercase', 'stripped_labels', 'labels_with_and_without_specifiers',
+            'labels_with_specifiers', 'resolutions', 'label_variants']]
+        keys = set(affected_labels)
+        for label in affected_labels:
+            label_keys = self.get_label_keys(label)
+            keys.update(label_keys)
+            for key in set(label_keys):
+                variants = label_variants.get(key, frozenset())
+                if label in labels and label not in variants:
+                    label_variants[key] = variants | {label}
+                elif label not in labels and label in variants:
+                    variants = variants - {label}
+                    if variants:
+                        label_variants[key] = variants
+                    else:
+                        del label_variants[key]
+        interned = {}
+        normalized_labels = {}
+        for key in keys:
+            #avaimen labelit pienaakkosisena, diakriitittömänä ja sulkutarkenteettomana muotona:
+            values = ([], [], [])
+            for label in label_variants.get(key, ()):
+                for label_values, label_key in zip(values, self.get_label_keys(label)):
+                    if label_key == key:
+                        label_values.append(labels[label])
+            lowercase_value, stripped_value, temp_value = [self.merge_values(label_values, interned, pref_labels)
+                for label_values in values]
+            for table, value in [(labels_lowercase, lowercase_value), (stripped_labels, stripped_value)]:
+                if value is None:
+                    table.pop(key, None)
+                else:
+                    table[key] = value
+            labels_with_and_without_specifiers.pop(key, None)
+            labels_with_specifiers.pop(key, None)
+            if temp_value is not None:
+                if stripped_value is not None:
+                    if len(temp_value) > len(stripped_value):
+                        labels_with_and_without_specifiers[key] = temp_value
+                else:
+                    labels_with_specifiers[key] = temp_value
+            resolution = self.get_key_resolution(key, labels, labels_lowercase, stripped_labels, labels_with_specifiers,
+                pref_labels, normalized_labels)
+            if resolution is None:
+                resolutions.pop(key, None)
+            else:
+                resolutions[key] = resolution
+
+    def get_patched_table(self, table_name, language=None):
+        """
+        Palauttaa hakutaulun muokattavana. Käännetystä tiedostosta luettu sanakirja korvataan PatchedMapping-oliolla,
+        joka tallentaa vain muutokset, ja joukko kopioidaan.
+        language: kielikoodi, jos taulu on kielikohtainen
+        """
+        if language is None:
+            table = getattr(self, table_name)
+        else:
+            tables = getattr(self, table_name)
+            if not isinstance(tables, dict):
+                tables = dict(tables)
+                setattr(self, table_name, tables)
+            table = tables[language]
+        if isinstance(table, (MutableMapping, MutableSet)):
+            return table
+        if isinstance(table, Set):
+            table = set(table)
+        else:
+            table = PatchedMapping(table)
+        if language is None:
+            setattr(self, table_name, table)
+        else:
+            tables[language] = table
+        return table
         
+    def create_resolutions(self, labels, labels_lowercase, stripped_labels, labels_with_specifiers, pref_labels=False):
+        """
+        Ratkaisee valmiiksi hakutaulujen jokaisen avaimen hakutuloksen, jotta hakusana voidaan hakea
+        yhdestä taulusta käymättä hakutauluja läpi järjestyksessä (ks. resolve).
+        Avaimen tulokset tallennetaan sanakirjaan, jossa
+        exact: voimassaolevat URIt, kun hakusana on sellaisenaan labelina,
+        lowercase: voimassaolevat URIt, kun hakusana on pienillä kirjaimilla avaimena,
+        exact_label ja lowercase_label: edellisten prefLabel hakutuloksissa käytettävässä muodossa
+        (jos pref_labels on True) ja
+        error: virhekoodi 3 tai 4, kun hakusanalla on vain sulkutarkenteellisia muotoja.
+        pref_labels: True, jos hakutaulujen arvoina on {"pref_label": prefLabelit, "uris": URIt}
+        """
+        resolutions = {}
+        #normalisoidut prefLabelit:
+        normalized_labels = {}
+        for table in [labels, labels_lowercase, stripped_labels, labels_with_specifiers]:
+            for key in table:
+                if key not in resolutions:
+                    resolutions.update({key: self.get_key_resolution(key, labels, labels_lowercase, stripped_labels,
+                        labels_with_specifiers, pref_labels, normalized_labels)})
+        return resolutions
+
+    def get_key_resolution(self, key, labels, labels_lowercase, stripped_labels, labels_with_specifiers,
+        pref_labels=False, normalized_labels=None):
+        """
+        palauttaa yhden avaimen hakutuloksen (ks. create_resolutions) tai None, jos avainta ei ole hakutauluissa
+        """
+        resolution = None
+        if key in labels:
+            resolution = self.get_resolution(labels[key], "exact", pref_labels, normalized_labels)
+        for table in [labels_lowercase, stripped_labels]:
+            if key in table:
+                lowercase_resolution = self.get_resolution(table[key], "lowercase", pref_labels, normalized_labels)
+                break
+        else:
+            if key not in labels_with_specifiers:
+                return resolution
+            uris = labels_with_specifiers[key]
+            if pref_labels:
+                uris = uris["uris"]
+            if len(uris) > 1:
+                lowercase_resolution = {"error": "4"}
+            elif len(uris) == 1:
+                lowercase_resolution = {"error": "3"}
+            else:
+                lowercase_resolution = {"lowercase": []}
+        if resolution is None:
+            return lowercase_resolution
+        resolution.update(lowercase_resolution)
+        return resolution
+
+    def get_resolution(self, value, level, pref_labels=False, normalized_labels=None):
+        """
+        normalized_labels: prefLabelit avaimina ja arvoina niiden normalisoidut muodot, jotta sama muoto on muistissa kerran
+        """
+        if normalized_labels is None:
+            normalized_labels = {}
+        if pref_labels:
+            uris = value["uris"]
+        else:
+            uris = value
+        valid_uris = []
+        #järjestetään, jotta päivitetyn ja uudelleen muodostetun sanaston taulut ovat samat:
+        for uri in sorted(uris):
+            if uri not in self.deprecated_concepts:
+                valid_uris.append(uri)
+        resolution = {level: valid_uris}
+        if pref_labels and valid_uris:
+            #useasta prefLabelista valitaan aakkosjärjestyksessä ensimmäinen:
+            l = min(value["pref_label"])
+            if l not in normalized_labels:
+                normalized_labels[l] = self.normalize_characters(l)
+            resolution.update({level + "_label": normalized_labels[l]})
+        return resolution
+
+    def resolve(self, concept, language=None):
+        """
+        palauttaa hakusanan voimassaolevat URIt ja prefLabelin create_resolutions-metodilla muodostetusta taulusta
+        Virhekoodit 3 ja 4 kuten get_uris_with_concept-metodissa.
+        """
+        if language is None:
+            resolutions = self.resolutions
+        else:
+            resolutions = self.resolutions[language]
+        level = "exact"
+        resolution = resolutions.get(concept)
+        valid_uris = None
+        if resolution is not None:
+            valid_uris = resolution.get(level)
+        if valid_uris is None:
+            level = "lowercase"
+            lowercase_concept = concept.lower()
+            if lowercase_concept != concept:
+                resolution = resolutions.get(lowercase_concept)
+            if resolution is None:
+                return [], None
+            valid_uris = resolution.get(level)
+            if valid_uris is None:
+                if "error" in resolution:
+                    raise ValueError(resolution["error"])
+                return [], None
+        if valid_uris:
+            return valid_uris, resolution.get(level + "_label")
+        return valid_uris, None
+
+    def intern_value(self, value, interned):
+        """
+        palauttaa aiemmin tallennetun samansisältöisen merkkijonon tai frozensetin, jotta sama arvo on muistissa vain kerran
+        interned: tallennetut arvot avaimina ja arvoina
+        """
+        return interned.setdefault(value, value)
+
+    def merge_uris(self, table, key, uris, interned):
+        """
+        yhdistää URI-joukon taulun avaimen aiempiin URIhin ja tallentaa tuloksen jaettuna frozensetinä
+        """
+        if key in table:
+            uris = table[key] | uris
+        table[key] = self.intern_value(frozenset(uris), interned)
+
+    def intern_label_info(self, pref_labels, uris, interned):
+        """
+        palauttaa label-tiedot {"pref_label": prefLabelit, "uris": URIt}, jotka jaetaan samansisältöisten avainten kesken
+        """
+        pref_labels = self.intern_value(frozenset(pref_labels), interned)
+        uris = self.intern_value(frozenset(uris), interned)
+        return interned.setdefault((pref_labels, uris), {"pref_label": pref_labels, "uris": uris})
+
+    def merge_label_info(self, table, key, label_info, interned):
+        pref_labels = label_info['pref_label']
+        uris = label_info['uris']
+        if key in table:
+            pref_labels = table[key]['pref_label'] | pref_labels
+            uris = table[key]['uris'] | uris
+        table[key] = self.intern_label_info(pref_labels, uris, interned)
+
+    def merge_values(self, values, interned, pref_labels=False):
+        """
+        yhdistää hakutaulujen arvot (URI-joukot tai label-tiedot) yhdeksi jaetuksi arvoksi, None jos arvoja ei ole
+        """
+        if not values:
+            return None
+        uris = set()
+        if pref_labels:
+            labels = set()
+            for value in values:
+                labels.update(value['pref_label'])
+                uris.update(value['uris'])
+            return self.intern_label_info(labels, uris, interned)
+        for value in values:
+            uris.update(value)
+        return self.intern_value(frozenset(uris), interned)
+
     def get_concept_with_uri(self, uri, language):
         #muutetaan kaksikirjaimiset kielikoodit kolmikirjaimiseksi sanastokoodia varten:
-        if uri in self.deprecated_concepts:
-            replacers = self.deprecated_concepts[uri]
-            valid_uris = []
-            if replacers:
-                for r in replacers:
-                    if not r in self.deprecated_concepts:
-                        valid_uris.append(r)
-                if len(valid_uris) == 0 or len(valid_uris) > 1:
-                    raise ValueError("2")
-            if valid_uris:
-                label = self.labels[valid_uris[0]][language]
-                return {"label": label, "uris": valid_uris, "code": self.target_vocabulary_code + "/" + self.convert_to_ISO_639_2(language)}  
-            else:
+        replacer = self.deprecated_replacements.get(uri)
+        if replacer is not None:
+            #deprekoidulla käsitteellä on oltava täsmälleen yksi voimassaoleva korvaaja:
+            #korvaajalla ei ole labelia haetulla kielellä:
+            if not replacer or language not in self.labels[replacer]:
                 raise ValueError("2")
+            label = self.labels[replacer][language]
+            return {"label": label, "uris": [replacer], "code": self.target_vocabulary_code + "/" + self.convert_to_ISO_639_2(language)}  
         elif uri in self.labels:
             if language in self.labels[uri]:
                 label = self.labels[uri][language]
@@ -321,12 +981,9 @@ class Vocabulary():
         """
         label: haettavan käsiten pref- tai altLabel
         language: kieliversio, jota haetaan
-        all_languages: jos True, niin tuotetaan kummatkin kieliversiot
+        Hakusanaa haetaan järjestyksessä labeleista, pienillä kirjaimilla, ilman diakriittejä
+        ja sulkutarkenteettomista muodoista. Järjestys on ratkaistu valmiiksi create_resolutions-metodissa.
         """
-        uris = []
-        valid_uris = []
-        labels = {}
-        pref_labels = []
         """
         Poistettu virhe 5: jos löytyy täsmälleen yksi sulkutarkenteeton muoto pref- tai altLabelina, niin konvertoidaan tähän labeliin
         if label.lower() in self.labels_with_and_without_specifiers:
@@ -334,31 +991,14 @@ class Vocabulary():
             if len(uris) > 1:
                 raise ValueError("5")
         """
-        if label in self.labels[language]:
-            uris = self.labels[language][label]["uris"]
-            labels = self.labels[language][label]["pref_label"]
-        elif label.lower() in self.labels_lowercase[language]:
-            uris = self.labels_lowercase[language][label.lower()]["uris"]
-            labels = self.labels_lowercase[language][label.lower()]["pref_label"]
-        elif label.lower() in self.stripped_labels[language]:
-            uris = self.stripped_labels[language][label.lower()]["uris"]
-            labels = self.stripped_labels[language][label.lower()]["pref_label"]  
-        elif label.lower() in self.labels_with_specifiers[language]:
-            uris = self.labels_with_specifiers[language][label.lower()]["uris"]
-            if len(uris) > 1:
-                raise ValueError("4")
-            elif len(uris) == 1:
-                raise ValueError("3")
-        for uri in uris:
-            if uri not in self.deprecated_concepts:
-                valid_uris.append(uri)     
-        for l in labels:
-            pref_labels.append(l)      
+        valid_uris, pref_label = self.resolve(label, language)
         if valid_uris:
-            return {"label": pref_labels[0], "uris": valid_uris, "code": self.target_vocabulary_code + "/" + self.convert_to_ISO_639_2(language)}
+            return self.get_label_response(valid_uris, pref_label, language)
+
+    def get_label_response(self, valid_uris, pref_label, language):
+        return {"label": pref_label, "uris": list(valid_uris), "code": self.target_vocabulary_code + "/" + self.convert_to_ISO_639_2(language)}
                 
     def get_uris_with_concept(self, concept):
-        uris = []
         """
         Poistettu virhe 5: jos löytyy täsmälleen yksi sulkutarkenteeton muoto pref- tai altLabelina, niin konvertoidaan tähän labeliin
         if concept.lower() in self.labels_with_and_without_specifiers:
@@ -366,24 +1006,9 @@ class Vocabulary():
             if len(uris) > 1:
                 raise ValueError("5")
         """
-        if concept in self.labels:
-            uris = self.labels[concept]
-        elif concept.lower() in self.labels_lowercase:
-            uris = self.labels_lowercase[concept.lower()]
-        elif concept.lower() in self.stripped_labels:
-            uris = self.stripped_labels[concept.lower()]
-        elif concept.lower() in self.labels_with_specifiers:
-            uris = self.labels_with_specifiers[concept.lower()]
-            if len(uris) > 1:
-                raise ValueError("4")
-            elif len(uris) == 1:
-                raise ValueError("3")
-        valid_uris = []
-        for uri in uris:
-            if uri not in self.deprecated_concepts:
-                valid_uris.append(uri)    
+        valid_uris, _ = self.resolve(concept)
         if valid_uris:
-            return {"uris": valid_uris}
+            return {"uris": list(valid_uris)}
 
     def translate_label(self, uri, language):
         translated_label = None
@@ -402,14 +1027,16 @@ class Vocabulary():
 
     def remove_diacritical_chars(self, word):
         #poistaa tarkkeet kaikista muista merkeistä paitsi å, ä, ö
-        result = ""
-        for letter in word:
-            match = re.match(r'.*([0-9a-zA-ZåäöÅÄÖ\- \'])', letter)
-            if match:
-                result += letter
-            else:
-                result += unidecode.unidecode(letter)
-        return result  
+        return word.translate(self.diacritic_translations)
+
+    def normalize_characters(self, string):
+        #koodaa skandinaaviset merkit yksiosaisiksi ja muut kaksiosaisiksi: 
+        if string.isascii():
+            return string
+        string = unicodedata.normalize('NFD', string)
+        return (string.replace("A\u030a", "Å").replace("a\u030a", "å").
+            replace("A\u0308", "Ä").replace("a\u0308", "ä").
+            replace("O\u0308", "Ö").replace("o\u0308", "ö"))
     
     def convert_to_ISO_639_2(self, code):
         if code == "fi":
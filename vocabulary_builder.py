@@ -0,0 +1,392 @@
+from vocabulary import Vocabulary, ConceptIndex
+from triple_reader import read_triples, read_turtle_blocks, turtle_byte_blocks, SubjectRecorder
+from vocabularies import Vocabularies
+from compiled_vocabularies import CompiledVocabularies, CompiledProvenance
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections.abc import Mapping
+import copy
+import filecmp
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+def build_vocabularies(vocabulary_codes, path, exact_matches=None):
+    """
+    Lukee sanastotiedoston ja muodostaa siitä sanastot.
+    Tiedoston triplet luetaan suoraan ConceptIndexiin, joten muistiin ei muodosteta koko sanaston graafia.
+    vocabulary_codes: tiedostosta muodostettavien sanastojen koodit (Musa ja Cilla käyttävät samaa tiedostoa)
+    path: sanastotiedoston polku
+    exact_matches: Musan ja Cillan tarvitsemat Ysan YSO-vastineet
+    Palauttaa muodostetut sanastot, Ysan YSO-vastineet (jos tiedosto on Ysan) ja käsittelyn keston sekunteina.
+    """
+    start = time.perf_counter()
+    g = ConceptIndex()
+    read_triples(path, g)
+    built_vocabularies, ysa_exact_matches = build_from_index(vocabulary_codes, g, exact_matches)
+    return built_vocabularies, ysa_exact_matches, time.perf_counter() - start
+
+def build_from_index(vocabulary_codes, g, exact_matches=None):
+    """
+    muodostaa sanastot sanastotiedoston ConceptIndexistä, palauttaa sanastot ja Ysan YSO-vastineet
+    """
+    built_vocabularies = Vocabularies()
+    #Cillalla ei ole omaa graafia, vaan se muodostetaan Musan graafista:
+    if vocabulary_codes[0] == "cilla":
+        graphs = {'musa': g}
+    else:
+        graphs = {vocabulary_codes[0]: g}
+    #Ysan tiedostoa käsiteltäessä aiemmin muodostettuja vastineita ei käytetä:
+    if exact_matches is not None and 'ysa' not in graphs:
+        graphs.update({'ysa': exact_matches})
+    for vocabulary_code in vocabulary_codes:
+        built_vocabularies.parse_vocabulary(vocabulary_code, graphs)
+    ysa_exact_matches = None
+    if 'ysa' in vocabulary_codes:
+        ysa_exact_matches = Vocabulary('ysa', ['fi']).get_exact_matches(graphs['ysa'])
+    return built_vocabularies, ysa_exact_matches
+
+def build_compiled_vocabularies(vocabulary_codes, path, output_path, provenance_path, exact_matches=None):
+    """
+    Työprosessissa suoritettava build_vocabularies, joka palauttaa sanastojen sijaan
+    käännetyn tiedoston polun, jotta prosessien välillä ei siirretä rdflib-graafeja eikä sanastojen olioita.
+    Sanastojen päivittämiseen tarvittavat taulut käännetään tiedostoon provenance_path (ks. CompiledProvenance).
+    """
+    built_vocabularies, ysa_exact_matches, elapsed = build_vocabularies(vocabulary_codes, path, exact_matches)
+    CompiledVocabularies.compile(built_vocabularies, output_path)
+    CompiledProvenance.compile(built_vocabularies, provenance_path)
+    return output_path, ysa_exact_matches, elapsed
+
+class VocabularyBuilder():
+    """
+    Muodostaa sanastot sanastotiedostoista joko peräkkäin tai rinnakkain työprosesseissa.
+    Sanastot ovat toisistaan riippumattomia lukuun ottamatta Musaa ja Cillaa, jotka tarvitsevat Ysan YSO-vastineet,
+    joten ne käsitellään vasta Ysan jälkeen.
+    """
+    #Turtle-lohkojen literaalit, URIt ja kommentit, jotka ohitetaan lauseita ja määrityksiä etsittäessä:
+    lexical_token = re.compile(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|<[^<>\s]*>|#[^\n]*')
+    #lauseen päättävä piste (nimen tai desimaaliluvun piste ei ole sanan lopussa):
+    statement_end = re.compile(r'\.(?=\s|$)')
+    directive = re.compile(r'(?i)\s*(@prefix|@base|prefix|base)\s')
+    prefix_directive = re.compile(r'(?im)^\s*@?prefix\s+([^\s:]*):\s*<([^>]*)>')
+    #lohkon ensimmäinen termi kommenttien jälkeen:
+    first_term = re.compile(r'(?:\s|#[^\n]*)*(<[^<>\s]*>|_:|\[|[^\s<>"\'#;,\[\]()]*:[^\s;,\[\]()"\'#]*)')
+
+    def __init__(self, workers=1):
+        """
+        workers: työprosessien määrä, 1 jos sanastot käsitellään pääprosessissa
+        """
+        self.workers = workers
+        #edellisen käsittelyn Ysan YSO-vastineet, jos Musa ja Cilla käsitellään myöhemmin uudelleen:
+        self.exact_matches = None
+        #sanastokoodit avaimina ja käsittelyn kesto sekunteina arvoina:
+        self.timings = {}
+
+    def get_jobs(self, vocabulary_files):
+        """
+        vocabulary_files: sanastokoodit avaimina ja sanastotiedostojen polut arvoina
+        palauttaa listan (sanastokoodit, tiedostopolku), samaa tiedostoa käyttävät sanastot samassa työssä
+        """
+        jobs = {}
+        for vocabulary_code in vocabulary_files:
+            path = vocabulary_files[vocabulary_code]
+            if path in jobs:
+                jobs[path].append(vocabulary_code)
+            else:
+                jobs.update({path: [vocabulary_code]})
+            #Cillalla ei ole omaa tiedostoa, vaan se muodostetaan Musan tiedostosta:
+            if vocabulary_code == "musa" and "cilla" not in vocabulary_files:
+                jobs[path].append("cilla")
+        return [(sorted(codes, key=lambda code: code == "cilla"), path) for path, codes in jobs.items()]
+
+    def build(self, vocabulary_files):
+        """
+        vocabulary_files: sanastokoodit avaimina ja sanastotiedostojen polut arvoina
+        palauttaa muodostetut sanastot Vocabularies-oliona
+        """
+        start = time.perf_counter()
+        jobs = self.get_jobs(vocabulary_files)
+        #Musaa ja Cillaa ei aloiteta ennen kuin Ysan vastineet ovat käytettävissä:
+        waiting_jobs = []
+        ready_jobs = []
+        for codes, path in jobs:
+            if any(code in ['musa', 'cilla'] for code in codes) and \
+                (self.exact_matches is None or 'ysa' in vocabulary_files):
+                waiting_jobs.append((codes, path))
+            else:
+                ready_jobs.append((codes, path))
+        if waiting_jobs and self.exact_matches is None and 'ysa' not in vocabulary_files:
+            raise ValueError("Musan ja Cillan käsittelyyn tarvitaan Ysa-sanasto")
+        built_vocabularies = Vocabularies()
+        if self.workers > 1:
+            self.build_in_processes(ready_jobs, waiting_jobs, built_vocabularies)
+        else:
+            for codes, path in ready_jobs + waiting_jobs:
+                logging.info("käsitellään sanastoa %s"%", ".join(codes))
+                result, exact_matches, elapsed = build_vocabularies(codes, path, self.exact_matches)
+                self.add_result(codes, result, exact_matches, elapsed, built_vocabularies)
+        logging.info("sanastot käsitelty: %.1f s"%(time.perf_counter() - start))
+        return built_vocabularies
+
+    def build_in_processes(self, ready_jobs, waiting_jobs, built_vocabularies):
+        with tempfile.TemporaryDirectory() as directory, \
+            ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            def submit(codes, path):
+                logging.info("käsitellään sanastoa %s"%", ".join(codes))
+                output_path = os.path.join(directory, "-".join(codes) + ".bin")
+                provenance_path = os.path.join(directory, "-".join(codes) + "-provenance.bin")
+                future = executor.submit(build_compiled_vocabularies, codes, path, output_path, provenance_path,
+                    self.exact_matches)
+                futures.update({future: (codes, provenance_path)})
+            for codes, path in ready_jobs:
+                submit(codes, path)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    codes, provenance_path = futures.pop(future)
+                    output_path, exact_matches, elapsed = future.result()
+                    #käännetty tiedosto pysyy käytettävissä muistikuvauksena, vaikka hakemisto poistetaan:
+                    result = CompiledVocabularies(output_path).get_vocabularies()
+                    CompiledProvenance(provenance_path).add_tables(result)
+                    self.add_result(codes, result, exact_matches, elapsed, built_vocabularies)
+                if not any('ysa' in codes for codes, _ in futures.values()):
+                    for codes, path in waiting_jobs:
+                        submit(codes, path)
+                    waiting_jobs = []
+
+    def add_result(self, codes, result, exact_matches, elapsed, built_vocabularies):
+        if exact_matches is not None:
+            self.exact_matches = exact_matches
+        built_vocabularies.vocabularies.update(result.vocabularies)
+        for code in codes:
+            self.timings.update({code: elapsed})
+        logging.info("sanasto %s käsitelty: %.1f s"%(", ".join(codes), elapsed))
+
+    def update(self, previous_vocabularies, old_files, new_files, verify=False):
+        """
+        Päivittää aiemmin muodostetut sanastot sanastotiedostojen uusiin versioihin.
+        previous_vocabularies: edellisen version sanastot päivittämiseen tarvittavine tauluineen (ks. CompiledProvenance)
+        old_files: sanastokoodit avaimina ja edellisen version sanastotiedostojen polut arvoina
+        new_files: sanastokoodit avaimina ja uuden version sanastotiedostojen polut arvoina
+        verify: jos True, tulosta verrataan kokonaan uudelleen muodostettuihin sanastoihin
+        Muuttumattomien tiedostojen sanastot otetaan edellisestä versiosta sellaisenaan. Muuttuneista tiedostoista
+        etsitään muuttuneet käsitteet, ja sanastojen hakutaulut päivitetään vain niihin vaikuttavien avainten osalta.
+        Jos tiedostoja ei voi verrata lohkoittain, tiedosto luetaan kokonaan.
+        Palauttaa päivitetyt sanastot Vocabularies-oliona.
+        """
+        start = time.perf_counter()
+        updated_vocabularies = Vocabularies()
+        #Ysa käsitellään ennen Musaa ja Cillaa, jotka tarvitsevat sen YSO-vastineet:
+        jobs = sorted(self.get_jobs(new_files), key=lambda job: any(code in ['musa', 'cilla'] for code in job[0]))
+        #Ysan käsitteet, joiden YSO-vastineet muuttuivat, tai None, jos Ysa muodostettiin kokonaan uudelleen:
+        changed_matches = set()
+        for codes, path in jobs:
+            name = ", ".join(codes)
+            job_start = time.perf_counter()
+            exact_matches = None
+            if any(code in ['musa', 'cilla'] for code in codes):
+                exact_matches = self.get_ysa_matches(updated_vocabularies, previous_vocabularies)
+            old_path = old_files.get(codes[0])
+            if old_path is None or any(code not in previous_vocabularies.vocabularies for code in codes):
+                changes = None
+            elif filecmp.cmp(old_path, path, shallow=False):
+                changes = ({}, {})
+            else:
+                changes = self.get_changed_concepts(old_path, path, name)
+            #Ysan kokonaan uudelleen muodostamisen jälkeen ei tiedetä, minkä Musan käsitteiden vastineet muuttuivat:
+            if changes is None or exact_matches is not None and changed_matches is None:
+                logging.info("sanastoa %s ei voi päivittää muutoksista, luetaan koko tiedosto"%name)
+                g = ConceptIndex()
+                read_triples(path, g)
+                result, ysa_exact_matches = build_from_index(codes, g, exact_matches)
+                if 'ysa' in codes:
+                    changed_matches = None
+                self.add_result(codes, result, ysa_exact_matches, time.perf_counter() - job_start, updated_vocabularies)
+                continue
+            old_concepts, new_concepts = changes
+            if not old_concepts and not new_concepts and not (exact_matches is not None and changed_matches):
+                logging.info("sanasto %s ei ole muuttunut"%name)
+                for code in codes:
+                    updated_vocabularies.vocabularies.update({code: previous_vocabularies.vocabularies[code]})
+                continue
+            result = Vocabularies()
+            for code in codes:
+                #edellisen version sanastoa ei muuteta, vaan päivitetyt taulut tallennetaan kopioon:
+                vocabulary = copy.copy(previous_vocabularies.vocabularies[code])
+                changed_concepts = result.patch_vocabulary(code, vocabulary, old_concepts, new_concepts,
+                    exact_matches, changed_matches)
+                if code == 'ysa':
+                    changed_matches = changed_concepts
+            self.add_result(codes, result, None, time.perf_counter() - job_start, updated_vocabularies)
+        if 'ysa' in updated_vocabularies.vocabularies:
+            #Musan ja Cillan myöhempää käsittelyä varten (ks. build):
+            self.exact_matches = dict(updated_vocabularies.vocabularies['ysa'].concept_uris)
+        logging.info("sanastot päivitetty: %.1f s"%(time.perf_counter() - start))
+        if verify:
+            rebuilt_vocabularies = VocabularyBuilder().build(new_files)
+            differences = self.get_differences(updated_vocabularies, rebuilt_vocabularies)
+            if differences:
+                logging.error("Päivitetyt sanastot eroavat kokonaan uudelleen muodostetuista: %s"%", ".join(differences))
+                return rebuilt_vocabularies
+            logging.info("päivitetyt sanastot tarkistettu")
+        return updated_vocabularies
+
+    def get_ysa_matches(self, updated_vocabularies, previous_vocabularies):
+        """
+        palauttaa päivitetyn tai edellisen version Ysan käsitteet avaimina ja arvoina niiden YSO-vastineet
+        """
+        for ysa_vocabularies in [updated_vocabularies, previous_vocabularies]:
+            if 'ysa' in ysa_vocabularies.vocabularies:
+                return ysa_vocabularies.vocabularies['ysa'].concept_uris
+        raise ValueError("Musan ja Cillan käsittelyyn tarvitaan Ysa-sanasto")
+
+    def get_changed_concepts(self, old_path, new_path, name):
+        """
+        Etsii muuttuneet käsitteet vertaamalla Turtle-tiedostojen lohkoja (ks. scan_blocks).
+        Kumpikin tiedosto luetaan kerran, ja vain lisätyt ja poistetut lohkot jäsennetään.
+        Edellisen version poistetut lohkot luetaan tiedostosta uudelleen niiden sijainnin perusteella.
+        Palauttaa muuttuneiden käsitteiden URIt avaimina ja ominaisuudet (ks. ConceptIndex) arvoina
+        edellisessä ja uudessa versiossa (poistetut käsitteet vain edellisessä, lisätyt vain uudessa)
+        tai None, jos tiedostoja ei voi verrata lohkoittain.
+        """
+        if not (old_path.endswith(".ttl") and new_path.endswith(".ttl")):
+            return None
+        old_scan = self.scan_blocks(old_path)
+        if old_scan is None:
+            return None
+        old_directives, old_prefixes, old_blocks, old_counts, _ = old_scan
+        new_scan = self.scan_blocks(new_path, old_blocks)
+        if new_scan is None:
+            return None
+        new_directives, new_prefixes, new_blocks, new_counts, added_blocks = new_scan
+        #samansisältöiset lohkot tarkoittavat samoja triplejä vain, jos etuliitteet ovat samat:
+        if any(new_prefixes.get(prefix, namespace) != namespace for prefix, namespace in old_prefixes.items()):
+            return None
+        removed_blocks = []
+        with open(old_path, 'rb') as input_file:
+            for digest, (position, length, subject) in old_blocks.items():
+                if digest not in new_blocks:
+                    input_file.seek(position)
+                    removed_blocks.append((subject, self.decode_block(input_file.read(length))))
+        indexes = []
+        for blocks, path, directives in [(removed_blocks, old_path, old_directives), (added_blocks, new_path, new_directives)]:
+            subjects = {subject for subject, _ in blocks}
+            #subjektin kaikkien triplejen on oltava samassa lohkossa kummassakin tiedostossa:
+            if any(not subject or old_counts.get(subject, 0) > 1 or new_counts.get(subject, 0) > 1
+                for subject in subjects):
+                return None
+            index = ConceptIndex()
+            recorder = SubjectRecorder(index)
+            read_turtle_blocks(path, directives + [block for _, block in blocks], recorder)
+            #tyhjien solmujen tunnisteet eivät säily lohkojen välillä:
+            if recorder.blank_nodes or recorder.subjects != subjects:
+                return None
+            indexes.append(index)
+        old_index, new_index = indexes
+        added = [subject for subject in new_index.subjects if subject not in old_index.subjects]
+        removed = [subject for subject in old_index.subjects if subject not in new_index.subjects]
+        changed = [subject for subject in old_index.subjects if subject in new_index.subjects and \
+            old_index.subjects[subject] != new_index.subjects[subject]]
+        logging.info("sanastossa %s lisättyjä käsitteitä %s, poistettuja %s ja muuttuneita %s"%(name,
+            len(added), len(removed), len(changed)))
+        changed_subjects = set(added + removed + changed)
+        return ({subject: properties for subject, properties in old_index.concepts() if subject in changed_subjects},
+            {subject: properties for subject, properties in new_index.concepts() if subject in changed_subjects})
+
+    def scan_blocks(self, path, known_blocks=None):
+        """
+        Lukee Turtle-tiedoston lohkot (ks. turtle_byte_blocks) ja selvittää niiden subjektit jäsentämättä lohkoja.
+        Jokaisessa lohkossa on oltava joko yksi lause tai vain etuliitemäärityksiä. Perus-URI-määrityksiä ei tueta.
+        known_blocks: edellisen version lohkot, jos palautetaan lohkot, joita siinä ei ole
+        Palauttaa etuliitemääritysten lohkot, etuliitteet avaimina ja nimiavaruudet arvoina,
+        lohkojen tiivisteet avaimina ja arvoina (sijainti, pituus, subjekti),
+        subjektit avaimina ja niiden lohkojen määrät arvoina sekä uudet lohkot listana (subjekti, lohko)
+        tai None, jos lohkoja ei voi verrata. Tyhjän solmun subjekti on tyhjä merkkijono.
+        """
+        directives = []
+        prefixes = {}
+        blocks = {}
+        subject_counts = {}
+        new_blocks = []
+        for position, block in turtle_byte_blocks(path):
+            text = self.decode_block(block)
+            #literaalit, URIt ja kommentit eivät voi päättää lausetta:
+            tokens = self.lexical_token.sub(" ", text)
+            lines = [line for line in tokens.splitlines() if line.strip()]
+            matches = [self.directive.match(line) for line in lines]
+            if any(matches):
+                #perus-URI muuttaisi suhteellisten URIen merkityksen lohkojen välillä:
+                if not all(match and match.group(1).lower().endswith("prefix") for match in matches):
+                    return None
+                for prefix, namespace in self.prefix_directive.findall(text):
+                    if ":" not in namespace or prefixes.get(prefix, namespace) != namespace:
+                        return None
+                    prefixes.update({prefix: namespace})
+                directives.append(text)
+                continue
+            statements = len(self.statement_end.findall(tokens))
+            if not statements and not lines:
+                continue
+            subject = self.get_subject(text, prefixes)
+            if statements != 1 or subject is None:
+                return None
+            digest = hashlib.sha1(block).digest()
+            blocks.update({digest: (position, len(block), subject)})
+            subject_counts[subject] = subject_counts.get(subject, 0) + 1
+            if known_blocks is not None and digest not in known_blocks:
+                new_blocks.append((subject, text))
+        return directives, prefixes, blocks, subject_counts, new_blocks
+
+    def get_subject(self, text, prefixes):
+        """
+        palauttaa lohkon ensimmäisen lauseen subjektin URIn, tyhjän solmun subjektille tyhjän merkkijonon
+        tai None, jos subjektia ei voi selvittää jäsentämättä lohkoa
+        """
+        match = self.first_term.match(text)
+        if match is None:
+            return None
+        term = match.group(1)
+        if term in ["_:", "["]:
+            return ""
+        if "\\" in term:
+            return None
+        if term.startswith("<"):
+            iri = term[1:-1]
+            if ":" in iri:
+                return iri
+            return None
+        prefix, _, local_name = term.partition(":")
+        if prefix not in prefixes or local_name.endswith("."):
+            return None
+        return prefixes[prefix] + local_name
+
+    def decode_block(self, block):
+        return block.decode('utf-8').replace("\r\n", "\n").replace("\r", "\n")
+
+    def get_differences(self, vocabularies, other_vocabularies):
+        """
+        palauttaa listan sanastojen hakutauluista ja päivittämiseen tarvittavista tauluista, jotka eroavat toisistaan
+        """
+        differences = []
+        for code in sorted(set(vocabularies.vocabularies) | set(other_vocabularies.vocabularies)):
+            if code not in vocabularies.vocabularies or code not in other_vocabularies.vocabularies:
+                differences.append(code)
+                continue
+            for table_name in CompiledVocabularies.table_names + CompiledProvenance.table_names:
+                if self.to_builtin(getattr(vocabularies.vocabularies[code], table_name)) != \
+                    self.to_builtin(getattr(other_vocabularies.vocabularies[code], table_name)):
+                    differences.append(code + "." + table_name)
+        return differences
+
+    def to_builtin(self, value):
+        """
+        muuntaa käännetyn tiedoston hakutaulut vertailua varten Pythonin sanakirjoiksi, joukoiksi ja listoiksi
+        """
+        if isinstance(value, Mapping):
+            return {key: self.to_builtin(value[key]) for key in value}
+        if isinstance(value, (set, frozenset)) or not isinstance(value, (str, list)) and value is not None:
+            return set(value)
+        return value
@@ -0,0 +1,193 @@
+import vocabulary
+import vocabularies
+import compiled_vocabularies
+from compiled_vocabularies import CompiledVocabularies, CompiledProvenance
+import hashlib
+import json
+import logging
+import os
+import shutil
+import struct
+
+class VocabularyCache():
+    """
+    Käsiteltyjen sanastojen välimuisti.
+    Sanastot tallennetaan käännettyinä tiedostoina (ks. CompiledVocabularies), jotka avataan mmap-muistikuvauksina.
+    Jokainen sukupolvi tallennetaan omaan alihakemistoonsa, jonka nimenä on sanastojen lähdetiedostojen
+    ja sanastoja käsittelevän ohjelmakoodin tiiviste. Sanastot käsitellään uudelleen vain, jos jokin
+    lähdetiedosto tai ohjelmakoodi on muuttunut.
+    Sukupolven hakemistoon tallennetaan myös kopiot lähdetiedostoista ja sanastojen päivittämiseen tarvittavat
+    taulut (ks. CompiledProvenance), jotta seuraava sukupolvi voidaan muodostaa päivittämällä edellistä
+    (ks. VocabularyBuilder.update).
+    """
+    #moduulit, joiden muuttuminen vaatii sanastojen uudelleenkäsittelyn:
+    code_modules = [vocabulary, vocabularies, compiled_vocabularies]
+    file_name = "vocabularies.bin"
+    provenance_file_name = "provenance.bin"
+    code_file_name = "code"
+    source_directory_name = "sources"
+    missing_relations_file_name = "missing_relations.json"
+
+    def __init__(self, directory="vocabulary_cache", max_generations=3, max_size=None):
+        """
+        directory: välimuistihakemisto
+        max_generations: säilytettävien sukupolvien enimmäismäärä
+        max_size: välimuistin enimmäiskoko tavuina, None jos kokoa ei rajoiteta
+        """
+        self.directory = directory
+        self.max_generations = max_generations
+        self.max_size = max_size
+
+    def get_key(self, source_files):
+        """
+        source_files: sanastokoodit avaimina ja lähdetiedostojen polut arvoina
+        Palauttaa tiivisteen, joka muuttuu, jos jonkin lähdetiedoston sisältö tai ohjelmakoodi muuttuu.
+        Jos lähdetiedostoa ei löydy, nostetaan FileNotFoundError.
+        """
+        key = hashlib.sha256(self.get_code_key().encode('utf-8'))
+        for code in sorted(source_files):
+            key.update(code.encode('utf-8') + b"\0")
+            self.update_hash(key, source_files[code])
+        return key.hexdigest()
+
+    def get_code_key(self):
+        """
+        palauttaa sanastoja käsittelevän ohjelmakoodin tiivisteen
+        """
+        key = hashlib.sha256()
+        for module in self.code_modules:
+            self.update_hash(key, module.__file__)
+        return key.hexdigest()
+
+    def update_hash(self, key, path):
+        with open(path, 'rb') as input_file:
+            for block in iter(lambda: input_file.read(1024 * 1024), b""):
+                key.update(block)
+        key.update(b"\0")
+
+    def get_path(self, key):
+        return os.path.join(self.directory, key, self.file_name)
+
+    def load(self, key):
+        """
+        palauttaa avainta vastaavan sukupolven sanastot tai None, jos sukupolvea ei ole tallennettu
+        """
+        path = self.get_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            loaded_vocabularies = CompiledVocabularies(path).get_vocabularies()
+        except (ValueError, struct.error):
+            logging.warning("Sanastojen välimuistitiedosto %s on viallinen"%path)
+            return None
+        #päivitetään käyttöaika, jotta viimeksi käytetty sukupolvi poistetaan viimeisenä:
+        os.utime(os.path.join(self.directory, key))
+        return loaded_vocabularies
+
+    def store(self, key, stored_vocabularies, source_files=None, missing_relations=None):
+        """
+        source_files: sanastokoodit avaimina ja lähdetiedostojen polut arvoina, jos lähdetiedostot tallennetaan
+        missing_relations: sanastojen Vocabularies.get_missing_relations-tarkistuksen tulos, jos se tallennetaan
+        """
+        generation_directory = os.path.join(self.directory, key)
+        if not os.path.isdir(generation_directory):
+            os.makedirs(generation_directory)
+        if source_files:
+            source_directory = os.path.join(generation_directory, self.source_directory_name)
+            if not os.path.isdir(source_directory):
+                os.makedirs(source_directory)
+            for code, source_file in source_files.items():
+                shutil.copyfile(source_file, os.path.join(source_directory, code + os.path.splitext(source_file)[1]))
+            provenance_path = os.path.join(generation_directory, self.provenance_file_name)
+            CompiledProvenance.compile(stored_vocabularies, provenance_path + ".tmp")
+            os.replace(provenance_path + ".tmp", provenance_path)
+            with open(os.path.join(generation_directory, self.code_file_name), 'w') as output:
+                output.write(self.get_code_key())
+        if missing_relations is not None:
+            with open(os.path.join(generation_directory, self.missing_relations_file_name), 'w', encoding='utf-8') as output:
+                json.dump(missing_relations, output, ensure_ascii=False)
+        path = self.get_path(key)
+        temp_path = path + ".tmp"
+        CompiledVocabularies.compile(stored_vocabularies, temp_path)
+        os.replace(temp_path, path)
+        os.utime(generation_directory)
+        self.evict(key)
+
+    def load_missing_relations(self, key):
+        """
+        palauttaa sukupolven tallennetun Vocabularies.get_missing_relations-tarkistuksen tuloksen
+        tai None, jos tulosta ei ole tallennettu
+        """
+        try:
+            with open(os.path.join(self.directory, key, self.missing_relations_file_name), encoding='utf-8') as input_file:
+                return json.load(input_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def find_previous(self):
+        """
+        Palauttaa uusimman saman ohjelmakoodin tuottaman sukupolven sanastot päivittämiseen tarvittavine tauluineen
+        ja sen lähdetiedostot sanastokoodit avaimina tai None, jos tällaista sukupolvea ei ole.
+        """
+        code_key = self.get_code_key()
+        for key, _ in self.get_generations():
+            generation_directory = os.path.join(self.directory, key)
+            source_directory = os.path.join(generation_directory, self.source_directory_name)
+            try:
+                with open(os.path.join(generation_directory, self.code_file_name)) as input_file:
+                    if input_file.read() != code_key:
+                        continue
+            except FileNotFoundError:
+                continue
+            provenance_path = os.path.join(generation_directory, self.provenance_file_name)
+            if not os.path.isfile(provenance_path):
+                continue
+            previous_vocabularies = self.load(key)
+            if previous_vocabularies and os.path.isdir(source_directory):
+                try:
+                    CompiledProvenance(provenance_path).add_tables(previous_vocabularies)
+                except (ValueError, struct.error):
+                    logging.warning("Sanastojen välimuistitiedosto %s on viallinen"%provenance_path)
+                    continue
+                source_files = {}
+                for file_name in os.listdir(source_directory):
+                    source_files.update({os.path.splitext(file_name)[0]: os.path.join(source_directory, file_name)})
+                return previous_vocabularies, source_files
+        return None
+
+    def get_generations(self):
+        """
+        palauttaa tallennetut sukupolvet listana (avain, koko tavuina), uusin ensin
+        """
+        generations = []
+        if not os.path.isdir(self.directory):
+            return generations
+        for key in os.listdir(self.directory):
+            generation_directory = os.path.join(self.directory, key)
+            if not os.path.isdir(generation_directory):
+                continue
+            size = 0
+            for directory, _, file_names in os.walk(generation_directory):
+                for file_name in file_names:
+                    size += os.path.getsize(os.path.join(directory, file_name))
+            generations.append((os.path.getmtime(generation_directory), key, size))
+        generations.sort(reverse=True)
+        return [(key, size) for _, key, size in generations]
+
+    def evict(self, current_key=None):
+        """
+        poistaa vanhimmat sukupolvet, kun sukupolvien määrä tai välimuistin koko ylittyy
+        current_key: käytössä oleva sukupolvi, jota ei poisteta
+        """
+        total_size = 0
+        count = 0
+        for key, size in self.get_generations():
+            count += 1
+            total_size += size
+            if key == current_key:
+                continue
+            if count > self.max_generations or (self.max_size is not None and total_size > self.max_size):
+                logging.info("poistetaan sanastojen välimuistista sukupolvi %s"%key)
+                shutil.rmtree(os.path.join(self.directory, key))
+                count -= 1
+                total_size -= size
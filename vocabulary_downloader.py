@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import http.client
+import json
+import logging
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+
+class VocabularyDownloader():
+    """
+    Lataa sanastotiedostot rinnakkaisissa säikeissä ehdollisilla HTTP-pyynnöillä.
+    Edellisen latauksen ETag- ja Last-Modified-arvot tallennetaan tiedostoon, ja niiden avulla
+    palvelimelta pyydetään tiedosto vain, jos se on muuttunut. Jos palvelin vastaa 304 Not Modified,
+    levyllä oleva tiedosto säilyy ennallaan, joten sanastojen välimuisti löytää sen käsitellyt sanastot
+    eikä sanastoa tarvitse jäsentää uudelleen.
+    Ladattu tiedosto kirjoitetaan ensin väliaikaistiedostoon, joka nimetään lopulliseksi vasta,
+    kun lataus on valmis. Keskeytynyt lataus ei siis korvaa edellistä tiedostoa.
+    """
+    DOWNLOADED = "ladattu"
+    NOT_MODIFIED = "ei muuttunut"
+    FAILED = "epäonnistui"
+
+    def __init__(self, data_url, directory=".", validators_file="vocabulary_downloads.json", workers=6, timeout=60):
+        """
+        data_url: sanastojen latausosoite, jonka perään lisätään sanastokoodi ja tiedostonimi
+        directory: kansio, johon sanastotiedostot tallennetaan
+        validators_file: tiedosto, johon tallennetaan latausten ETag- ja Last-Modified-arvot
+        workers: rinnakkaisten latausten enimmäismäärä
+        timeout: yksittäisen pyynnön aikakatkaisu sekunteina
+        """
+        self.data_url = data_url
+        self.directory = directory
+        self.validators_file = os.path.join(directory, validators_file)
+        self.workers = workers
+        self.timeout = timeout
+
+    def get_url(self, code, file_name):
+        return self.data_url + "/" + code + "/" + file_name
+
+    def download(self, vocabulary_files):
+        """
+        vocabulary_files: sanastokoodit avaimina ja tiedostonimet arvoina
+        Palauttaa sanastokoodit avaimina ja lataustilan (DOWNLOADED, NOT_MODIFIED tai FAILED) arvoina.
+        """
+        validators = self.load_validators()
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(vocabulary_files)))) as executor:
+            futures = {}
+            for code, file_name in vocabulary_files.items():
+                url = self.get_url(code, file_name)
+                futures.update({code: executor.submit(self.download_file, url, file_name, validators.get(url))})
+            for code, future in futures.items():
+                status, url_validators = future.result()
+                url = self.get_url(code, vocabulary_files[code])
+                if status == self.DOWNLOADED:
+                    validators.update({url: url_validators})
+                    logging.info("sanasto %s ladattu"%code)
+                elif status == self.NOT_MODIFIED:
+                    logging.info("sanasto %s ei ole muuttunut edellisestä latauksesta"%code)
+                else:
+                    logging.warning("Ei onnistuttu lataamaan sanastoa %s"%code)
+                results.update({code: status})
+        self.store_validators(validators)
+        return results
+
+    def download_file(self, url, file_name, validators=None):
+        """
+        Lataa tiedoston, jos se on muuttunut edellisestä latauksesta.
+        validators: edellisen latauksen tiedot tai None
+        Palauttaa lataustilan ja latauksen tiedot.
+        """
+        path = os.path.join(self.directory, file_name)
+        request = urllib.request.Request(url)
+        #ehtoja käytetään vain, jos levyllä on edelleen sama tiedosto kuin edellisen latauksen jälkeen:
+        if validators and self.get_file_state(path) == validators.get('file'):
+            if validators.get('etag'):
+                request.add_header("If-None-Match", validators['etag'])
+            if validators.get('last_modified'):
+                request.add_header("If-Modified-Since", validators['last_modified'])
+        temp_path = None
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                file_descriptor, temp_path = tempfile.mkstemp(prefix=file_name + ".", suffix=".tmp",
+                    dir=self.directory)
+                with os.fdopen(file_descriptor, 'wb') as out_file:
+                    shutil.copyfileobj(response, out_file)
+                    size = out_file.tell()
+                #yhteyden katketessa vastauksen lukeminen voi päättyä ilman virhettä:
+                content_length = response.headers.get("Content-Length")
+                if content_length is not None and int(content_length) != size:
+                    raise http.client.IncompleteRead(b"", int(content_length) - size)
+                os.replace(temp_path, path)
+                temp_path = None
+                return self.DOWNLOADED, {
+                    'etag': response.headers.get("ETag"),
+                    'last_modified': response.headers.get("Last-Modified"),
+                    'file': self.get_file_state(path)}
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return self.NOT_MODIFIED, validators
+            logging.warning("Sanaston lataus osoitteesta %s epäonnistui: %s"%(url, e))
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            logging.warning("Sanaston lataus osoitteesta %s epäonnistui: %s"%(url, e))
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+        return self.FAILED, None
+
+    def get_file_state(self, path):
+        """
+        palauttaa tiedoston koon ja muokkausajan tai None, jos tiedostoa ei ole
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load_validators(self):
+        try:
+            with open(self.validators_file, encoding='utf-8') as input_file:
+                return json.load(input_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def store_validators(self, validators):
+        temp_path = self.validators_file + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as output:
+            json.dump(validators, output, indent=1, sort_keys=True)
+        os.replace(temp_path, self.validators_file)
@@ -3,7 +3,7 @@ from rdflib import Graph, URIRef, Namespace, RDF
 import pymarc
 from pymarc import XmlHandler
 from xml import sax
-from pymarc import MARCReader, MARCWriter, XMLWriter, Record, Field, RawField, constants
+from pymarc import MARCWriter, XMLWriter, Record, Field, RawField, constants
 from pymarc.marc8 import marc8_to_unicode
 from pymarc.exceptions import (BaseAddressInvalid, 
                                RecordLeaderInvalid, 
@@ -13,18 +13,26 @@ from pymarc.exceptions import (BaseAddressInvalid,
                                FieldNotFound, 
                                RecordLengthInvalid) 
 from xml.sax import SAXParseException
-from vocabularies import Vocabularies
-import urllib.request
-import shutil
+from vocabularies import Vocabularies, SearchCache
+from vocabulary_cache import VocabularyCache
+from vocabulary_builder import VocabularyBuilder
+from vocabulary_downloader import VocabularyDownloader
+from record_index import RecordIndex, read_record_id
+from compressed_files import detect_compression, open_input, open_output
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from bisect import bisect_left
 import argparse
 import datetime
-import pickle
 import copy
 import os
 import logging
 import sys
 import re
 import csv
+import io
+import json
+import multiprocessing
 
 def decode_marc(self, marc, to_unicode=True, force_utf8=False,
     hide_utf8_warnings=False, utf8_handling='strict',encoding = 'iso8859-1'):
@@ -41,6 +49,11 @@ def decode_marc(self, marc, to_unicode=True, force_utf8=False,
     the scenes when you pass in a chunk of MARC data to it.
 
     """
+    """
+    patched code: keep the raw record so that unaltered fields can be written
+    back as such (see YsoConverter.splice_record)
+    """
+    self.raw_marc = marc
     # extract record leader
     self.leader = marc[0:constants.LEADER_LEN].decode('ascii')
     if len(self.leader) != constants.LEADER_LEN:
@@ -48,6 +61,7 @@ def decode_marc(self, marc, to_unicode=True, force_utf8=False,
 
     if self.leader[9] == 'a' or self.force_utf8:
         encoding = 'utf-8'
+    utf8 = self.leader[9] == 'a' or force_utf8
 
     # extract the byte offset where the record data starts
     base_address = int(marc[12:17])
@@ -83,70 +97,26 @@ def decode_marc(self, marc, to_unicode=True, force_utf8=False,
             else:
                 field = RawField(tag=entry_tag, data=entry_data)
         else:
-            subfields = list()
-            subs = entry_data.split(constants.SUBFIELD_INDICATOR.encode('ascii'))
-
-            # The MARC spec requires there to be two indicators in a
-            # field. However experience in the wild has shown that
-            # indicators are sometimes missing, and sometimes there
-            # are too many. Rather than throwing an exception because
-            # we can't find what we want and rejecting the field, or
-            # barfing on the whole record we'll try to use what we can
-            # find. This means missing indicators will be recorded as
-            # blank spaces, and any more than 2 are dropped on the floor.
-
-            first_indicator = second_indicator = ' '
-            subs[0] = subs[0].decode('ascii')
-            if len(subs[0]) == 0:
-                logging.warning("missing indicators: %s", entry_data)
-                first_indicator = second_indicator = ' '
-            elif len(subs[0]) == 1:
-                logging.warning("only 1 indicator found: %s", entry_data)
-                first_indicator = subs[0][0]
-                second_indicator = ' '
-            elif len(subs[0]) > 2:
-                logging.warning("more than 2 indicators found: %s", entry_data)
-                """
-                patched code: if subfield indicators are not found,
-                leave subfield code empty:
-                """
-                if len(subs) == 1:
-                    if len(subs[0]) > 2:
-                        subfields.append("")
-                        subfields.append(subs[0][2:])
-                first_indicator = subs[0][0]
-                second_indicator = subs[0][1]
-            else:
-                first_indicator = subs[0][0]
-                second_indicator = subs[0][1]
-
-            for subfield in subs[1:]:
-                if len(subfield) == 0:
-                    continue
-                code = subfield[0:1].decode('ascii')
-                data = subfield[1:]
-
-                if to_unicode:
-                    if self.leader[9] == 'a' or force_utf8:
-                        data = data.decode('utf-8', utf8_handling)
-                    elif encoding == 'iso8859-1':
-                        data = marc8_to_unicode(data, hide_utf8_warnings)
-                    else:
-                        data = data.decode(encoding)
-                subfields.append(code)
-                subfields.append(data)
+            field = None
             if to_unicode:
-                field = Field(
-                    tag = entry_tag,
-                    indicators = [first_indicator, second_indicator],
-                    subfields = subfields,
-                )
-            else:
-                field = RawField(
-                    tag = entry_tag,
-                    indicators = [first_indicator, second_indicator],
-                    subfields = subfields,
-                )
+                field = LazyField(entry_tag, entry_data, utf8, encoding, hide_utf8_warnings, utf8_handling)
+                if field.is_control_field():
+                    field = None
+            if field is None:
+                indicators, subfields = decode_subfields(entry_data, to_unicode, utf8, encoding,
+                    hide_utf8_warnings, utf8_handling)
+                if to_unicode:
+                    field = Field(
+                        tag = entry_tag,
+                        indicators = indicators,
+                        subfields = subfields,
+                    )
+                else:
+                    field = RawField(
+                        tag = entry_tag,
+                        indicators = indicators,
+                        subfields = subfields,
+                    )
         self.add_field(field)
         field_count += 1
 
@@ -179,9 +149,162 @@ def as_marc(self, encoding):
 # alias for backwards compatibility
 as_marc21 = as_marc
 
+def decode_subfields(entry_data, to_unicode=True, utf8=False, encoding='iso8859-1',
+    hide_utf8_warnings=False, utf8_handling='strict'):
+    """
+    Purkaa datakentän indikaattorit ja osakentät. Osa decode_marc-funktiota, jota käytetään myös
+    LazyField-kenttien purkamisessa.
+    """
+    subfields = list()
+    subs = entry_data.split(constants.SUBFIELD_INDICATOR.encode('ascii'))
+
+    # The MARC spec requires there to be two indicators in a
+    # field. However experience in the wild has shown that
+    # indicators are sometimes missing, and sometimes there
+    # are too many. Rather than throwing an exception because
+    # we can't find what we want and rejecting the field, or
+    # barfing on the whole record we'll try to use what we can
+    # find. This means missing indicators will be recorded as
+    # blank spaces, and any more than 2 are dropped on the floor.
+
+    first_indicator = second_indicator = ' '
+    subs[0] = subs[0].decode('ascii')
+    if len(subs[0]) == 0:
+        logging.warning("missing indicators: %s", entry_data)
+        first_indicator = second_indicator = ' '
+    elif len(subs[0]) == 1:
+        logging.warning("only 1 indicator found: %s", entry_data)
+        first_indicator = subs[0][0]
+        second_indicator = ' '
+    elif len(subs[0]) > 2:
+        logging.warning("more than 2 indicators found: %s", entry_data)
+        """
+        patched code: if subfield indicators are not found,
+        leave subfield code empty:
+        """
+        if len(subs) == 1:
+            if len(subs[0]) > 2:
+                subfields.append("")
+                subfields.append(subs[0][2:])
+        first_indicator = subs[0][0]
+        second_indicator = subs[0][1]
+    else:
+        first_indicator = subs[0][0]
+        second_indicator = subs[0][1]
+
+    for subfield in subs[1:]:
+        if len(subfield) == 0:
+            continue
+        code = subfield[0:1].decode('ascii')
+        data = subfield[1:]
+
+        if to_unicode:
+            data = decode_subfield_data(data, utf8, encoding, hide_utf8_warnings, utf8_handling)
+        subfields.append(code)
+        subfields.append(data)
+    return [first_indicator, second_indicator], subfields
+
+def decode_subfield_data(data, utf8=False, encoding='iso8859-1', hide_utf8_warnings=False, utf8_handling='strict'):
+    if utf8:
+        return data.decode('utf-8', utf8_handling)
+    elif encoding == 'iso8859-1':
+        return marc8_to_unicode(data, hide_utf8_warnings)
+    else:
+        return data.decode(encoding)
+
+class LazyField(Field):
+    """
+    Tietueen datakenttä, jonka indikaattorit ja osakentät puretaan vasta, kun niitä käytetään ensimmäisen kerran.
+    Purkamaton kenttä kirjoitetaan takaisin alkuperäisinä tavuina, joten konversiossa käsittelemättömät kentät
+    säilyvät muuttumattomina, eikä esim. MARC-8-merkistön muunnos muuta niitä.
+    get_subfields purkaa purkamattomasta kentästä vain haetut osakentät.
+    """
+    def __init__(self, tag, raw_data, utf8=False, encoding='iso8859-1', hide_utf8_warnings=False,
+        utf8_handling='strict'):
+        try:
+            self.tag = '%03i' % int(tag)
+        except ValueError:
+            self.tag = '%03s' % tag
+        self.raw_data = raw_data
+        self.decoding = (utf8, encoding, hide_utf8_warnings, utf8_handling)
+
+    def __getattr__(self, name):
+        #kutsutaan vain, jos attribuuttia ei ole vielä asetettu:
+        if name in ('indicators', 'subfields') and 'raw_data' in self.__dict__:
+            self.decode()
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def is_decoded(self):
+        return 'raw_data' not in self.__dict__
+
+    def decode(self):
+        if not self.is_decoded():
+            self.indicators, self.subfields = decode_subfields(self.raw_data, True, *self.decoding)
+            del self.raw_data
+
+    def get_subfields(self, *codes):
+        if self.is_decoded():
+            return Field.get_subfields(self, *codes)
+        values = []
+        for subfield in self.raw_data.split(constants.SUBFIELD_INDICATOR.encode('ascii'))[1:]:
+            if len(subfield) == 0:
+                continue
+            if subfield[0:1].decode('ascii') in codes:
+                values.append(decode_subfield_data(subfield[1:], *self.decoding))
+        return values
+
+    def as_marc(self, encoding):
+        if self.is_decoded():
+            return Field.as_marc(self, encoding)
+        return self.raw_data + constants.END_OF_FIELD.encode(encoding)
+
+def decode_fields(record):
+    """
+    Purkaa tietueen kaikki LazyField-kentät, jotta purkamisen virheet tulevat esiin heti.
+    """
+    for field in record.fields:
+        if isinstance(field, LazyField):
+            field.decode()
+
+#työprosessien konvertteri, joka periytyy pääprosessista fork-käynnistyksessä (ks. YsoConverter.convert_with_workers):
+worker_converter = None
+
+def convert_chunk(chunk):
+    return worker_converter.convert_chunk(chunk)
+
 class YsoConverter():
+    #konvertoitavat kentät ja niiden normaalilla tavalla käsiteltävät osakentät, joista tässä ei ole:
+    #- osakentät 650 e ja g jätetään käsittelemättä
+    #- kentät 358 ja 567 käsitellään eri tavalla
+    #- osakenttä 655 y käsitellään eri tavalla
+    valid_subfield_codes = {
+        '385': ['a', 'b', 'm', 'n', '0', '1', '2', '3', '5', '6', '8', '9'],
+        '567': ['a', 'b', '0', '1', '2', '5', '6', '8', '9'],
+        '648': ['a', 'v', 'x', 'y', 'z'],
+        '650': ['a', 'b', 'c', 'd', 'v', 'x', 'y', 'z'],
+        '651': ['a', 'd', 'v', 'x', 'y', 'z'],
+        '655': ['a', 'v', 'x', 'z']
+    }
+    #tietueen lukemisessa ja käsittelyssä tilastoitavat MARC21-virheet:
+    record_errors = (BaseAddressInvalid,
+                     RecordLeaderInvalid,
+                     BaseAddressNotFound,
+                     RecordDirectoryInvalid,
+                     NoFieldsFound,
+                     UnicodeDecodeError,
+                     ValueError,
+                     RecordLengthInvalid)
+    #konvertoitavien sanastojen $2-osakentät purkamattomassa MARC21-tietueessa (ks. scan_raw_record):
+    raw_vocabulary_code = re.compile(rb'\x1f2(?:ysa|allars|musa|cilla)')
+    #työprosesseille kerralla annettavien tietueiden määrä:
+    worker_chunk_size = 500
 
-    def __init__(self, input_file, input_directory, output_file, output_directory, file_format, field_links=False, all_languages=False, write_all=False):
+    def __init__(self, input_file, input_directory, output_file, output_directory, file_format, field_links=False, all_languages=False, write_all=False,
+                 cache_directory="vocabulary_cache", cache_generations=3, cache_size=None, vocabulary_workers=1,
+                 verify_vocabularies=False, prescan=False, search_cache_size=100000,
+                 block_size=0, workers=1, skip=0, limit=None, record_ids=None, save_record_index=False,
+                 checkpoint_interval=100000, resume=False, compression_level=None, background_compression=False):
         Field.as_marc = as_marc
         Record.decode_marc = decode_marc
         self.log_directory = "logs"
@@ -203,7 +326,7 @@ class YsoConverter():
             if input_directory == output_directory:
                 logging.warning("Lähdetiedoston ja kohdetiedoston tiedostopolku on sama.")
                 sys.exit(2)
-        if output_file:
+        if output_file and not resume:
             if os.path.exists(output_file):
                 while True:
                     answer = input("Kirjoitettava tiedosto on olemassa. Kirjoitetaanko päälle (K/E)?")
@@ -214,7 +337,7 @@ class YsoConverter():
         if output_directory:
             if not os.path.isdir(output_directory):
                 os.makedirs(output_directory)
-            elif os.path.isdir(output_directory):
+            elif os.path.isdir(output_directory) and not resume:
                 while True:
                     answer = input("Kirjoitettava tiedostopolku on olemassa. Kirjoitetaanko päälle (K/E)?")
                     if answer.lower() == "k":
@@ -226,6 +349,44 @@ class YsoConverter():
         self.output_file = output_file
         self.output_directory = output_directory
         self.vocabularies = Vocabularies()
+        #käsiteltyjen sanastojen välimuisti, cache_size megatavuina:
+        if cache_size is not None:
+            cache_size = cache_size * 1024 * 1024
+        self.vocabulary_cache = VocabularyCache(cache_directory, cache_generations, cache_size)
+        #sanastojen käsittelyyn käytettävien työprosessien määrä:
+        self.vocabulary_builder = VocabularyBuilder(vocabulary_workers)
+        #verrataanko edellisestä sukupolvesta päivitettyjä sanastoja kokonaan uudelleen muodostettuihin:
+        self.verify_vocabularies = verify_vocabularies
+        #käydäänkö lähdetiedostot läpi ennen konversiota käytettävien sanastojen selvittämiseksi:
+        self.prescan = prescan
+        #sanastohakujen tulosten välimuistin koko:
+        self.search_cache_size = search_cache_size
+        #tietueiden määrä, joiden sanastohaut tehdään kerralla ennen kenttien konvertointia, 0 jos hakuja ei kerätä:
+        self.block_size = block_size
+        self.record_block = []
+        #MARC21-tietueiden konversioon käytettävien työprosessien määrä, 1 jos tietueet konvertoidaan pääprosessissa:
+        self.workers = workers
+        if self.workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            logging.warning("Työprosessit eivät ole käytettävissä tässä käyttöjärjestelmässä, tietueet konvertoidaan yhdessä prosessissa")
+            self.workers = 1
+        self.executor = None
+        #ohitettavien ja konvertoitavien MARC21-tietueiden määrät kaikissa lähdetiedostoissa yhteensä, None jos ei rajattu:
+        self.skip = skip
+        self.limit = limit
+        #konvertoitavien MARC21-tietueiden 001-kenttien tunnisteet, None jos konvertoidaan kaikki:
+        self.record_ids = record_ids
+        #tallennetaanko MARC21-tiedostojen tietuehakemistot lähdetiedostojen viereen (ks. RecordIndex):
+        self.save_record_index = save_record_index
+        #kuinka monen MARC21-tietueen välein konversion tila tallennetaan tarkistuspisteeseen, 0 jos ei tallenneta:
+        self.checkpoint_interval = checkpoint_interval
+        #jatketaanko keskeytynyttä konversiota tarkistuspisteestä:
+        self.resume = resume
+        self.checkpoint_path = os.path.normpath(output_file or output_directory) + ".checkpoint"
+        self.checkpoint_state = None
+        self.checkpoint_records = 0
+        #pakattujen tulostiedostojen pakkaustaso (None pakkausmuodon oletustaso) ja pakataanko ne taustasäikeessä:
+        self.compression_level = compression_level
+        self.background_compression = background_compression
         self.file_format = file_format.lower()
         self.all_languages = False
         if all_languages:
@@ -278,8 +439,10 @@ class YsoConverter():
 
     def initialize_vocabularies(self):
         """
-        Ladataan sanastot vocabularies.pkl-väliaikaistiedostosta.
-        Jos tiedostoa ei löydy, sanastot ladataan Finto-rajapinnasta.
+        Ladataan sanastot Finto-rajapinnasta ja käsitellyt sanastot välimuistista.
+        Sanastotiedostot ladataan uudelleen vain, jos ne ovat muuttuneet edellisestä latauksesta.
+        Välimuistin sukupolvet tunnistetaan sanastotiedostojen ja ohjelmakoodin tiivisteestä,
+        joten sanastot käsitellään uudelleen vain, jos jokin sanastotiedosto on muuttunut.
         Musa-sanasto ladataan aina paikallisesta static_vocabularies-kansiosta
         (Musaan tehty pari muutosta verrattuna)
         """
@@ -307,127 +470,203 @@ class YsoConverter():
         #HUOM! Cillalla ei ole omaa tiedostoa:
         vocabulary_names = ['ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'cilla', 'seko']
         
+        #sanastot ladataan rinnakkain, ja muuttumattomat sanastot jätetään lataamatta:
+        download_results = VocabularyDownloader(self.data_url).download(vocabulary_files)
+        urllib_errors = any(status == VocabularyDownloader.FAILED for status in download_results.values())
+        if urllib_errors:
+            while True:
+                answer = input("Kaikkia sanastoja ei onnistuttu lataamaan. Haluatko käyttää mahdollisesti vanhentuneita sanastoja paikalliselta levyltä (K/E)?")
+                if answer.lower() == "k":
+                    break
+                if answer.lower() == "e":
+                    sys.exit(2)
+        #lisätään tässä vaiheessa Musa paikallisesta kansiosta:
+        musa_path = os.path.join(static_vocabulary_directory, static_vocabulary_files['musa'])
+        vocabulary_files['musa'] = musa_path
+
+        #sanastot käsitellään uudelleen vain, jos lähdetiedostot tai ohjelmakoodi ovat muuttuneet:
         vocabularies_dump_loaded = False
-        if os.path.isfile('vocabularies.pkl'):
-            timestamp = os.path.getmtime('vocabularies.pkl')
-            file_date = datetime.date.fromtimestamp(timestamp)
-            if file_date == datetime.date.today():
-                with open('vocabularies.pkl', 'rb') as input_file: 
-                    try:     
-                        self.vocabularies = pickle.load(input_file)
-                        vocabularies_dump_loaded = True
-                    except EOFError:
-                        vocabularies_dump_loaded = False    
-                for vn in vocabulary_names:
-                    if vn not in self.vocabularies.vocabularies:
-                        #jos kaikki sanastot eivät löydy dumpista, sanastot on käsiteltävä uudelleen:
-                        vocabularies_dump_loaded = False
-        if not vocabularies_dump_loaded:  
-            urllib_errors = False            
-            for vf in vocabulary_files:
-                try:
-                    with urllib.request.urlopen(self.data_url + "/" + vf + "/" + vocabulary_files[vf]) as turtle, \
-                        open(vocabulary_files[vf], 'wb') as out_file:
-                        shutil.copyfileobj(turtle, out_file)
-                except urllib.error.URLError as e:
-                    logging.warning("Ei onnistuttu lataamaan sanastoa %s"%vf)
-                    urllib_errors = True
-            if urllib_errors:
+        try:
+            cache_key = self.vocabulary_cache.get_key(vocabulary_files)
+        except FileNotFoundError:
+            cache_key = None
+        if cache_key:
+            cached_vocabularies = self.vocabulary_cache.load(cache_key)
+            if cached_vocabularies:
+                #jos kaikki sanastot eivät löydy välimuistista, sanastot on käsiteltävä uudelleen:
+                if all(vn in cached_vocabularies.vocabularies for vn in vocabulary_names):
+                    self.vocabularies = cached_vocabularies
+                    vocabularies_dump_loaded = True
+                    logging.info("sanastot ladattu välimuistista %s"%self.vocabulary_cache.get_path(cache_key))
+                    #sanastojen tarkistuksen tulos on tallennettu sukupolven mukana:
+                    missing_relations = self.vocabulary_cache.load_missing_relations(cache_key)
+                    if missing_relations:
+                        self.check_missing_relations(missing_relations)
+        if not vocabularies_dump_loaded:
+            logging.info("valmistellaan sanastot konversiokäyttöä varten")
+            #jos välimuistissa on edellinen sukupolvi, päivitetään se muuttuneiden sanastotiedostojen osalta:
+            previous_generation = self.vocabulary_cache.find_previous()
+            try:
+                if previous_generation:
+                    previous_vocabularies, previous_files = previous_generation
+                    self.vocabularies = self.vocabulary_builder.update(previous_vocabularies, previous_files,
+                        vocabulary_files, self.verify_vocabularies)
+                else:
+                    self.vocabularies = self.vocabulary_builder.build(vocabulary_files)
+            except FileNotFoundError as e:
+                logging.error("Tiedostoa %s ei löytynyt levyltä. "
+                    "Tiedoston automaattinen lataaminen ei ole onnistunut tai tiedosto on poistettu. "
+                    "Siirrä sanastotiedosto ohjelman kansioon tai"
+                    "käy hakemassa kaikki tarvittavat sanastot 'ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'cilla', 'seko' "
+                    "ja tallenna ne ohjelman kansioon"
+                    "osoitteesta finto.fi ttl-tiedostomuodossa"%e.filename)
+                sys.exit(2)
+
+            source_vocabularies = ['ysa', 'allars', 'musa', 'cilla']
+            target_vocabularies = ['yso', 'yso-paikat']
+            missing_relations = self.vocabularies.get_missing_relations(source_vocabularies, target_vocabularies)
+            faulty_vocabularies = self.check_missing_relations(missing_relations)
+            #välimuistiin tallennetaan niiden tiedostojen kopiot, joista sanastot on muodostettu:
+            stored_files = dict(vocabulary_files)
+            if faulty_vocabularies:      
+                logging.warning("Korvataan puutteelliset sanastot vuoden 2019 static-alkuisilla sanastoilla" )
                 while True:
-                    answer = input("Kaikkia sanastoja ei onnistuttu lataamaan. Haluatko käyttää mahdollisesti vanhentuneita sanastoja paikalliselta levyltä (K/E)?")
-                    if answer.lower() == "k":
+                    answer = input("1. Jatka ohjelman suoritusta tämän päivän sanastoilla vai 2. Suorita konversio työhakemiston vanhoilla static-alkuisilla sanastoilla (1/2)?")
+                    if answer.lower() == "1":
                         break
-                    if answer.lower() == "e":
-                        sys.exit(2)
-            graphs = {}  
-            #lisätään tässä vaiheessa Musa paikallisesta kansiosta:
-            musa_path = os.path.join(static_vocabulary_directory, static_vocabulary_files['musa'])
-            vocabulary_files['musa'] = musa_path
-            for vf in vocabulary_files:
-                g = Graph()
-                graphs.update({vf: g})
-                try:
-                    logging.info("parsitaan sanastoa %s"%vf)
-                    g.parse(vocabulary_files[vf], format='ttl')     
-                except FileNotFoundError:
-                    logging.error("Tiedostoa %s ei löytynyt levyltä. "
-                        "Tiedoston automaattinen lataaminen ei ole onnistunut tai tiedosto on poistettu. "
-                        "Siirrä sanastotiedosto ohjelman kansioon tai"
-                        "käy hakemassa kaikki tarvittavat sanastot 'ysa', 'yso', 'yso-paikat', 'allars', 'slm', 'musa', 'cilla', 'seko' "
-                        "ja tallenna ne ohjelman kansioon"
-                        "osoitteesta finto.fi ttl-tiedostomuodossa"%vocabulary_files[vf])
-                    sys.exit(2)
-            logging.info("valmistellaan sanastot konversiokäyttöä varten")
-            
-            for vocabulary_name in vocabulary_names:
-                self.vocabularies.parse_vocabulary(vocabulary_name, graphs)
-
-            missing_relations = self.vocabularies.get_missing_relations(['ysa', 'allars', 'musa', 'cilla'], ['yso', 'yso-paikat'])
-            if any(len(mr) > 0 for mr in missing_relations):
-                faulty_vocabularies = []
-                for voc in missing_relations[0]:
-                    fault_number =  len(missing_relations[0][voc]) / len(self.vocabularies.vocabularies[voc].labels)
-                    if fault_number > 0.05:
-                        logging.warning('Sanaston %s käsitteistä puuttuu vastineita YSOsta: '%voc + '{:.1%}'.format(fault_number))
-                        faulty_vocabularies.append(voc)
-                if any(len(voc) > 0 for voc in missing_relations[1]):
-                    faulty_vocabularies.extend(['yso', 'yso-paikat'])
-                    logging.warning("YSO- tai YSO-paikoista ei löydy vastinetta kaikille konvertoitaville käsitteille")
-                    logging.warning("Viallisten YSO-käsitteiden lista on luettavissa tiedostossa %s"%self.missing_uris_log)
-                    with open(self.missing_uris_log, 'w', encoding='utf-8') as output:
-                        for voc in missing_relations[1]:
-                            if len( missing_relations[1][voc]) > 0:
-                                output.write("Näillä sanaston %s linkeillä ei ole vastinetta YSOssa:\n"%voc)
-                                for label in missing_relations[1][voc]:
-                                    output.write(label + " " + missing_relations[1][voc][label] + "\n")
-                        output.close()
-                if faulty_vocabularies:      
-                    logging.warning("Korvataan puutteelliset sanastot vuoden 2019 static-alkuisilla sanastoilla" )
-                    while True:
-                        answer = input("1. Jatka ohjelman suoritusta tämän päivän sanastoilla vai 2. Suorita konversio työhakemiston vanhoilla static-alkuisilla sanastoilla (1/2)?")
-                        if answer.lower() == "1":
-                            break
-                        if answer.lower() == "2":
-                            for fv in faulty_vocabularies:
-                                g = Graph()
-                                graphs.update({fv: g})
-                                try:
-                                    logging.info("parsitaan uudestaan sanastoa %s"%fv)
-                                    path = os.path.join(static_vocabulary_directory, static_vocabulary_files[fv])
-                                    g.parse(path, format='ttl')
-                                except FileNotFoundError:
-                                    logging.error("Tiedostoa %s ei löytynyt levyltä. "
-                                        "Korvaavan tiedoston lataaminen ei ole onnistunut tai tiedosto on poistettu. "
-                                        "Hae static-alkuinen tiedosto projektin GitHub-repositoriosta "
-                                        "ja tallenna ne ohjelman kansioon")
-                                    sys.exit(2)
-
-                            for fv in faulty_vocabularies:
-                                self.vocabularies.parse_vocabulary(fv, graphs)
-                            break
-            with open('vocabularies.pkl', 'wb') as output:  # Overwrites any existing file.
-                pickle.dump(self.vocabularies, output, pickle.HIGHEST_PROTOCOL)
-            logging.info("sanastot tallennettu muistiin ja tiedostoon vocabularies.pkl")
-            output.close()  
+                    if answer.lower() == "2":
+                        static_files = {}
+                        for fv in faulty_vocabularies:
+                            logging.info("parsitaan uudestaan sanastoa %s"%fv)
+                            path = os.path.join(static_vocabulary_directory, static_vocabulary_files[fv])
+                            static_files.update({fv: path})
+                        try:
+                            static_vocabularies = self.vocabulary_builder.build(static_files)
+                        except FileNotFoundError:
+                            logging.error("Tiedostoa %s ei löytynyt levyltä. "
+                                "Korvaavan tiedoston lataaminen ei ole onnistunut tai tiedosto on poistettu. "
+                                "Hae static-alkuinen tiedosto projektin GitHub-repositoriosta "
+                                "ja tallenna ne ohjelman kansioon")
+                            sys.exit(2)
+                        self.vocabularies.vocabularies.update(static_vocabularies.vocabularies)
+                        stored_files.update(static_files)
+                        #välimuistiin tallennetaan korvattujen sanastojen tarkistuksen tulos:
+                        missing_relations = self.vocabularies.get_missing_relations(source_vocabularies, target_vocabularies)
+                        break
+            #sukupolvi tallennetaan ladattujen tiedostojen tiivisteellä myös, jos sanastoja on korvattu static-alkuisilla,
+            #jotta seuraava ajokerta lataa sen välimuistista eikä kysy korvaamisesta uudelleen:
+            cache_key = self.vocabulary_cache.get_key(vocabulary_files)
+            self.vocabulary_cache.store(cache_key, self.vocabularies, stored_files, missing_relations)
+            #käytetään käännettyjä sanastoja, jotta ensimmäinen ja myöhemmät ajokerrat toimivat samoin:
+            self.vocabularies = self.vocabulary_cache.load(cache_key)
+            logging.info("sanastot tallennettu välimuistiin %s"%self.vocabulary_cache.get_path(cache_key))
+        self.vocabularies.search_cache = SearchCache(self.search_cache_size)
+        #välimuistista luetut sanastot ladataan vasta käytettäessä, ellei niitä ladata etukäteen:
+        if self.prescan:
+            source_codes = self.scan_vocabulary_codes()
+            required_vocabularies = self.get_required_vocabularies(source_codes)
+            logging.info("lähdetiedostojen sanastokoodit: %s, ladataan sanastot: %s"%(
+                ", ".join(sorted(source_codes)), ", ".join(required_vocabularies)))
+            self.vocabularies.load_vocabularies(required_vocabularies)
+
+    def check_missing_relations(self, missing_relations):
+        """
+        Raportoi Vocabularies.get_missing_relations-tarkistuksen tuloksen
+        ja palauttaa listan puutteellisista sanastoista.
+        """
+        faulty_vocabularies = []
+        if any(len(mr) > 0 for mr in missing_relations):
+            for voc in missing_relations[0]:
+                fault_number =  len(missing_relations[0][voc]) / len(self.vocabularies.vocabularies[voc].labels)
+                if fault_number > 0.05:
+                    logging.warning('Sanaston %s käsitteistä puuttuu vastineita YSOsta: '%voc + '{:.1%}'.format(fault_number))
+                    faulty_vocabularies.append(voc)
+            if any(len(voc) > 0 for voc in missing_relations[1]):
+                faulty_vocabularies.extend(['yso', 'yso-paikat'])
+                logging.warning("YSO- tai YSO-paikoista ei löydy vastinetta kaikille konvertoitaville käsitteille")
+                logging.warning("Viallisten YSO-käsitteiden lista on luettavissa tiedostossa %s"%self.missing_uris_log)
+                with open(self.missing_uris_log, 'w', encoding='utf-8') as output:
+                    for voc in missing_relations[1]:
+                        if len( missing_relations[1][voc]) > 0:
+                            output.write("Näillä sanaston %s linkeillä ei ole vastinetta YSOssa:\n"%voc)
+                            for label in missing_relations[1][voc]:
+                                output.write(label + " " + missing_relations[1][voc][label] + "\n")
+                    output.close()
+        return faulty_vocabularies
+
+    def get_input_files(self):
+        """
+        palauttaa input-hakemiston tiedostot lukuun ottamatta tallennettuja tietuehakemistoja
+        """
+        return [i_file for i_file in os.listdir(self.input_directory) if not i_file.endswith(RecordIndex.suffix)]
+
+    def get_input_paths(self):
+        if self.input_directory:
+            return [os.path.join(self.input_directory, i_file) for i_file in self.get_input_files()]
+        return [self.input_file]
+
+    def scan_vocabulary_codes(self):
+        """
+        Etsii lähdetiedostoista konvertoitavien sanastojen $2-osakenttien sanastokoodit
+        jäsentämättä tietueita ja palauttaa löytyneet sanastokoodit joukkona.
+        """
+        source_codes = ['ysa', 'allars', 'musa', 'cilla']
+        if self.file_format == "marcxml":
+            pattern = re.compile(rb'code=["\']2["\']\s*>\s*(' + "|".join(source_codes).encode('ascii') + rb')\s*<')
+        else:
+            pattern = re.compile(rb'\x1f2(' + "|".join(source_codes).encode('ascii') + rb')(?=[\x1d\x1e\x1f])')
+        found_codes = set()
+        overlap = 64
+        for input_path in self.get_input_paths():
+            with open_input(input_path) as input_file:
+                previous = b""
+                for block in iter(lambda: input_file.read(1024 * 1024), b""):
+                    data = previous + block
+                    for match in pattern.finditer(data):
+                        found_codes.add(match.group(1).decode('ascii'))
+                    if len(found_codes) == len(source_codes):
+                        return found_codes
+                    #osuma voi jakautua kahteen lohkoon:
+                    previous = data[-overlap:]
+        return found_codes
+
+    def get_required_vocabularies(self, source_codes):
+        """
+        palauttaa niiden sanastojen koodit, joita lähdetiedostojen sanastokoodien konversiossa tarvitaan
+        source_codes: lähdetiedostoissa esiintyvät konvertoitavien sanastojen koodit
+        """
+        required_vocabularies = []
+        if source_codes:
+            required_vocabularies = ['ysa', 'allars', 'yso', 'yso-paikat', 'slm', 'seko']
+        if 'musa' in source_codes or 'cilla' in source_codes:
+            required_vocabularies += ['musa', 'cilla']
+        return required_vocabularies
    
     def read_records(self):
-        with open(self.removed_fields_log, 'w', newline='', encoding = 'utf-8-sig') as rf_handler, \
-            open(self.new_fields_log, 'w', newline='', encoding = 'utf-8-sig') as nf_handler, \
-            open(self.error_log, 'w', newline='', encoding='utf-8-sig') as error_handler, \
-            open(self.remaining_log , 'w', newline='', encoding='utf-8-sig') as r_handler:
+        checkpoint = None
+        if self.resume:
+            checkpoint = self.read_checkpoint()
+        with self.open_log(self.removed_fields_log, checkpoint) as rf_handler, \
+            self.open_log(self.new_fields_log, checkpoint) as nf_handler, \
+            self.open_log(self.error_log, checkpoint) as error_handler, \
+            self.open_log(self.remaining_log, checkpoint) as r_handler:
             
             self.rf_writer = csv.writer(rf_handler, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
             self.nf_writer = csv.writer(nf_handler, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
             self.error_writer = csv.writer(error_handler, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
             self.remaining_writer = csv.writer(r_handler, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            #työprosessien lokirivit kirjoitetaan suoraan tiedostoihin samassa järjestyksessä kuin lokikirjoittimet:
+            self.log_handlers = [rf_handler, nf_handler, error_handler, r_handler]
 
             input_files = []
             o_directory = ""
             i_directory = ""
             if self.input_directory:
-                input_files = os.listdir(self.input_directory)          
+                input_files = self.get_input_files()
             elif self.input_file:
                 input_files.append(self.input_file)    
+            if checkpoint:
+                input_files = checkpoint['input_files']
            
             if self.file_format == "marcxml":
                 if self.output_file:
@@ -443,18 +682,25 @@ class YsoConverter():
                     else:
                         input_path = i_file
                     try:
-                        pymarc.map_xml(self.read_and_write_record, input_path)
+                        with open_input(input_path) as input_handler:
+                            pymarc.map_xml(self.add_to_block, input_handler)
                     except SAXParseException as e:
                         logging.warning("XML-rakenne viallinen")
                         logging.warning(e)
+                    self.process_block()
                     if not self.output_directory and self.input_directory:
                         continue
                 if not self.output_directory:
                     self.writer.close()
             if self.file_format == "marc21":
                 if not self.output_directory and self.input_directory:
-                    self.open_writer(MARCWriter, self.output_file)
-                for i_file in input_files:
+                    self.open_writer(MARCWriter, self.output_file, self.get_output_position(checkpoint, self.output_file))
+                self.records_to_skip = self.skip
+                self.records_left = self.limit
+                for file_number, i_file in enumerate(input_files):
+                    #tarkistuspistettä edeltävät tiedostot on jo konvertoitu:
+                    if checkpoint and file_number < checkpoint['file']:
+                        continue
                     if self.output_directory:
                         self.output_file = i_file
                         self.output_path = os.path.join(self.output_directory, self.output_file)
@@ -467,38 +713,25 @@ class YsoConverter():
                     if not self.output_directory and self.input_directory:
                         pass
                     else:
-                        self.open_writer(MARCWriter, self.output_path)
-                    try:
-                        reader = MARCReader(open(input_path, 'rb'), to_unicode=True)
-                    except TypeError as e:
-                        logging.error("Tiedosto %s ei ole MARC21-muodossa"%input_path)
-                        sys.exit(2)
-                    record = Record()
-                    while record:                
-                        try:
-                            record = next(reader, None)
-                            if record:
-                                self.read_and_write_record(record)
-                        except (BaseAddressInvalid, 
-                                RecordLeaderInvalid, 
-                                BaseAddressNotFound, 
-                                RecordDirectoryInvalid,
-                                NoFieldsFound, 
-                                UnicodeDecodeError,
-                                ValueError,
-                                RecordLengthInvalid) as e:
-                            if e.__class__.__name__ in self.statistics["virheluokkia"]:
-                                self.statistics["virheluokkia"][e.__class__.__name__] += 1
-                            else:
-                                self.statistics["virheluokkia"].update({e.__class__.__name__: 1})
-                            self.statistics['MARC21-virheitä'] += 1
-                    reader.close()
+                        self.open_writer(MARCWriter, self.output_path, self.get_output_position(checkpoint, self.output_path))
+                    if checkpoint:
+                        self.records_to_skip = checkpoint['records_to_skip']
+                        self.records_left = checkpoint['records_left']
+                    if detect_compression(input_path):
+                        self.checkpoint_state = {'input_files': input_files, 'file': file_number, 'last': None}
+                        self.convert_compressed_records(input_path, checkpoint)
+                    else:
+                        self.convert_indexed_records(input_path, checkpoint, input_files, file_number)
+                    checkpoint = None
                     
                     if not self.output_directory and self.input_directory:
                         continue
                     self.writer.close()
                 if not self.output_directory and self.input_directory:
                     self.writer.close()
+                if self.executor:
+                    self.executor.shutdown()
+                    self.executor = None
               
         rf_handler.close()
         nf_handler.close()
@@ -516,16 +749,480 @@ class YsoConverter():
                         result_handler.write("Virhetyyppi: %s, määrä: %s  \n"%(e, self.statistics[stat][e]))
                 else:
                     result_handler.write("%s: %s \n"%(stat, self.statistics[stat]))
+            result_handler.write("Hakuvälimuisti: \n")
+            search_statistics = self.vocabularies.search_cache.get_statistics()
+            for stat in search_statistics:
+                result_handler.write("%s: %s \n"%(stat, search_statistics[stat]))
         result_handler.close()
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+        logging.info("konversiossa käytetyt sanastot: %s"%", ".join(self.vocabularies.get_loaded_vocabularies()))
         logging.info("konversio tehty")
 
+    def open_log(self, path, checkpoint=None):
+        """
+        Avaa CSV-lokitiedoston kirjoitettavaksi. Tarkistuspisteestä jatkettaessa tiedosto katkaistaan
+        tarkistuspisteen kohtaan ja sitä jatketaan.
+        """
+        if checkpoint:
+            os.truncate(path, checkpoint['logs'][path])
+            return open(path, 'a', newline='', encoding='utf-8-sig')
+        return open(path, 'w', newline='', encoding='utf-8-sig')
+
+    def get_output_position(self, checkpoint, path):
+        """
+        palauttaa tulostiedoston kohdan, johon tarkistuspisteen tulostiedosto katkaistaan, tai None, jos tiedosto kirjoitetaan alusta
+        """
+        if checkpoint and checkpoint['output_path'] == path:
+            return checkpoint['output_position']
+        return None
+
+    def count_checkpoint_records(self, records, offset, counters=None):
+        """
+        Laskee edellisen tarkistuspisteen jälkeen konvertoidut tietueet ja tallentaa tarkistuspisteen checkpoint_interval tietueen välein.
+        records: konvertoitujen tietueiden määrä
+        offset: seuraavaksi konvertoitavan tietueen alkukohta lähdetiedostossa
+        counters: vielä ohitettavien ja konvertoitavien tietueiden määrät kohdassa offset, None jos ne ovat nykyiset
+        """
+        if not self.checkpoint_interval:
+            return
+        self.checkpoint_records += records
+        if self.checkpoint_records >= self.checkpoint_interval:
+            self.process_block()
+            self.write_checkpoint(offset, counters)
+            self.checkpoint_records = 0
+
+    def write_checkpoint(self, offset, counters=None):
+        """
+        Tallentaa konversion tilan, josta keskeytynyttä konversiota voidaan jatkaa --resume-parametrilla:
+        lähdetiedosto ja sen kohta, tulostiedoston ja lokitiedostojen kohdat sekä tilastot.
+        Tiedostot kirjoitetaan levylle ennen tarkistuspistettä, ja tarkistuspiste korvataan kokonaisena,
+        joten tallennettu tarkistuspiste on aina yhtenäinen.
+        offset: seuraavaksi konvertoitavan tietueen alkukohta lähdetiedostossa
+        """
+        if counters is None:
+            counters = (self.records_to_skip, self.records_left)
+        output_handler = self.writer.file_handle
+        for handler in [output_handler] + self.log_handlers:
+            handler.flush()
+            os.fsync(handler.fileno())
+        checkpoint = dict(self.checkpoint_state)
+        checkpoint.update({
+            'inputs': {input_path: os.path.getsize(input_path) for input_path in self.get_input_paths()},
+            'offset': offset,
+            'records_to_skip': counters[0],
+            'records_left': counters[1],
+            'output_path': output_handler.name,
+            'output_position': output_handler.tell(),
+            #lokitiedostojen kohdat tiedostonimen mukaan tiedostojen katkaisemista varten:
+            'logs': {handler.name: handler.tell() for handler in self.log_handlers},
+            'log_names': {
+                'removed_fields': self.removed_fields_log,
+                'new_fields': self.new_fields_log,
+                'error': self.error_log,
+                'remaining': self.remaining_log
+            },
+            'results_log': self.results_log,
+            'statistics': self.statistics,
+            'search_statistics': self.vocabularies.search_cache.get_statistics()
+        })
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file, ensure_ascii=False)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def read_checkpoint(self):
+        """
+        Lukee tarkistuspisteen ja palauttaa sen tai None, jos tarkistuspistettä ei ole.
+        Lokitiedostojen nimet, tilastot ja hakujen välimuistin tilastot palautetaan tarkistuspisteestä.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            logging.warning("Tarkistuspistettä %s ei löytynyt, konversio aloitetaan alusta"%self.checkpoint_path)
+            return None
+        with open(self.checkpoint_path, encoding='utf-8') as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['inputs'] != {input_path: os.path.getsize(input_path) for input_path in self.get_input_paths()}:
+            logging.error("Lähdetiedostot ovat muuttuneet tarkistuspisteen %s tallentamisen jälkeen"%self.checkpoint_path)
+            sys.exit(2)
+        log_names = checkpoint['log_names']
+        self.removed_fields_log = log_names['removed_fields']
+        self.new_fields_log = log_names['new_fields']
+        self.error_log = log_names['error']
+        self.remaining_log = log_names['remaining']
+        self.results_log = checkpoint['results_log']
+        self.statistics = checkpoint['statistics']
+        search_cache = self.vocabularies.search_cache
+        search_cache.hits = checkpoint['search_statistics']["osumia"]
+        search_cache.misses = checkpoint['search_statistics']["ohituksia"]
+        search_cache.evictions = checkpoint['search_statistics']["poistettuja"]
+        logging.info("jatketaan konversiota tarkistuspisteestä %s"%self.checkpoint_path)
+        return checkpoint
+
+    def add_record_error(self, e):
+        if e.__class__.__name__ in self.statistics["virheluokkia"]:
+            self.statistics["virheluokkia"][e.__class__.__name__] += 1
+        else:
+            self.statistics["virheluokkia"].update({e.__class__.__name__: 1})
+        self.statistics['MARC21-virheitä'] += 1
+
+    def add_to_block(self, record):
+        """
+        Lisää tietueen käsiteltävään lohkoon ja käsittelee lohkon, kun siinä on block_size tietuetta.
+        Jos lohkoja ei käytetä, tietue käsitellään heti.
+        """
+        if self.block_size <= 0:
+            self.convert_record(record)
+            return
+        self.record_block.append(record)
+        if len(self.record_block) >= self.block_size:
+            self.process_block()
+
+    def process_block(self):
+        """
+        Hakee lohkon tietueiden sanastohaut kerralla hakujen välimuistiin ja konvertoi sitten tietueet.
+        Hakujen tulokset säilyvät vain välimuistissa, joten ilman välimuistia hakuja ei kerätä.
+        """
+        records = self.record_block
+        self.record_block = []
+        if records and self.search_cache_size > 0:
+            searches = []
+            for record in records:
+                if not isinstance(record, bytes):
+                    #kenttien purkamisen virheet tilastoidaan tietueen konversiossa:
+                    try:
+                        searches.extend(self.get_record_searches(record))
+                    except self.record_errors:
+                        pass
+            self.vocabularies.search_many(searches)
+        for record in records:
+            self.convert_record(record)
+
+    def convert_record(self, record):
+        """
+        Konvertoi tietueen ja tilastoi sen MARC21-virheet, jotta virheellinen tietue ei keskeytä konversiota.
+        """
+        try:
+            self.read_and_write_record(record)
+        except self.record_errors as e:
+            self.add_record_error(e)
+
+    def get_record_range(self, record_count):
+        """
+        Palauttaa lähdetiedoston konvertoitavien tietueiden järjestysnumeroiden välin skip- ja limit-parametrien mukaan.
+        Parametrit koskevat kaikkia lähdetiedostoja yhdessä, joten vielä ohitettavien ja konvertoitavien
+        tietueiden määriä vähennetään tiedosto kerrallaan.
+        record_count: lähdetiedoston tietueiden määrä
+        """
+        first = min(self.records_to_skip, record_count)
+        self.records_to_skip -= first
+        last = record_count
+        if self.records_left is not None:
+            last = min(first + self.records_left, record_count)
+            self.records_left -= last - first
+        return first, last
+
+    def select_records(self, records):
+        """
+        Rajaa tietueet skip-, limit- ja record_ids-parametrien mukaan tietueita luettaessa,
+        kun tietueiden määrää ei tiedetä etukäteen (ks. convert_compressed_records).
+        """
+        record_ids = None
+        if self.record_ids:
+            record_ids = set(record_id.encode('utf-8') for record_id in self.record_ids)
+        for raw_record in records:
+            if self.records_left == 0:
+                return
+            if self.records_to_skip:
+                self.records_to_skip -= 1
+                continue
+            if self.records_left is not None:
+                self.records_left -= 1
+            if record_ids is not None:
+                if raw_record is None or read_record_id(raw_record, 0, len(raw_record)) not in record_ids:
+                    continue
+            yield raw_record
+
+    def convert_indexed_records(self, input_path, checkpoint, input_files, file_number):
+        """
+        Konvertoi pakkaamattoman MARC21-tiedoston tietueet tietueiden sijaintihakemiston avulla (ks. RecordIndex).
+        """
+        record_index = RecordIndex(input_path, self.save_record_index)
+        if checkpoint:
+            first = bisect_left(record_index.offsets, checkpoint['offset'])
+            last = checkpoint['last']
+        else:
+            first, last = self.get_record_range(len(record_index))
+        self.checkpoint_state = {'input_files': input_files, 'file': file_number, 'last': last}
+        if self.workers > 1 and not self.record_ids:
+            with open(input_path, 'rb') as input_handler:
+                self.convert_with_workers(input_handler,
+                    record_index.get_ranges(first, last, self.worker_chunk_size))
+        else:
+            positions = range(first, last)
+            if self.record_ids:
+                positions = record_index.find(self.record_ids, first, last)
+            for position in positions:
+                self.convert_raw_record(record_index.get_record(position))
+                self.count_checkpoint_records(1, record_index.offsets[position + 1])
+            self.process_block()
+        record_index.close()
+
+    def convert_compressed_records(self, input_path, checkpoint=None):
+        """
+        Konvertoi pakatun MARC21-tiedoston tietueet purkamalla tiedostoa virtana. Tiedoston kohdat ovat puretun
+        tiedoston kohtia, joten tarkistuspisteestä jatkettaessa tiedostoa puretaan tarkistuspisteen kohtaan asti.
+        Työprosesseille tietueet luetaan pääprosessissa, koska pakattua tiedostoa ei voi lukea tavualueittain.
+        """
+        with open_input(input_path) as input_handler:
+            if checkpoint:
+                input_handler.seek(checkpoint['offset'])
+            records = self.select_records(self.read_raw_records(input_handler))
+            if self.workers > 1:
+                self.convert_with_workers(input_handler, records=records)
+            else:
+                for raw_record in records:
+                    self.convert_raw_record(raw_record)
+                    self.count_checkpoint_records(1, input_handler.tell())
+                self.process_block()
+
+    def read_record_range(self, input_path, start, end):
+        """
+        Lukee tiedostosta tietueiden välin, jonka alku- ja loppukohta ovat tietueiden rajoilla (ks. RecordIndex.get_ranges).
+        """
+        with open(input_path, 'rb') as input_handler:
+            input_handler.seek(start)
+            return list(self.read_raw_records(io.BytesIO(input_handler.read(end - start))))
+
+    def read_raw_records(self, input_handler):
+        """
+        Jakaa MARC21-tiedoston tietueiksi tietueen nimiöön merkityn pituuden mukaan kuten MARCReader
+        purkamatta tietueita. Palauttaa tietueiden tavujonot tai None, jos tietueen pituus on virheellinen.
+        """
+        while True:
+            first5 = input_handler.read(5)
+            if not first5:
+                return
+            if len(first5) < 5:
+                yield None
+                continue
+            try:
+                length = int(first5)
+            except ValueError:
+                yield None
+                continue
+            yield first5 + input_handler.read(length - 5)
+
+    def scan_raw_record(self, raw_record):
+        """
+        Tarkistaa purkamattoman MARC21-tietueen nimiöstä ja hakemistosta, onko tietueessa konvertoitavaa.
+        Tietue on purettava, jos siinä on konvertoitavan sanaston $2-osakenttä missä tahansa kentässä
+        (muiden kenttien sanastokoodit kirjataan lokiin), jos siinä on 567-kenttä tai jos sen rakennetta
+        ei voida tulkita, jolloin virhe tilastoidaan purettaessa.
+        Palauttaa None, jos tietue on purettava, ja muuten niiden konvertoitavien kenttien määrän,
+        jotka process_record-metodi olisi tarkistanut.
+        """
+        try:
+            leader = raw_record[:constants.LEADER_LEN].decode('ascii')
+            base_address = int(raw_record[12:17])
+            directory = raw_record[constants.LEADER_LEN:base_address - 1].decode('ascii')
+        except (UnicodeDecodeError, ValueError):
+            return None
+        if len(leader) != constants.LEADER_LEN or base_address <= 0 or base_address >= len(raw_record):
+            return None
+        if not directory or len(directory) % constants.DIRECTORY_ENTRY_LEN != 0:
+            return None
+        if self.raw_vocabulary_code.search(raw_record):
+            return None
+        #MARC-8-merkistön vaihtosekvenssit voivat muuttaa sanastokoodin tavuja:
+        if leader[9] != 'a' and b'\x1b' in raw_record:
+            return None
+        tags = []
+        for entry_start in range(0, len(directory), constants.DIRECTORY_ENTRY_LEN):
+            entry = directory[entry_start:entry_start + constants.DIRECTORY_ENTRY_LEN]
+            try:
+                int(entry[3:7])
+                int(entry[7:12])
+            except ValueError:
+                return None
+            tags.append(entry[0:3])
+        if leader[5] == "d":
+            return 0
+        if '567' in tags:
+            return None
+        return sum(1 for tag in tags if tag in self.valid_subfield_codes)
+
+    def convert_raw_record(self, raw_record):
+        """
+        Konvertoi read_raw_records-metodin palauttaman tietueen. Tietueet, joissa ei ole konvertoitavaa,
+        käsitellään purkamatta, ja ne kirjoitetaan write_all-parametrilla sellaisenaan.
+        """
+        try:
+            if raw_record is None:
+                raise RecordLengthInvalid
+            checked_fields = self.scan_raw_record(raw_record)
+            if checked_fields is None:
+                self.add_to_block(Record(raw_record, to_unicode=True))
+            else:
+                self.statistics["kaikki tarkistetut kentät"] += checked_fields
+                self.add_to_block(raw_record)
+        except self.record_errors as e:
+            self.add_record_error(e)
+
+    def convert_with_workers(self, input_handler, record_ranges=None, records=None):
+        """
+        Konvertoi MARC21-tiedoston tietueet työprosesseissa worker_chunk_size tietueen erissä.
+        Työprosessit periytyvät pääprosessista, joten ne käyttävät samoja käännettyjä sanastoja.
+        Erien tietueet, lokirivit ja tilastot kirjoitetaan pääprosessissa alkuperäisessä järjestyksessä,
+        ja keskeneräisten erien määrä on rajoitettu, jotta koko tiedostoa ei lueta muistiin.
+        record_ranges: RecordIndex.get_ranges-metodin palauttamat tiedoston tavualueet, jotka työprosessit
+        lukevat itse, tai None, jos tietueet luetaan pääprosessissa
+        records: pääprosessissa luettavat tietueet, None jos kaikki tiedoston tietueet
+        """
+        global worker_converter
+        if self.executor is None:
+            worker_converter = self
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'))
+        pending = deque()
+        if record_ranges is not None:
+            #erän kirjoittamisen jälkeen tarkistuspisteeseen tallennetaan erän loppukohta:
+            ends = deque()
+            for start, end in record_ranges:
+                pending.append(self.executor.submit(convert_chunk, (input_handler.name, start, end)))
+                ends.append(end)
+                if len(pending) >= 2 * self.workers:
+                    self.write_chunk(pending.popleft().result())
+                    self.count_checkpoint_records(self.worker_chunk_size, ends.popleft())
+            while pending:
+                self.write_chunk(pending.popleft().result())
+                self.count_checkpoint_records(self.worker_chunk_size, ends.popleft())
+        else:
+            if records is None:
+                records = self.read_raw_records(input_handler)
+            #tietueita luetaan erien kirjoittamista edellä, joten tarkistuspisteeseen tallennetaan erän
+            #loppukohta ja rajauksen laskurit sellaisina kuin ne olivat erän viimeisen tietueen jälkeen:
+            positions = deque()
+            chunk = []
+            for raw_record in records:
+                chunk.append(raw_record)
+                if len(chunk) >= self.worker_chunk_size:
+                    pending.append(self.executor.submit(convert_chunk, chunk))
+                    positions.append(self.get_chunk_position(input_handler))
+                    chunk = []
+                    if len(pending) >= 2 * self.workers:
+                        self.write_chunk(pending.popleft().result())
+                        self.count_chunk_records(positions.popleft())
+            if chunk:
+                pending.append(self.executor.submit(convert_chunk, chunk))
+                positions.append(self.get_chunk_position(input_handler))
+            while pending:
+                self.write_chunk(pending.popleft().result())
+                self.count_chunk_records(positions.popleft())
+
+    def get_chunk_position(self, input_handler):
+        if self.checkpoint_state is None:
+            return None
+        return (input_handler.tell(), (self.records_to_skip, self.records_left))
+
+    def count_chunk_records(self, position):
+        if position is not None:
+            self.count_checkpoint_records(self.worker_chunk_size, *position)
+
+    def convert_chunk(self, chunk):
+        """
+        Työprosessissa suoritettava tietue-erän konversio. Tietueet kirjoitetaan ja lokirivit tallennetaan
+        muistiin, ja erän tilastot lasketaan alusta, jotta pääprosessi voi yhdistää ne.
+        chunk: lista read_raw_records-metodin palauttamia tietueita tai tiedostopolun sekä tavualueen alku- ja loppukohdan
+        monikko, jolloin tietueet luetaan tiedostosta (ks. read_record_range)
+        Palauttaa konvertoidut tietueet tavujonona, lokitiedostojen sisällöt, tilastot ja hakujen välimuistin tilastojen muutokset.
+        """
+        self.writer = MARCWriter(io.BytesIO())
+        log_buffers = [io.StringIO(newline='') for _ in range(4)]
+        self.rf_writer, self.nf_writer, self.error_writer, self.remaining_writer = [
+            csv.writer(buffer, delimiter=self.delimiter, quotechar='"', quoting=csv.QUOTE_MINIMAL) for buffer in log_buffers]
+        self.statistics = dict.fromkeys(self.statistics, 0)
+        self.statistics["virheluokkia"] = {}
+        search_statistics = self.vocabularies.search_cache.get_statistics()
+        if isinstance(chunk, tuple):
+            chunk = self.read_record_range(*chunk)
+        for raw_record in chunk:
+            self.convert_raw_record(raw_record)
+        self.process_block()
+        search_statistics = {stat: value - search_statistics[stat]
+            for stat, value in self.vocabularies.search_cache.get_statistics().items()}
+        return (self.writer.file_handle.getvalue(), [buffer.getvalue() for buffer in log_buffers],
+            self.statistics, search_statistics)
+
+    def write_chunk(self, result):
+        """
+        kirjoittaa convert_chunk-metodin palauttaman erän tulostiedostoon ja lokeihin ja lisää erän tilastot
+        """
+        output, logs, statistics, search_statistics = result
+        self.writer.file_handle.write(output)
+        for handler, log in zip(self.log_handlers, logs):
+            if log:
+                handler.write(log)
+        for stat, value in statistics.items():
+            if stat == "virheluokkia":
+                for error_class, count in value.items():
+                    self.statistics[stat][error_class] = self.statistics[stat].get(error_class, 0) + count
+            else:
+                self.statistics[stat] += value
+        search_cache = self.vocabularies.search_cache
+        search_cache.hits += search_statistics["osumia"]
+        search_cache.misses += search_statistics["ohituksia"]
+        search_cache.evictions += search_statistics["poistettuja"]
+
+    def get_record_searches(self, record):
+        """
+        Palauttaa tietueen konvertoitavien osakenttien sanastohaut search_many-metodille.
+        Hakuparametrit muodostetaan samoin kuin process_subfield-metodissa, mutta kenttäkohtaisia
+        poikkeuksia (paikkaketjut, musiikin soitinnimet ja elokuvien aiheet) ei oteta huomioon,
+        vaan niiden haut tehdään tavalliseen tapaan konversion aikana.
+        """
+        searches = []
+        if record.leader[5] == "d":
+            return searches
+        record_type, non_fiction = self.get_record_type(record)
+        for tag in self.valid_subfield_codes:
+            for field in record.get_fields(tag):
+                if field['6']:
+                    continue
+                vocabulary_code = None
+                for sf in field.get_subfields('2'):
+                    if sf in ['ysa', 'allars', 'musa', 'cilla']:
+                        vocabulary_code = sf
+                        break
+                if not vocabulary_code:
+                    continue
+                for subfield in self.subfields_to_dict(field.subfields):
+                    if subfield['code'] not in self.valid_subfield_codes[tag] or subfield['code'].isdigit():
+                        continue
+                    if not subfield['value']:
+                        continue
+                    #358- ja 567-kentistä käsitellään vain a- ja b-osakentät:
+                    if (tag == "385" and subfield['code'] != "a") or (tag == "567" and subfield['code'] != "b"):
+                        continue
+                    vocabulary_order, search_geographical_concepts = self.get_search_parameters(tag,
+                        subfield['code'], vocabulary_code, non_fiction, record_type)
+                    searches.append((subfield['value'], vocabulary_order, search_geographical_concepts, self.all_languages))
+        return searches
+
     def read_and_write_record(self, record):
+        #purkamattomat tietueet, joissa ei ole konvertoitavaa (ks. scan_raw_record):
+        if isinstance(record, bytes):
+            self.statistics['käsiteltyjä tietueita'] += 1
+            if self.write_all:
+                self.writer.file_handle.write(record)
+            return
         #tarkistetaan, löytääkö pymarc XML-muotoisesta tietueesta MARC21-virheitä:
         if self.file_format == "marcxml":
             new_record = None
             try:
                 raw = record.as_marc()
                 new_record = Record(data=raw)
+                decode_fields(new_record)
             except (ValueError, IndexError) as e:
                 self.statistics['MARC21-virheitä'] += 1
         new_record = self.process_record(record)
@@ -535,7 +1232,7 @@ class YsoConverter():
                 self.open_writer(XMLWriter, self.output_path)
             if new_record:
                 try:
-                    self.writer.write(new_record)
+                    self.write_record(new_record)
                     self.statistics['konvertoituja tietueita'] += 1
                 except (ValueError, IndexError) as e:
                     record_id = "tuntematon"
@@ -544,7 +1241,7 @@ class YsoConverter():
                     logging.error("Viallinen tietue id:%s"%record_id)
             elif self.write_all:
                 try:
-                    self.writer.write(record)
+                    self.write_record(record)
                 except (ValueError, IndexError) as e:
                     record_id = "tuntematon"
                     if record['001']:
@@ -553,17 +1250,81 @@ class YsoConverter():
             if self.file_format == "marcxml" and self.output_directory:
                 self.writer.close()
 
-    def open_writer(self, writer, path):
+    def write_record(self, record):
+        """
+        Kirjoittaa MARC21-tiedostosta luetun tietueen splice_record-metodilla ja muut tietueet kirjoittimella.
+        """
+        if hasattr(record, 'raw_marc') and isinstance(self.writer, MARCWriter):
+            self.writer.file_handle.write(self.splice_record(record, self.altered_fields))
+        else:
+            self.writer.write(record)
+
+    def splice_record(self, record, altered_fields):
+        """
+        Muodostaa tietueen MARC21-muodossa niin, että vain altered_fields-kenttänumeroiden kentät koodataan uudelleen.
+        Muut kentät kopioidaan alkuperäisestä tietueesta, ja hakemisto sekä nimiön pituudet lasketaan uudelleen.
+        Jos tietueen kentät eivät vastaa alkuperäistä tietuetta, se koodataan kokonaan kuten MARCWriterissa.
+        """
+        raw_record = record.raw_marc
+        if record.leader[9] == 'a' or record.force_utf8:
+            encoding = 'utf-8'
+        else:
+            encoding = 'iso8859-1'
+        base_address = int(raw_record[12:17])
+        directory = raw_record[constants.LEADER_LEN:base_address - 1]
+        original_fields = []
+        for entry_start in range(0, len(directory), constants.DIRECTORY_ENTRY_LEN):
+            entry = directory[entry_start:entry_start + constants.DIRECTORY_ENTRY_LEN].decode('ascii')
+            entry_length = int(entry[3:7])
+            entry_offset = int(entry[7:12])
+            entry_data = raw_record[base_address + entry_offset:base_address + entry_offset + entry_length - 1]
+            original_fields.append((entry[0:3], entry_data + constants.END_OF_FIELD.encode(encoding)))
+        original_fields = [(tag, data) for tag, data in original_fields if tag not in altered_fields]
+        if len(original_fields) != len([field for field in record.fields if field.tag not in altered_fields]):
+            return record.as_marc()
+        original_fields = iter(original_fields)
+        fields = []
+        directory = []
+        offset = 0
+        for field in record.fields:
+            if field.tag in altered_fields:
+                field_data = field.as_marc(encoding=encoding)
+            else:
+                tag, field_data = next(original_fields)
+                if tag != field.tag:
+                    return record.as_marc()
+            fields.append(field_data)
+            if field.tag.isdigit():
+                directory.append(('%03d' % int(field.tag)).encode(encoding))
+            else:
+                directory.append(('%03s' % field.tag).encode(encoding))
+            directory.append(('%04d%05d' % (len(field_data), offset)).encode(encoding))
+            offset += len(field_data)
+        directory.append(constants.END_OF_FIELD.encode(encoding))
+        fields.append(constants.END_OF_RECORD.encode(encoding))
+        directory = b''.join(directory)
+        fields = b''.join(fields)
+        base_address = constants.LEADER_LEN + len(directory)
+        record_length = base_address + len(fields)
+        leader = ('%05d%s%05d%s' % (record_length, record.leader[5:12], base_address, record.leader[17:])).encode(encoding)
+        return leader + directory + fields
+
+    def open_writer(self, writer, path, position=None):
         """
         apufunktio, joka avaa tiedostokirjoittimen ja luo hakemiston, jos sitä ei vielä ole olemassa
         writer: MARCWriter- tai XMLWriter-luokka
         path: tiedostopolku
+        position: kohta, johon tarkistuspisteestä jatkettava tiedosto katkaistaan, None jos tiedosto kirjoitetaan alusta
         """
+        if position is not None:
+            os.truncate(path, position)
+            self.writer = writer(open_output(path, 'ab', self.compression_level, self.background_compression))
+            return
         try:
-            self.writer = writer(open(path,'wb'))
+            self.writer = writer(open_output(path, 'wb', self.compression_level, self.background_compression))
         except FileNotFoundError:
             os.makedirs(os.path.dirname(path))
-            self.writer = writer(open(path,'wb'))
+            self.writer = writer(open_output(path, 'wb', self.compression_level, self.background_compression))
 
     def subfields_to_dict(self, subfields):
         """
@@ -627,6 +1388,7 @@ class YsoConverter():
         original_fields = {}
         new_fields = {}
         altered_fields = set()
+        self.altered_fields = altered_fields #kirjoitettaessa muuttuneet kentät (ks. splice_record)
         record_status = record.leader[5]
         if record['001']:
             record_id = record['001'].data
@@ -650,78 +1412,8 @@ class YsoConverter():
         leader/06 on i ->
         008/30-31 - Kirjallisuuslaji on d, f tai p (äänikirjat)
         """
-        leader_type = record.leader[6]
-        record_type = None
-        non_fiction = True
-        control_field_genres = []
+        record_type, non_fiction = self.get_record_type(record)
         convertible_record = False
-        #moniviestin:
-        if leader_type == "o":
-            if record['006']:
-                if len(record['006'].data) > 16:
-                    if record['006'].data[0] in ['a', 't']:
-                        if record['006'].data[16] not in ['0', 'u', '|', 'e', 's', 'i']:
-                            non_fiction = False
-                    elif record['006'].data[0] == "i":
-                        for char in ['d', 'f', 'p']:
-                            if char in record['006'].data[13:15]:
-                                non_fiction = False
-        if leader_type in ['a', 't']:
-            record_type = "text"
-            if record.leader[7] not in ['b', 'i', 's']:
-                """ 
-                008 (BK) merkkipaikka 34 arvo on erittäin oleellinen ja paljon käytetty 
-                a, niin 655 $a kenttään voidaan tallettaa muistelmat  http://urn.fi/URN:NBN:fi:au:slm:s286
-                b tai c niin 655 $a kenttään elämäkerrat http://urn.fi/URN:NBN:fi:au:slm:s1006
-                008 (BK) merkkipaikka 33 samaten
-                d -  näytelmät  http://urn.fi/URN:NBN:fi:au:slm:s929
-                f - romaanit http://urn.fi/URN:NBN:fi:au:slm:s518
-                h - huumori http://urn.fi/URN:NBN:fi:au:slm:s1128
-                j - novellit http://urn.fi/URN:NBN:fi:au:slm:s27
-                p - runot  http://urn.fi/URN:NBN:fi:au:slm:s1150
-                s - puheet http://urn.fi/URN:NBN:fi:au:slm:s775   tai esitelmät  http://urn.fi/URN:NBN:fi:au:slm:s313
-                """
-                if record['008']:
-                    if len(record['008'].data) > 34:
-                        if record['008'].data[33] not in ['0', 'u', '|', 'e', 's', 'i']:
-                            non_fiction = False
-        elif leader_type == "i":
-            record_type = "text"
-            if record['008']:
-                if len(record['008'].data) > 31:
-                    for char in ['d', 'f', 'p']:
-                        if char in record['008'].data[30:32]:
-                            non_fiction = False
-        elif leader_type == "m":
-            #Konsolipelien tunnistaminen 
-            #Leader/06 on m JA kenttä 008/26 on g (eli peli)
-            if record['008']:
-                if len(record['008'].data) > 33:
-                    if record['008'].data[26] == "g":
-                        non_fiction = False
-        elif leader_type == "r":
-            #Lautapelien tunnistaminen
-            #leader/06 on r JA 008/33 on g
-            if record['008']:
-                if len(record['008'].data) > 33:
-                    if record['008'].data[33] == "g":
-                        non_fiction = False
-
-        elif leader_type in ['c', 'd', 'j']: 
-            record_type = "music"
-            non_fiction = False
-        elif leader_type == "g":
-            if record['007']:
-                if len(record['007'].data) > 0:
-                    if record['007'].data[0] == "v":
-                        record_type = "movie"
-                        non_fiction = False
-                        for field in record.get_fields('084'):
-                            for subfield in field.get_subfields('a'):
-                                if subfield.startswith("78"):
-                                    record_type = "music"
-        if not record_type:
-            record_type = "text"
         if record['567']:
             convertible_record = True
         for tag in tags_of_fields_to_convert:
@@ -892,6 +1584,82 @@ class YsoConverter():
             return
         return record
         
+    def get_record_type(self, record):
+        """
+        palauttaa tietueen aineistotyypin ("text", "music" tai "movie") ja tiedon siitä, onko aineisto tietokirjallisuutta
+        """
+        leader_type = record.leader[6]
+        record_type = None
+        non_fiction = True
+        #moniviestin:
+        if leader_type == "o":
+            if record['006']:
+                if len(record['006'].data) > 16:
+                    if record['006'].data[0] in ['a', 't']:
+                        if record['006'].data[16] not in ['0', 'u', '|', 'e', 's', 'i']:
+                            non_fiction = False
+                    elif record['006'].data[0] == "i":
+                        for char in ['d', 'f', 'p']:
+                            if char in record['006'].data[13:15]:
+                                non_fiction = False
+        if leader_type in ['a', 't']:
+            record_type = "text"
+            if record.leader[7] not in ['b', 'i', 's']:
+                """ 
+                008 (BK) merkkipaikka 34 arvo on erittäin oleellinen ja paljon käytetty 
+                a, niin 655 $a kenttään voidaan tallettaa muistelmat  http://urn.fi/URN:NBN:fi:au:slm:s286
+                b tai c niin 655 $a kenttään elämäkerrat http://urn.fi/URN:NBN:fi:au:slm:s1006
+                008 (BK) merkkipaikka 33 samaten
+                d -  näytelmät  http://urn.fi/URN:NBN:fi:au:slm:s929
+                f - romaanit http://urn.fi/URN:NBN:fi:au:slm:s518
+                h - huumori http://urn.fi/URN:NBN:fi:au:slm:s1128
+                j - novellit http://urn.fi/URN:NBN:fi:au:slm:s27
+                p - runot  http://urn.fi/URN:NBN:fi:au:slm:s1150
+                s - puheet http://urn.fi/URN:NBN:fi:au:slm:s775   tai esitelmät  http://urn.fi/URN:NBN:fi:au:slm:s313
+                """
+                if record['008']:
+                    if len(record['008'].data) > 34:
+                        if record['008'].data[33] not in ['0', 'u', '|', 'e', 's', 'i']:
+                            non_fiction = False
+        elif leader_type == "i":
+            record_type = "text"
+            if record['008']:
+                if len(record['008'].data) > 31:
+                    for char in ['d', 'f', 'p']:
+                        if char in record['008'].data[30:32]:
+                            non_fiction = False
+        elif leader_type == "m":
+            #Konsolipelien tunnistaminen 
+            #Leader/06 on m JA kenttä 008/26 on g (eli peli)
+            if record['008']:
+                if len(record['008'].data) > 33:
+                    if record['008'].data[26] == "g":
+                        non_fiction = False
+        elif leader_type == "r":
+            #Lautapelien tunnistaminen
+            #leader/06 on r JA 008/33 on g
+            if record['008']:
+                if len(record['008'].data) > 33:
+                    if record['008'].data[33] == "g":
+                        non_fiction = False
+
+        elif leader_type in ['c', 'd', 'j']: 
+            record_type = "music"
+            non_fiction = False
+        elif leader_type == "g":
+            if record['007']:
+                if len(record['007'].data) > 0:
+                    if record['007'].data[0] == "v":
+                        record_type = "movie"
+                        non_fiction = False
+                        for field in record.get_fields('084'):
+                            for subfield in field.get_subfields('a'):
+                                if subfield.startswith("78"):
+                                    record_type = "music"
+        if not record_type:
+            record_type = "text"
+        return record_type, non_fiction
+
     def process_field(self, record_id, field, vocabulary_code, non_fiction=True, record_type=None):
         """
         record_id -- 001-kentästä poimittu tietue-id
@@ -958,16 +1726,18 @@ class YsoConverter():
                 while len(subfields) > 0:
                     if len(subfields) > 1:
                         if subfields[0]['code'] in ['a', 'b', 'c', 'd', 'v', 'x', 'y', 'z']: 
-                            first = subfields[0]['value']
                             if subfields[1]['code'] == "z":
-                                second = subfields[1]['value']
-                                combined_concept = first + " -- " + second
-                                if combined_concept in \
-                                    self.vocabularies.vocabularies['ysa'].geographical_chained_labels | \
-                                    self.vocabularies.vocabularies['allars'].geographical_chained_labels:
+                                #ketjuun voi kuulua useampi peräkkäinen $z-osakenttä:
+                                values = [subfields[0]['value']]
+                                for index in range(1, len(subfields)):
+                                    if subfields[index]['code'] != "z":
+                                        break
+                                    values.append(subfields[index]['value'])
+                                length = self.vocabularies.find_geographical_chain(values)
+                                if length:
+                                    combined_concept = " -- ".join(values[:length])
                                     combined_subfields.append({'code': subfields[0]['code'], 'value': combined_concept})
-                                    del subfields[0]
-                                    del subfields[0]
+                                    del subfields[:length]
                                     continue
                     combined_subfields.append({'code': subfields[0]['code'], 'value': subfields[0]['value']})
                     del subfields[0]
@@ -1197,75 +1967,19 @@ class YsoConverter():
         if not subfield['value']:
             self.error_writer.writerow(["6", record_id, self.get_record_code(non_fiction, record_type), subfield['value'], original_field])
             return
-        #alustetaan ensin hakuparametrien oletusarvot
-        vocabulary_order = [] #hakujärjestys, jos sanaa haetaan useammasta sanastosta 
-        language = None
-        
-        #sanastohakujärjestykseen liittyvät muuttujat:
-        has_music = False
-        yso = True
-        slm = False
-        
-        if vocabulary_code == "ysa":
-            language = "fi"
-        if vocabulary_code == "allars":
-            language = "sv"    
-        if vocabulary_code == "musa":
-            language = "fi"    
-            has_music = True
-        if vocabulary_code == "cilla":
-            language = "sv"   
-            has_music = True  
-        
-        search_geographical_concepts = True    
-        
-        """
-        normaalilla tavalla käsiteltävät osakentät, joista tässä ei ole:
-        - osakentät 650 e ja g jätetään käsittelemättä
-        - kentät 358 ja 567 käsitellään eri tavalla
-        - osakenttä 655 y käsitellään eri tavalla
-        """
-        valid_subfield_codes = {
-            '385': ['a', 'b', 'm', 'n', '0', '1', '2', '3', '5', '6', '8', '9'],
-            '567': ['a', 'b', '0', '1', '2', '5', '6', '8', '9'],
-            '648': ['a', 'v', 'x', 'y', 'z'],
-            '650': ['a', 'b', 'c', 'd', 'v', 'x', 'y', 'z'],
-            '651': ['a', 'd', 'v', 'x', 'y', 'z'],
-            '655': ['a', 'v', 'x', 'z']
-        }
-
-        #käsitellään ensin poikkeustapaukset ja/tai annetaan sanastohaulle erityisjärjestys:
-        if tag == "385" or tag == "567":
-            search_geographical_concepts = False
-        if tag == "655":
-            if not subfield['code'] == "z":
-                yso = False #vain 655 kentän z-osakentässä katsotaan myös Ysa- ja Allärs-termejä
-                has_music = False #ei katsotaan myöskään Musasta eikä Cillasta
-            if subfield['code'] in ['a', 'v', 'x']:
-                search_geographical_concepts = False
-                slm = True
-            if subfield['code'] == "y":                          
-                field = self.field_without_voc_code("388", [' ', ' '], subfield)
-                if vocabulary_code in ['ysa', 'musa']:
-                    field.add_subfield('2', 'yso/fin')
-                if vocabulary_code in ['allars', 'cilla']:
-                    field.add_subfield('2', 'yso/swe')
-                return [field]
-        if tag in ['648', '650', '651']:
-            if subfield['code'] == "v":
-                slm = True
-                if vocabulary_code in ['musa', 'cilla']:
-                    has_music = True
-                if tag == '650' or tag == '651':
-                    if subfield['value'].lower() == "fiktio":
-                        self.error_writer.writerow(["6", record_id, self.get_record_code(non_fiction, record_type), subfield['value'], original_field])
-                        return
-            if tag == "650" and subfield['code'] == "a":
-                if not non_fiction:
-                    slm = True
-                    if vocabulary_code in ['musa', 'cilla']:
-                        has_music = True
+        #käsitellään ensin poikkeustapaukset:
+        if tag == "655" and subfield['code'] == "y":
+            field = self.field_without_voc_code("388", [' ', ' '], subfield)
+            if vocabulary_code in ['ysa', 'musa']:
+                field.add_subfield('2', 'yso/fin')
+            if vocabulary_code in ['allars', 'cilla']:
+                field.add_subfield('2', 'yso/swe')
+            return [field]
         if tag in ['650', '651']:
+            if subfield['code'] == "v":
+                if subfield['value'].lower() == "fiktio":
+                    self.error_writer.writerow(["6", record_id, self.get_record_code(non_fiction, record_type), subfield['value'], original_field])
+                    return
             if subfield['code'] == "e":
                 self.error_writer.writerow(["6", record_id, self.get_record_code(non_fiction, record_type), subfield['value'], original_field])
                 return 
@@ -1273,34 +1987,12 @@ class YsoConverter():
                 field = self.field_without_voc_code("653", [' ', ' '], subfield)   
                 self.error_writer.writerow(["7", record_id, self.get_record_code(non_fiction, record_type), subfield['value'], original_field, field])
                 return [field]    
-        if record_type == "music":
-            if tag in ['650', '655']:
-                if subfield['code'] == "a" and tag == "650":
-                    slm = True
-                if subfield['code'] in ['x', 'y', 'z']:
-                    if not has_topics:
-                        slm = True
 
-        vocabulary_order = self.set_vocabulary_order(language, yso, slm, has_music)
-        
-        #hakujärjestykseen lisäys niille osakentille, josta haetaan aikatermejä:
-        #Huom! 655 y käsitelty jo edellä
-        if subfield['code'] == "y" and tag in ['648', '650', '651']:
-            vocabulary_order = [('numeric', language)] + vocabulary_order
-        if tag == "648":
-            if subfield['code'] in ['a', 'x', 'z']:
-                vocabulary_order = [('numeric', language)] + vocabulary_order
-        if tag == "650":
-            if subfield['code'] in ['a', 'b', 'c', 'x', 'z']:
-                vocabulary_order = vocabulary_order + [('numeric', language)]
-            if subfield['code'] == "d":
-                vocabulary_order = [('numeric', language)] + vocabulary_order
-        if tag == "651":
-            if subfield['code'] in ['a', 'x', 'z']:
-                vocabulary_order = vocabulary_order + [('numeric', language)]
+        vocabulary_order, search_geographical_concepts = self.get_search_parameters(tag, subfield['code'], vocabulary_code,
+            non_fiction, record_type, has_topics)
 
         #käsitellään perustapaukset
-        if subfield['code'] in valid_subfield_codes[tag]:
+        if subfield['code'] in self.valid_subfield_codes[tag]:
             try:
                 responses = self.vocabularies.search(subfield['value'], vocabulary_order, search_geographical_concepts, self.all_languages)
                 if tag == "650" and not non_fiction and subfield['code'] == "a":
@@ -1370,6 +2062,80 @@ class YsoConverter():
         
         return converted_fields
 
+    def get_search_parameters(self, tag, subfield_code, vocabulary_code, non_fiction=True, record_type=None, has_topics=False):
+        """
+        palauttaa osakentän sanastohaun hakujärjestyksen ja tiedon siitä, haetaanko käsitettä YSO-paikoista
+        tag -- konvertoitavan kentän kenttäkoodi
+        subfield_code -- käsiteltävän osakentän koodi
+        muut parametrit kuten process_subfield-metodissa
+        """
+        language = None
+        
+        #sanastohakujärjestykseen liittyvät muuttujat:
+        has_music = False
+        yso = True
+        slm = False
+        
+        if vocabulary_code == "ysa":
+            language = "fi"
+        if vocabulary_code == "allars":
+            language = "sv"    
+        if vocabulary_code == "musa":
+            language = "fi"    
+            has_music = True
+        if vocabulary_code == "cilla":
+            language = "sv"   
+            has_music = True  
+        
+        search_geographical_concepts = True    
+
+        #annetaan sanastohaulle erityisjärjestys:
+        if tag == "385" or tag == "567":
+            search_geographical_concepts = False
+        if tag == "655":
+            if not subfield_code == "z":
+                yso = False #vain 655 kentän z-osakentässä katsotaan myös Ysa- ja Allärs-termejä
+                has_music = False #ei katsotaan myöskään Musasta eikä Cillasta
+            if subfield_code in ['a', 'v', 'x']:
+                search_geographical_concepts = False
+                slm = True
+        if tag in ['648', '650', '651']:
+            if subfield_code == "v":
+                slm = True
+                if vocabulary_code in ['musa', 'cilla']:
+                    has_music = True
+            if tag == "650" and subfield_code == "a":
+                if not non_fiction:
+                    slm = True
+                    if vocabulary_code in ['musa', 'cilla']:
+                        has_music = True
+        if record_type == "music":
+            if tag in ['650', '655']:
+                if subfield_code == "a" and tag == "650":
+                    slm = True
+                if subfield_code in ['x', 'y', 'z']:
+                    if not has_topics:
+                        slm = True
+
+        vocabulary_order = self.set_vocabulary_order(language, yso, slm, has_music)
+        
+        #hakujärjestykseen lisäys niille osakentille, josta haetaan aikatermejä:
+        #Huom! 655 y käsitelty process_subfield-metodissa
+        if subfield_code == "y" and tag in ['648', '650', '651']:
+            vocabulary_order = [('numeric', language)] + vocabulary_order
+        if tag == "648":
+            if subfield_code in ['a', 'x', 'z']:
+                vocabulary_order = [('numeric', language)] + vocabulary_order
+        if tag == "650":
+            if subfield_code in ['a', 'b', 'c', 'x', 'z']:
+                vocabulary_order = vocabulary_order + [('numeric', language)]
+            if subfield_code == "d":
+                vocabulary_order = [('numeric', language)] + vocabulary_order
+        if tag == "651":
+            if subfield_code in ['a', 'x', 'z']:
+                vocabulary_order = vocabulary_order + [('numeric', language)]
+        return vocabulary_order, search_geographical_concepts
+
     def field_with_voc_code(self, tag, response):
         """
         -   luo haun pohjalta YSO- tai SLM-asiasanasta uuden MARC-kentän
@@ -1641,6 +2407,40 @@ def readCommandLineArguments():
         help="Create new converted fields in Finnish and Swedish")
     parser.add_argument("-wa", "--write_all", action='store_true',
         help="Also write unconverted records")
+    parser.add_argument("-cd", "--cache_directory", default="vocabulary_cache",
+        help="Directory for processed vocabularies")
+    parser.add_argument("-cg", "--cache_generations", type=int, default=3,
+        help="Number of vocabulary generations kept in cache directory")
+    parser.add_argument("-cs", "--cache_size", type=int,
+        help="Maximum size of cache directory in megabytes")
+    parser.add_argument("-vw", "--vocabulary_workers", type=int, default=1,
+        help="Number of worker processes for parsing vocabularies")
+    parser.add_argument("-vv", "--verify_vocabularies", action='store_true',
+        help="Compare vocabularies updated from previous cache generation with fully rebuilt vocabularies")
+    parser.add_argument("-ps", "--prescan", action='store_true',
+        help="Scan input files for vocabulary codes and load the required vocabularies before conversion")
+    parser.add_argument("-sc", "--search_cache_size", type=int, default=100000,
+        help="Maximum number of cached vocabulary search results, 0 disables the cache")
+    parser.add_argument("-bs", "--block_size", type=int, default=0,
+        help="Number of records whose vocabulary searches are resolved in one batch before conversion, 0 disables batching")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+        help="Number of worker processes for converting MARC21 records")
+    parser.add_argument("-sk", "--skip", type=int, default=0,
+        help="Number of MARC21 records skipped from the start of the input")
+    parser.add_argument("-l", "--limit", type=int,
+        help="Maximum number of MARC21 records converted")
+    parser.add_argument("-ri", "--record_ids", nargs='+',
+        help="Convert only the MARC21 records with these 001 identifiers")
+    parser.add_argument("-ix", "--record_index", action='store_true',
+        help="Save the record offset index of MARC21 input files next to the files and reuse it on later runs")
+    parser.add_argument("-ci", "--checkpoint_interval", type=int, default=100000,
+        help="Number of MARC21 records between saved checkpoints, 0 disables checkpoints")
+    parser.add_argument("-r", "--resume", action='store_true',
+        help="Resume an interrupted MARC21 conversion from its last checkpoint")
+    parser.add_argument("-cl", "--compression_level", type=int,
+        help="Compression level of gzip, bz2 or xz compressed output files")
+    parser.add_argument("-bc", "--background_compression", action='store_true',
+        help="Compress output files in a background thread")
     args = parser.parse_args()
     return args
 
@@ -1658,7 +2458,24 @@ def main():
         file_format = args.format,
         field_links = args.field_links,
         all_languages = args.all_languages,
-        write_all = args.write_all
+        write_all = args.write_all,
+        cache_directory = args.cache_directory,
+        cache_generations = args.cache_generations,
+        cache_size = args.cache_size,
+        vocabulary_workers = args.vocabulary_workers,
+        verify_vocabularies = args.verify_vocabularies,
+        prescan = args.prescan,
+        search_cache_size = args.search_cache_size,
+        block_size = args.block_size,
+        workers = args.workers,
+        skip = args.skip,
+        limit = args.limit,
+        record_ids = args.record_ids,
+        save_record_index = args.record_index,
+        checkpoint_interval = args.checkpoint_interval,
+        resume = args.resume,
+        compression_level = args.compression_level,
+        background_compression = args.background_compression
     )
     yc.initialize_vocabularies()
     yc.read_records()